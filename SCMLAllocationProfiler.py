@@ -0,0 +1,163 @@
+import gc
+import sys
+import threading
+import time
+import tracemalloc
+
+import pulp
+
+
+class SCMLAllocationProfiler:
+    """
+    Records the memory allocated by each phase of a model build, for the profile=True mode of
+    SCMLBusinessPlan.compute_business_plan and SCMLContractsSigner.sign. A phase runs from the previous checkpoint (or
+    the start) to its own checkpoint, and gets a map with the keys in ALLOCATIONS:
+    - 'peak_bytes': the peak of the memory traced by tracemalloc during the phase, above the memory at its start. It
+      needs tracemalloc.reset_peak, new in Python 3.9, and is None on older versions.
+    - 'net_bytes': the memory traced at the end of the phase, above the memory at its start.
+    - 'blocks': the number of memory blocks allocated by the interpreter at the end of the phase, above its start.
+    - 'expressions': the number of pulp expressions (LpAffineExpression, including LpConstraint) created.
+    - 'gc_collections' and 'gc_seconds': the number of garbage collections run and the seconds they took.
+    The expressions are counted by wrapping the constructor of pulp.LpAffineExpression while a profiler runs, and only
+    the ones created by the thread of the profiler are counted. The memory, blocks and garbage collections are
+    process-wide, so the ones of concurrent profiles overlap. Tracing slows the code down severalfold, so the timings
+    of a profiled call are not representative.
+    A profiler is a context manager that stops when its block exits, even on an exception. A disabled profiler does
+    nothing, so the solvers call checkpoint unconditionally.
+    """
+
+    ALLOCATIONS = (
+        "peak_bytes",
+        "net_bytes",
+        "blocks",
+        "expressions",
+        "gc_collections",
+        "gc_seconds",
+    )
+
+    # While any profiler runs, the constructor of the pulp expressions is wrapped and tracemalloc traces. These are
+    # process-wide, so they are shared: the number of running profilers, whether they started tracing, and the original
+    # constructor. The expressions are counted per thread, so each profiler only counts the ones of its own thread.
+    lock = threading.Lock()
+    running = 0
+    started_tracing = False
+    expression_init = None
+    counts = threading.local()
+
+    def __init__(self, enabled: bool = True):
+        """
+        :param enabled: if True, the profiler starts right away. Otherwise, it does nothing.
+        """
+        self.enabled = enabled
+        self.phases = None
+        self.is_running = False
+        if enabled:
+            self.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @staticmethod
+    def count_expression(expression, *args, **kwargs):
+        """
+        The constructor of pulp.LpAffineExpression while a profiler runs.
+        """
+        SCMLAllocationProfiler.counts.expressions = (
+            SCMLAllocationProfiler.get_expressions() + 1
+        )
+        SCMLAllocationProfiler.expression_init(expression, *args, **kwargs)
+
+    @staticmethod
+    def get_expressions():
+        """
+        :return: the number of pulp expressions created by the current thread while a profiler ran.
+        """
+        return getattr(SCMLAllocationProfiler.counts, "expressions", 0)
+
+    def start(self):
+        """
+        Starts tracing the allocations, unless tracemalloc is already tracing, and counting the expressions.
+        """
+        self.phases = {}
+        with SCMLAllocationProfiler.lock:
+            if SCMLAllocationProfiler.running == 0:
+                SCMLAllocationProfiler.expression_init = (
+                    pulp.LpAffineExpression.__init__
+                )
+                pulp.LpAffineExpression.__init__ = (
+                    SCMLAllocationProfiler.count_expression
+                )
+                SCMLAllocationProfiler.started_tracing = not tracemalloc.is_tracing()
+                if SCMLAllocationProfiler.started_tracing:
+                    tracemalloc.start()
+            SCMLAllocationProfiler.running += 1
+        self.is_running = True
+        gc.callbacks.append(self.on_gc)
+        self.reset()
+
+    def reset(self):
+        """
+        Starts a new phase.
+        """
+        self.expressions = SCMLAllocationProfiler.get_expressions()
+        self.gc_collections = 0
+        self.gc_seconds = 0.0
+        self.gc_start = None
+        self.blocks = sys.getallocatedblocks()
+        # tracemalloc.reset_peak is new in Python 3.9. Before, the peaks are not measured.
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        self.traced = tracemalloc.get_traced_memory()[0]
+
+    def on_gc(self, phase: str, info: dict):
+        """
+        The callback of the garbage collector, see gc.callbacks.
+        """
+        if phase == "start":
+            self.gc_start = time.perf_counter()
+        elif self.gc_start is not None:
+            self.gc_collections += 1
+            self.gc_seconds += time.perf_counter() - self.gc_start
+            self.gc_start = None
+
+    def checkpoint(self, name: str):
+        """
+        Ends the current phase and records its allocations.
+        :param name: the name of the phase.
+        """
+        if not self.enabled:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        self.phases[name] = {
+            "peak_bytes": peak - self.traced
+            if hasattr(tracemalloc, "reset_peak")
+            else None,
+            "net_bytes": current - self.traced,
+            "blocks": sys.getallocatedblocks() - self.blocks,
+            "expressions": SCMLAllocationProfiler.get_expressions() - self.expressions,
+            "gc_collections": self.gc_collections,
+            "gc_seconds": self.gc_seconds,
+        }
+        self.reset()
+
+    def stop(self):
+        """
+        Stops tracing and restores the constructor of the pulp expressions, unless other profilers run. Stopping a
+        profiler twice does nothing, so it can be stopped inside a with block.
+        :return: a map {phase : allocations}, in the order of the checkpoints, or None if the profiler is disabled.
+        """
+        if self.is_running:
+            self.is_running = False
+            gc.callbacks.remove(self.on_gc)
+            with SCMLAllocationProfiler.lock:
+                SCMLAllocationProfiler.running -= 1
+                if SCMLAllocationProfiler.running == 0:
+                    pulp.LpAffineExpression.__init__ = (
+                        SCMLAllocationProfiler.expression_init
+                    )
+                    if SCMLAllocationProfiler.started_tracing:
+                        tracemalloc.stop()
+        return self.phases
@@ -0,0 +1,166 @@
+import random
+import threading
+import tracemalloc
+import unittest
+
+import numpy as np
+import pulp
+
+import SCMLBusinessPlanTests
+import SCMLContractsSignerTests
+from SCMLAllocationProfiler import SCMLAllocationProfiler
+from SCMLBusinessPlan import SCMLBusinessPlan
+from SCMLContractsSigner import SCMLContractsSigner
+
+
+class SCMLAllocationProfilerTests(unittest.TestCase):
+    def setUp(self):
+        # The test runner may trace allocations itself, e.g., to report where unraisable objects were allocated.
+        self.tracing = tracemalloc.is_tracing()
+
+    def assert_stopped(self):
+        """
+        Once profiled, tracing must be back as it was and the constructor of the pulp expressions restored.
+        """
+        self.assertEqual(tracemalloc.is_tracing(), self.tracing)
+        self.assertEqual(SCMLAllocationProfiler.running, 0)
+        self.assertIsNot(
+            pulp.LpAffineExpression.__init__, SCMLAllocationProfiler.count_expression
+        )
+
+    def test_plan_profile(self):
+        """
+        The profile must cover every phase, leave the plan unchanged, and the number of expressions created for the
+        constraints must stay linear in the number of variables.
+        """
+        np.random.seed(0)
+        for horizon, q_max in ((5, 5), (10, 10), (20, 10)):
+            synthetic_input = (
+                SCMLBusinessPlanTests.SCMLBusinessTests.synthetic_input_creation(
+                    horizon, q_max
+                )
+            )
+            output = SCMLBusinessPlan.compute_business_plan(**synthetic_input)
+            profiled = SCMLBusinessPlan.compute_business_plan(
+                **synthetic_input, profile=True
+            )
+            self.assert_stopped()
+            self.assertIsNone(output["allocations"])
+            self.assertEqual(profiled["buy_plan"], output["buy_plan"])
+            self.assertEqual(profiled["sell_plan"], output["sell_plan"])
+
+            allocations = profiled["allocations"]
+            self.assertEqual(
+                list(allocations),
+                [
+                    "minima",
+                    "variables",
+                    "objective",
+                    "constraints",
+                    "solve",
+                    "read_plan",
+                ],
+            )
+            for phase in allocations.values():
+                self.assertEqual(
+                    tuple(phase.keys()), SCMLAllocationProfiler.ALLOCATIONS
+                )
+                self.assertGreaterEqual(phase["peak_bytes"], phase["net_bytes"])
+            self.assertGreater(allocations["variables"]["peak_bytes"], 0)
+            self.assertEqual(allocations["variables"]["expressions"], 0)
+            self.assertLessEqual(
+                allocations["constraints"]["expressions"], 25 * horizon * q_max
+            )
+
+    def test_sign_profile(self):
+        """
+        The profile of the signer must cover every phase of the pulp engine, and be None for the other engines.
+        """
+        random.seed(0)
+        signer_tests = SCMLContractsSignerTests.SCMLSignerTests
+        agreements = [signer_tests.generate_random_contract() for _ in range(0, 50)]
+        for engine in ("pulp", "milp"):
+            output = SCMLContractsSigner.sign(
+                signer_tests.AGENT_ID,
+                agreements,
+                signer_tests.DEFAULT_TRUST_PROB,
+                engine=engine,
+                profile=True,
+            )
+            self.assert_stopped()
+            if engine == "pulp":
+                self.assertEqual(
+                    list(output["allocations"]),
+                    [
+                        "variables",
+                        "objective",
+                        "constraints",
+                        "solve",
+                        "read_signatures",
+                    ],
+                )
+                self.assertGreater(
+                    output["allocations"]["constraints"]["expressions"], 0
+                )
+            else:
+                self.assertIsNone(output["allocations"])
+
+    def test_nested(self):
+        """
+        A profiler started inside another must count for both, and leave the tracing to the outer one.
+        """
+        outer = SCMLAllocationProfiler()
+        inner = SCMLAllocationProfiler()
+        x = pulp.LpVariable("x")
+        _ = x + 1
+        inner.checkpoint("inner")
+        inner_expressions = inner.stop()["inner"]["expressions"]
+        self.assertGreater(inner_expressions, 0)
+        self.assertTrue(tracemalloc.is_tracing())
+        _ = x + 1
+        outer.checkpoint("outer")
+        self.assertEqual(outer.stop()["outer"]["expressions"], 2 * inner_expressions)
+        self.assert_stopped()
+        self.assertIsNone(SCMLAllocationProfiler(False).stop())
+
+    def test_exception(self):
+        """
+        A profiler must stop when its block exits on an exception.
+        """
+        with self.assertRaises(ZeroDivisionError):
+            with SCMLAllocationProfiler() as profiler:
+                _ = pulp.LpVariable("x") + 1 / 0
+        self.assertFalse(profiler.is_running)
+        self.assert_stopped()
+
+    def test_threads(self):
+        """
+        Concurrent profilers must only count the expressions of their own thread, and the last one to stop must
+        restore the constructor of the pulp expressions.
+        """
+        started, created = threading.Barrier(4), threading.Barrier(4)
+        expressions = {}
+
+        def profile(n: int):
+            with SCMLAllocationProfiler() as profiler:
+                started.wait()
+                x = pulp.LpVariable("x")
+                for _ in range(0, n):
+                    _ = x + 1
+                profiler.checkpoint("expressions")
+                created.wait()
+            expressions[n] = profiler.stop()["expressions"]["expressions"]
+
+        threads = [threading.Thread(target=profile, args=(n,)) for n in (1, 2, 3, 4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assert_stopped()
+        self.assertEqual(len(set(expressions.values())), 4)
+        for n in (2, 3, 4):
+            self.assertEqual(expressions[n], n * expressions[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
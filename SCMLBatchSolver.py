@@ -0,0 +1,312 @@
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import gzip
+import json
+import sys
+import time
+
+import numpy as np
+from negmas import Contract
+
+from SCMLBusinessPlan import SCMLBusinessPlan
+from SCMLContractsSigner import SCMLContractsSigner
+from SCMLCostModel import SCMLCostModel
+
+
+class SCMLBatchSolver:
+    """
+    Solves a stream of instances of the business plan solver and the signer, read as newline-delimited JSON, and writes
+    the outputs as newline-delimited JSON in the same order, e.g., to run what-if studies on scenario dumps with
+    python -m SCMLBatchSolver. Each line of the input is an object with a 'kind', 'plan' or 'sign' (or the kind given
+    to run), an optional 'id' copied to the output, and the parameters of the solver:
+    - 'plan': the parameters of SCMLBusinessPlan.compute_business_plan in PLAN_PARAMETERS. The maps by time, e.g.,
+    p_inn or C_out, are objects keyed by time or lists indexed by time. Q_inn and Q_out are objects {t : {q : p}} or
+    lists of lists of probabilities, see SCMLBusinessPlan.get_distribution_array.
+    - 'sign': the 'agent_id', the 'trust_probabilities' and the 'agreements', each an object with the 'partners', the
+    'time', the 'quantity', the 'unit_price' and 'is_buy', as the negmas.Contract given to SCMLContractsSigner.sign.
+    Each line of the output is an object with the 'index' of the instance in the input, its 'kind' and 'id', and either
+    the 'result' (see SCMLResult.as_dict) and the 'seconds' taken to solve it, or the 'error' raised by the solver.
+    Only the lines being solved are held in memory, at most window of them, so the memory used does not depend on the
+    size of the input.
+    """
+
+    KINDS = ("plan", "sign")
+
+    PLAN_PARAMETERS = (
+        "horizon",
+        "q_max",
+        "Q_inn",
+        "Q_out",
+        "p_inn",
+        "p_out",
+        "C_inn",
+        "C_out",
+        "optimistic",
+        "step",
+        "rolling",
+        "final_inventory",
+    )
+
+    @staticmethod
+    def read_times(value, nested: bool = False):
+        """
+        :param value: a map by time read from JSON, either an object keyed by time or a list indexed by time.
+        :param nested: if True, the values are maps by quantity themselves, as Q_inn and Q_out.
+        :return: the map with integer keys. A nested list is returned as an array, see
+        SCMLBusinessPlan.get_distribution_array, and any other list as the map {t : value}.
+        """
+        if value is None:
+            return None
+        if isinstance(value, list):
+            return np.array(value, dtype=float) if nested else dict(enumerate(value))
+        return {
+            int(k): SCMLBatchSolver.read_times(v) if nested else v
+            for k, v in value.items()
+        }
+
+    @staticmethod
+    def solve_plan(instance: dict, engine: str, time_limit: float = None):
+        """
+        :param instance: a 'plan' instance, see the class docstring.
+        :param engine: see SCMLBusinessPlan.compute_business_plan.
+        :param time_limit: see SCMLBusinessPlan.compute_business_plan.
+        :return: the output of SCMLBusinessPlan.compute_business_plan.
+        """
+        parameters = {
+            k: instance[k] for k in SCMLBatchSolver.PLAN_PARAMETERS if k in instance
+        }
+        for k in ("Q_inn", "Q_out"):
+            parameters[k] = SCMLBatchSolver.read_times(parameters[k], nested=True)
+        for k in ("p_inn", "p_out", "C_inn", "C_out"):
+            if k in parameters:
+                parameters[k] = SCMLBatchSolver.read_times(parameters[k])
+        return SCMLBusinessPlan.compute_business_plan(
+            **parameters, engine=engine, time_limit=time_limit
+        )
+
+    @staticmethod
+    def solve_sign(instance: dict, engine: str, time_limit: float = None):
+        """
+        :param instance: a 'sign' instance, see the class docstring.
+        :param engine: see SCMLContractsSigner.sign.
+        :param time_limit: see SCMLContractsSigner.sign.
+        :return: the output of SCMLContractsSigner.sign.
+        """
+        agreements = [
+            Contract(
+                partners=agreement["partners"],
+                agreement={
+                    "time": agreement["time"],
+                    "quantity": agreement["quantity"],
+                    "unit_price": agreement["unit_price"],
+                },
+                annotation={"is_buy": agreement["is_buy"]},
+            )
+            for agreement in instance["agreements"]
+        ]
+        return SCMLContractsSigner.sign(
+            instance["agent_id"],
+            agreements,
+            instance["trust_probabilities"],
+            time_limit=time_limit,
+            engine=engine,
+        )
+
+    @staticmethod
+    def to_json(value):
+        """
+        Converts the numpy values of the outputs for json.dumps.
+        """
+        if isinstance(value, (np.ndarray, np.generic)):
+            return value.tolist()
+        raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+    @staticmethod
+    def get_engines(kind: str = None):
+        """
+        :param kind: 'plan' or 'sign', or None for the engines of any kind.
+        :return: the engines of the solver of the kind, see SCMLCostModel.ENGINES, and 'auto'.
+        """
+        kinds = SCMLBatchSolver.KINDS if kind is None else (kind,)
+        return tuple(
+            dict.fromkeys(
+                [e for k in kinds for e in SCMLCostModel.ENGINES[k]] + ["auto"]
+            )
+        )
+
+    @staticmethod
+    def check_engine(kind: str, engine: str):
+        """
+        Raises a ValueError if the engine is not one of the solver of the kind, e.g., 'flow' for a plan.
+        :param kind: 'plan' or 'sign', or None for any kind.
+        :param engine: the engine.
+        """
+        if engine not in SCMLBatchSolver.get_engines(kind):
+            raise ValueError(
+                f"Unknown engine {engine}"
+                + ("" if kind is None else f" for the kind {kind}")
+                + f", expected one of {SCMLBatchSolver.get_engines(kind)}"
+            )
+
+    @staticmethod
+    def solve_line(
+        index: int, line: str, kind: str, engine: str, time_limit: float = None
+    ):
+        """
+        Solves the instance of a line of the input. This is the job run by the processes of run, so only strings
+        are sent to and from them.
+        :param index: the index of the instance in the input.
+        :param line: the line.
+        :param kind: the kind of the instances with no 'kind'.
+        :param engine: see run.
+        :param time_limit: see run.
+        :return: the line of the output, without the line break, and whether the solver raised an error.
+        """
+        record = {"index": index, "kind": kind, "id": None}
+        try:
+            instance = json.loads(line)
+            record["kind"] = instance.get("kind", kind)
+            record["id"] = instance.get("id")
+            if record["kind"] not in SCMLBatchSolver.KINDS:
+                raise ValueError(f"Unknown kind {record['kind']}")
+            SCMLBatchSolver.check_engine(record["kind"], engine)
+            t0 = time.perf_counter()
+            if record["kind"] == "plan":
+                output = SCMLBatchSolver.solve_plan(instance, engine, time_limit)
+            else:
+                output = SCMLBatchSolver.solve_sign(instance, engine, time_limit)
+            record["seconds"] = time.perf_counter() - t0
+            record["result"] = output.as_dict()
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        return json.dumps(record, default=SCMLBatchSolver.to_json), "error" in record
+
+    @staticmethod
+    def open_file(path: str, mode: str):
+        """
+        :param path: a path, '-' for the standard input or output, or a path ending in .gz for a gzip file.
+        :param mode: 'r' or 'w'.
+        :return: a context manager of a text file. The standard input and output are not closed on exit.
+        """
+        if path == "-":
+            return contextlib.nullcontext(sys.stdin if mode == "r" else sys.stdout)
+        if path.endswith(".gz"):
+            return gzip.open(path, mode + "t")
+        return open(path, mode)
+
+    @staticmethod
+    def run(
+        lines,
+        output,
+        kind: str = None,
+        engine: str = "pulp",
+        workers: int = 1,
+        window: int = None,
+        time_limit: float = None,
+        progress: int = 0,
+        log=sys.stderr,
+    ):
+        """
+        Solves the instances of a stream of lines and writes their outputs in the same order.
+        :param lines: an iterable of lines, e.g., a text file. Blank lines are skipped.
+        :param output: a text file to write the lines of the output to.
+        :param kind: the kind of the instances with no 'kind', 'plan' or 'sign'.
+        :param engine: the engine of the solvers, see SCMLContractsSigner.sign and
+        SCMLBusinessPlan.compute_business_plan. It must be an engine of kind, if given, and of any kind otherwise. The
+        instances of a kind the engine is not one of, e.g., plans with 'flow', get an error.
+        :param workers: the number of processes. With 1 worker, the instances are solved in the calling process.
+        :param window: the maximum number of instances being solved at once. Defaults to 4 per worker.
+        :param time_limit: if given, the time limit of each instance.
+        :param progress: if positive, a progress line is written to log every progress instances.
+        :param log: a text file for the progress lines.
+        :return: a map with the number of 'instances' and 'errors', the 'seconds' taken and the 'instances_per_second'.
+        """
+        SCMLBatchSolver.check_engine(kind, engine)
+        window = 4 * workers if window is None else window
+        summary = {"instances": 0, "errors": 0}
+        t0 = time.perf_counter()
+
+        def write(record: str, failed: bool):
+            output.write(record + "\n")
+            summary["instances"] += 1
+            summary["errors"] += failed
+            if progress > 0 and summary["instances"] % progress == 0:
+                seconds = time.perf_counter() - t0
+                log.write(
+                    f"{summary['instances']} instances, {summary['errors']} errors, "
+                    f"{summary['instances'] / seconds : .2f} instances/sec.\n"
+                )
+
+        instances = (
+            (index, line)
+            for index, line in enumerate(line for line in lines if line.strip())
+        )
+        if workers <= 1:
+            for index, line in instances:
+                write(
+                    *SCMLBatchSolver.solve_line(index, line, kind, engine, time_limit)
+                )
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = collections.deque()
+                for index, line in instances:
+                    if len(pending) >= window:
+                        write(*pending.popleft().result())
+                    pending.append(
+                        pool.submit(
+                            SCMLBatchSolver.solve_line,
+                            index,
+                            line,
+                            kind,
+                            engine,
+                            time_limit,
+                        )
+                    )
+                while len(pending) > 0:
+                    write(*pending.popleft().result())
+        output.flush()
+
+        summary["seconds"] = time.perf_counter() - t0
+        summary["instances_per_second"] = (
+            summary["instances"] / summary["seconds"]
+            if summary["seconds"] > 0
+            else float("inf")
+        )
+        return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Solves business plan and signer instances read as newline-delimited JSON, and writes the outputs "
+        "as newline-delimited JSON in the same order. See SCMLBatchSolver for the format."
+    )
+    parser.add_argument("input", help="the input file, '-' for the standard input")
+    parser.add_argument("--output", default="-")
+    parser.add_argument("--kind", choices=SCMLBatchSolver.KINDS, default=None)
+    parser.add_argument(
+        "--engine", choices=SCMLBatchSolver.get_engines(), default="pulp"
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--window", type=int, default=None)
+    parser.add_argument("--time-limit", type=float, default=None)
+    parser.add_argument("--progress", type=int, default=1000)
+    args = parser.parse_args()
+    with SCMLBatchSolver.open_file(
+        args.input, "r"
+    ) as input_file, SCMLBatchSolver.open_file(args.output, "w") as output_file:
+        batch_summary = SCMLBatchSolver.run(
+            input_file,
+            output_file,
+            kind=args.kind,
+            engine=args.engine,
+            workers=args.workers,
+            window=args.window,
+            time_limit=args.time_limit,
+            progress=args.progress,
+        )
+    sys.stderr.write(
+        f"{batch_summary['instances']} instances, {batch_summary['errors']} errors in "
+        f"{batch_summary['seconds'] : .2f} sec., {batch_summary['instances_per_second'] : .2f} instances/sec.\n"
+    )
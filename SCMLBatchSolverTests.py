@@ -0,0 +1,186 @@
+import io
+import json
+import random
+import unittest
+
+import numpy as np
+
+import SCMLBusinessPlanTests
+import SCMLContractsSignerTests
+from SCMLBatchSolver import SCMLBatchSolver
+from SCMLBusinessPlan import SCMLBusinessPlan
+from SCMLContractsSigner import SCMLContractsSigner
+
+
+class SCMLBatchSolverTests(unittest.TestCase):
+    @staticmethod
+    def generate_instances(how_many: int):
+        """
+        :return: a list of random plan and sign instances, as the lines of the input, and the agreements of the sign
+        instances, by id.
+        """
+        np.random.seed(0)
+        random.seed(0)
+        signer_tests = SCMLContractsSignerTests.SCMLSignerTests
+        instances = []
+        contracts = {}
+        for i in range(0, how_many):
+            if i % 2 == 0:
+                synthetic_input = (
+                    SCMLBusinessPlanTests.SCMLBusinessTests.synthetic_input_creation(
+                        6, 6
+                    )
+                )
+                instances.append(dict(synthetic_input, kind="plan", id=f"plan_{i}"))
+            else:
+                agreements = [
+                    signer_tests.generate_random_contract() for _ in range(0, 10)
+                ]
+                contracts[f"sign_{i}"] = agreements
+                instances.append(
+                    {
+                        "kind": "sign",
+                        "id": f"sign_{i}",
+                        "agent_id": signer_tests.AGENT_ID,
+                        "trust_probabilities": signer_tests.DEFAULT_TRUST_PROB,
+                        "agreements": [
+                            dict(
+                                a.agreement,
+                                partners=a.partners,
+                                is_buy=a.annotation["is_buy"],
+                            )
+                            for a in agreements
+                        ],
+                    }
+                )
+        return instances, contracts
+
+    def test_run(self):
+        """
+        The outputs must be written in the order of the input, with the same results as the solvers, with one process
+        or several.
+        """
+        instances, contracts = SCMLBatchSolverTests.generate_instances(12)
+        lines = [json.dumps(instance) + "\n" for instance in instances]
+        # A blank line is skipped, and a wrong instance gets an error but does not stop the run.
+        lines.insert(3, "\n")
+        lines.append(json.dumps({"kind": "other"}) + "\n")
+        outputs = []
+        for workers, window in ((1, None), (3, 2)):
+            output = io.StringIO()
+            summary = SCMLBatchSolver.run(
+                lines, output, engine="milp", workers=workers, window=window
+            )
+            self.assertEqual(summary["instances"], len(instances) + 1)
+            self.assertEqual(summary["errors"], 1)
+            records = [json.loads(line) for line in output.getvalue().splitlines()]
+            self.assertEqual([r["index"] for r in records], list(range(0, 13)))
+            self.assertIn("error", records[-1])
+            outputs.append([r.get("result") for r in records])
+
+            for instance, record in zip(instances, records):
+                self.assertEqual(record["id"], instance["id"])
+                self.assertEqual(record["kind"], instance["kind"])
+                if instance["kind"] == "plan":
+                    expected = SCMLBusinessPlan.compute_business_plan(
+                        **{
+                            k: v for k, v in instance.items() if k not in ("kind", "id")
+                        },
+                        engine="milp",
+                    )
+                    self.assertAlmostEqual(
+                        record["result"]["profit"], expected["profit"], places=6
+                    )
+                    self.assertEqual(
+                        {int(t): q for t, q in record["result"]["buy_plan"].items()},
+                        expected["buy_plan"],
+                    )
+                else:
+                    expected = SCMLContractsSigner.sign(
+                        instance["agent_id"],
+                        contracts[instance["id"]],
+                        instance["trust_probabilities"],
+                        engine="milp",
+                    )
+                    self.assertEqual(
+                        record["result"]["list_of_signatures"],
+                        expected["list_of_signatures"],
+                    )
+        self.assertEqual(
+            [r["profit"] if r else None for r in outputs[0]],
+            [r["profit"] if r else None for r in outputs[1]],
+        )
+
+    def test_engines(self):
+        """
+        An engine must only be used for the kinds it solves: with 'flow', the plans get an error and the signs are
+        solved, and a run of plans only is refused.
+        """
+        instances, _ = SCMLBatchSolverTests.generate_instances(6)
+        lines = [json.dumps(instance) + "\n" for instance in instances]
+        output = io.StringIO()
+        summary = SCMLBatchSolver.run(lines, output, engine="flow")
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(summary["errors"], sum(i["kind"] == "plan" for i in instances))
+        for instance, record in zip(instances, records):
+            self.assertEqual("error" in record, instance["kind"] == "plan")
+        with self.assertRaises(ValueError):
+            SCMLBatchSolver.run(lines, io.StringIO(), kind="plan", engine="flow")
+        with self.assertRaises(ValueError):
+            SCMLBatchSolver.run(lines, io.StringIO(), engine="other")
+
+    def test_read_times(self):
+        """
+        The maps by time read from JSON must get integer keys, nested lists must become arrays, and other lists maps
+        by time.
+        """
+        self.assertEqual(SCMLBatchSolver.read_times({"0": 1.5, "2": 3}), {0: 1.5, 2: 3})
+        self.assertEqual(
+            SCMLBatchSolver.read_times({"1": {"0": 0.5, "3": 0.5}}, nested=True),
+            {1: {0: 0.5, 3: 0.5}},
+        )
+        self.assertTrue(
+            np.array_equal(
+                SCMLBatchSolver.read_times([[0.5, 0.5], [1.0, 0.0]], nested=True),
+                [[0.5, 0.5], [1.0, 0.0]],
+            )
+        )
+        self.assertEqual(SCMLBatchSolver.read_times([1.5, 0, 3]), {0: 1.5, 1: 0, 2: 3})
+
+    def test_lists(self):
+        """
+        A plan whose prices, commitments and distributions are given as lists indexed by time must be solved as the
+        same plan given as maps.
+        """
+        instances, _ = SCMLBatchSolverTests.generate_instances(1)
+        instance = dict(instances[0], C_inn={1: 2}, C_out={3: 1})
+        horizon, q_max = instance["horizon"], instance["q_max"]
+        as_lists = dict(
+            instance,
+            **{
+                k: [instance[k].get(t, 0) for t in range(0, horizon)]
+                for k in ("p_inn", "p_out", "C_inn", "C_out")
+            },
+            **{
+                k: SCMLBusinessPlan.get_distribution_array(
+                    instance[k], horizon, q_max
+                ).tolist()
+                for k in ("Q_inn", "Q_out")
+            },
+        )
+        output = io.StringIO()
+        summary = SCMLBatchSolver.run(
+            [json.dumps(i) for i in (instance, as_lists)], output, engine="milp"
+        )
+        self.assertEqual(summary["errors"], 0)
+        from_maps, from_lists = (
+            json.loads(line)["result"] for line in output.getvalue().splitlines()
+        )
+        self.assertAlmostEqual(from_lists["profit"], from_maps["profit"], places=6)
+        self.assertEqual(from_lists["buy_plan"], from_maps["buy_plan"])
+        self.assertEqual(from_lists["sell_plan"], from_maps["sell_plan"])
+        self.assertGreaterEqual(from_lists["buy_plan"]["1"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+import numpy as np
+from negmas import Contract
+from typing import Dict, List
+
+
+class SCMLBreachSimulator:
+    """
+    Scores candidate sets of signatures, e.g., the outputs of the ILP and of the greedy signer, under sampled breaches
+    of the partners. SCMLContractsSigner.sign maximizes the profit weighted by the trust of each partner, but a breached
+    buy agreement also leaves the inputs it should have delivered missing, so signed sell agreements can go unfulfilled.
+    Here, in each of n realizations, each partner independently honors all its agreements with its trust probability,
+    or breaches all of them. Then, at each delivery time:
+    - the honored buy agreements deliver their inputs, which become outputs that can be sold from the next time on,
+    and are paid for,
+    - the honored sell agreements are served from the outputs in inventory. When there are not enough outputs, the
+    sell agreements of that time are served in proportion, the missing quantity is the shortfall, and a penalty of
+    penalty times the value of the shortfall is paid.
+    All candidates and all realizations are simulated at once with NumPy, looping only over the delivery times, as
+    SCMLPlanEvaluator does for business plans.
+    """
+
+    # The summaries of simulate that pick can choose by, and whether they are maximized (1) or minimized (-1).
+    CRITERIA = {
+        "expected_profit": 1,
+        "profit_p05": 1,
+        "profit_std": -1,
+        "expected_shortfall": -1,
+        "shortfall_probability": -1,
+    }
+
+    @staticmethod
+    def agreement_arrays(
+        agent_id: str, agreements: List[Contract], trust_probabilities: Dict[str, float]
+    ):
+        """
+        :param agent_id: the agent's id (self.id of the calling agent)
+        :param agreements: a list of agreements, each of type negmas.Contract.
+        :param trust_probabilities: a dictionary mapping an agent's id to its trust probability.
+        :return: a map with arrays of one entry per agreement: the index of its 'partner' in the array 'trust', the
+        index of its delivery time in the sorted distinct delivery 'times', its 'quantity', 'price', and whether it
+        'is_buy'.
+        """
+        partners = [
+            a.partners[0] if a.partners[0] != agent_id else a.partners[1]
+            for a in agreements
+        ]
+        partner_ids, partner = np.unique(
+            np.array(partners, dtype=str), return_inverse=True
+        )
+        times, time = np.unique(
+            np.array([a.agreement["time"] for a in agreements], dtype=int),
+            return_inverse=True,
+        )
+        return {
+            "partner": partner,
+            "trust": np.array(
+                [trust_probabilities[p] for p in partner_ids], dtype=float
+            ),
+            "time": time,
+            "times": times,
+            "quantity": np.array(
+                [a.agreement["quantity"] for a in agreements], dtype=float
+            ),
+            "price": np.array(
+                [a.agreement["unit_price"] for a in agreements], dtype=float
+            ),
+            "is_buy": np.array(
+                [a.annotation["is_buy"] for a in agreements], dtype=bool
+            ),
+        }
+
+    @staticmethod
+    def signatures_as_array(candidates: list, how_many: int):
+        """
+        :param candidates: a list of candidates, each a list of signatures as the entry 'list_of_signatures' of the
+        output of SCMLContractsSigner.sign, or such an output.
+        :param how_many: the number of agreements.
+        :return: a boolean array of shape (number of candidates, number of agreements) telling which are signed.
+        """
+        signed = np.zeros((len(candidates), how_many), dtype=bool)
+        for c, candidate in enumerate(candidates):
+            signatures = (
+                candidate
+                if isinstance(candidate, list)
+                else candidate["list_of_signatures"]
+            )
+            assert len(signatures) == how_many
+            signed[c] = [signature is not None for signature in signatures]
+        return signed
+
+    @staticmethod
+    def simulate(
+        agent_id: str,
+        agreements: List[Contract],
+        trust_probabilities: Dict[str, float],
+        candidates: list,
+        n: int = 1000,
+        penalty: float = 0.0,
+        initial_inventory: float = 0.0,
+        seed: int = None,
+    ):
+        """
+        Simulates the candidates under the same n realizations of the breaches.
+        :param agent_id: the agent's id (self.id of the calling agent)
+        :param agreements: the list of agreements given to the signer, each of type negmas.Contract.
+        :param trust_probabilities: a dictionary mapping an agent's id to its trust probability.
+        :param candidates: see signatures_as_array.
+        :param n: the number of realizations.
+        :param penalty: the penalty paid for each unit of a sell agreement that could not be delivered, as a fraction of
+        its unit price.
+        :param initial_inventory: the outputs in inventory before the first delivery time.
+        :param seed: a seed for the random generator.
+        :return: a map with arrays, where C is the number of candidates and N the number of realizations:
+            'profit' (C, N): revenue minus cost minus penalty,
+            'revenue' (C, N), 'cost' (C, N) and 'penalty' (C, N),
+            'shortfall' (C, N): the quantity of the honored sell agreements that could not be delivered,
+            'expected_profit' (C,), 'profit_std' (C,) and 'profit_p05' (C,): the mean, the standard deviation and the
+            5th percentile of the profit over the realizations,
+            'expected_shortfall' (C,): the mean shortfall,
+            'shortfall_probability' (C,): the fraction of realizations with a positive shortfall.
+        """
+        signed = SCMLBreachSimulator.signatures_as_array(candidates, len(agreements))
+        if len(agreements) == 0:
+            zeros = np.zeros((len(candidates), n))
+            return SCMLBreachSimulator.summarize(zeros, zeros, zeros, zeros)
+        arrays = SCMLBreachSimulator.agreement_arrays(
+            agent_id, agreements, trust_probabilities
+        )
+        rng = np.random.default_rng(seed)
+        honored = (rng.random((n, len(arrays["trust"]))) < arrays["trust"])[
+            :, arrays["partner"]
+        ]
+        # The signed and honored agreements of each candidate in each realization, of shape (C, N, A).
+        executed = (signed[:, None, :] & honored[None, :, :]).astype(float)
+
+        # The quantities and values by delivery time, of shape (C, N, T), as products with the weights of each
+        # agreement at its delivery time, of shape (A, T).
+        one_hot = np.zeros((len(agreements), len(arrays["times"])))
+        one_hot[np.arange(0, len(agreements)), arrays["time"]] = 1.0
+        value = arrays["quantity"] * arrays["price"]
+        is_buy = arrays["is_buy"]
+        bought, cost, demand, demand_value = (
+            executed @ (one_hot * weights[:, None])
+            for weights in (
+                arrays["quantity"] * is_buy,
+                value * is_buy,
+                arrays["quantity"] * ~is_buy,
+                value * ~is_buy,
+            )
+        )
+
+        sold = np.empty_like(demand)
+        level = np.full(demand.shape[:2], float(initial_inventory))
+        for t in range(0, demand.shape[2]):
+            sold[:, :, t] = np.minimum(demand[:, :, t], level)
+            level = level - sold[:, :, t] + bought[:, :, t]
+        shortfall = demand - sold
+        # The fraction of the demand of each time that is delivered, 1 when there is no demand.
+        delivered = np.divide(sold, demand, out=np.ones_like(demand), where=demand > 0)
+        return SCMLBreachSimulator.summarize(
+            revenue=(demand_value * delivered).sum(axis=2),
+            cost=cost.sum(axis=2),
+            penalty=penalty * (demand_value * (1.0 - delivered)).sum(axis=2),
+            shortfall=shortfall.sum(axis=2),
+        )
+
+    @staticmethod
+    def summarize(
+        revenue: np.ndarray,
+        cost: np.ndarray,
+        penalty: np.ndarray,
+        shortfall: np.ndarray,
+    ):
+        """
+        :param revenue: an array of shape (number of candidates, number of realizations) with the revenue.
+        :param cost: an array of the same shape with the cost.
+        :param penalty: an array of the same shape with the penalty.
+        :param shortfall: an array of the same shape with the shortfall.
+        :return: the map returned by simulate.
+        """
+        profit = revenue - cost - penalty
+        return {
+            "profit": profit,
+            "revenue": revenue,
+            "cost": cost,
+            "penalty": penalty,
+            "shortfall": shortfall,
+            "expected_profit": profit.mean(axis=1),
+            "profit_std": profit.std(axis=1),
+            "profit_p05": np.percentile(profit, 5, axis=1),
+            "expected_shortfall": shortfall.mean(axis=1),
+            "shortfall_probability": (shortfall > 0).mean(axis=1),
+        }
+
+    @staticmethod
+    def pick(
+        agent_id: str,
+        agreements: List[Contract],
+        trust_probabilities: Dict[str, float],
+        candidates: list,
+        criterion: str = "expected_profit",
+        **kwargs,
+    ):
+        """
+        Picks the best of several candidates, e.g., of the outputs of the ILP and of the greedy signer at the signing
+        step.
+        :param agent_id: see simulate.
+        :param agreements: see simulate.
+        :param trust_probabilities: see simulate.
+        :param candidates: see simulate.
+        :param criterion: the entry of the output of simulate to choose by, one of CRITERIA. The profits are maximized,
+        and the standard deviation and the shortfalls minimized.
+        :param kwargs: the other parameters of simulate.
+        :return: the index of the best candidate, the first one on ties, and the output of simulate.
+        """
+        if criterion not in SCMLBreachSimulator.CRITERIA:
+            raise ValueError(
+                f"Unknown criterion {criterion}, expected one of {list(SCMLBreachSimulator.CRITERIA)}"
+            )
+        simulation = SCMLBreachSimulator.simulate(
+            agent_id, agreements, trust_probabilities, candidates, **kwargs
+        )
+        return (
+            int(
+                np.argmax(
+                    SCMLBreachSimulator.CRITERIA[criterion] * simulation[criterion]
+                )
+            ),
+            simulation,
+        )
@@ -0,0 +1,180 @@
+import random
+import time
+import unittest
+
+import numpy as np
+from negmas import Contract
+
+import SCMLContractsSignerTests
+from SCMLBreachSimulator import SCMLBreachSimulator
+from SCMLContractsSigner import SCMLContractsSigner
+
+
+class SCMLBreachSimulatorTests(unittest.TestCase):
+    AGENT_ID = SCMLContractsSignerTests.SCMLSignerTests.AGENT_ID
+
+    @staticmethod
+    def contract(partner: str, time: int, quantity: int, price: float, is_buy: bool):
+        return Contract(
+            partners=[SCMLBreachSimulatorTests.AGENT_ID, partner],
+            agreement={"time": time, "quantity": quantity, "unit_price": price},
+            annotation={"is_buy": is_buy},
+        )
+
+    def test_manual_example(self):
+        """
+        A manual example: a supplier delivers 5 inputs at time 0 for 10 each, and two customers buy 3 and 4 outputs at
+        time 1 for 20 each. The second sell can only be signed if the inputs arrive.
+        """
+        agreements = [
+            SCMLBreachSimulatorTests.contract("SUPPLIER", 0, 5, 10.0, True),
+            SCMLBreachSimulatorTests.contract("CUSTOMER_1", 1, 3, 20.0, False),
+            SCMLBreachSimulatorTests.contract("CUSTOMER_2", 1, 4, 20.0, False),
+        ]
+        candidates = [
+            [self.AGENT_ID, self.AGENT_ID, None],
+            [self.AGENT_ID, self.AGENT_ID, self.AGENT_ID],
+            [None, None, None],
+        ]
+        reliable = SCMLBreachSimulator.simulate(
+            self.AGENT_ID,
+            agreements,
+            {"SUPPLIER": 1.0, "CUSTOMER_1": 1.0, "CUSTOMER_2": 1.0},
+            candidates,
+            n=10,
+            penalty=0.5,
+        )
+        # The second candidate sells 7 with 5 inputs: 5 of the 7 are delivered, and 2 * 20 * 0.5 is paid.
+        np.testing.assert_allclose(reliable["revenue"][:, 0], [60.0, 100.0, 0.0])
+        np.testing.assert_allclose(reliable["cost"][:, 0], [50.0, 50.0, 0.0])
+        np.testing.assert_allclose(reliable["shortfall"][:, 0], [0.0, 2.0, 0.0])
+        np.testing.assert_allclose(reliable["penalty"][:, 0], [0.0, 20.0, 0.0])
+        np.testing.assert_allclose(reliable["expected_profit"], [10.0, 30.0, 0.0])
+
+        # The supplier always breaches: nothing is bought, and every honored sell falls short.
+        unreliable = SCMLBreachSimulator.simulate(
+            self.AGENT_ID,
+            agreements,
+            {"SUPPLIER": 0.0, "CUSTOMER_1": 1.0, "CUSTOMER_2": 1.0},
+            candidates,
+            n=10,
+            penalty=0.5,
+        )
+        np.testing.assert_allclose(unreliable["cost"], 0.0)
+        np.testing.assert_allclose(unreliable["shortfall"][:, 0], [3.0, 7.0, 0.0])
+        np.testing.assert_allclose(unreliable["expected_profit"], [-30.0, -70.0, 0.0])
+        np.testing.assert_allclose(unreliable["shortfall_probability"], [1.0, 1.0, 0.0])
+
+    def test_expected_profit(self):
+        """
+        When the suppliers never breach, every honored sell of a consistent plan is delivered, so the expected profit
+        must approach the expected profit maximized by the signer.
+        """
+        random.seed(0)
+        signer_tests = SCMLContractsSignerTests.SCMLSignerTests
+        trust_probabilities = {"SUPPLIER": 1.0, "CUSTOMER_1": 0.8, "CUSTOMER_2": 0.4}
+        for _ in range(0, 5):
+            agreements = [
+                signer_tests.generate_random_contract(
+                    buy=True, partners={"SUPPLIER": 1.0}
+                )
+                for _ in range(0, 10)
+            ] + [
+                signer_tests.generate_random_contract(
+                    buy=False, partners={"CUSTOMER_1": 0.8, "CUSTOMER_2": 0.4}
+                )
+                for _ in range(0, 10)
+            ]
+            output = SCMLContractsSigner.sign(
+                self.AGENT_ID, agreements, trust_probabilities, engine="milp"
+            )
+            if output["profit"] is None:
+                continue
+            simulation = SCMLBreachSimulator.simulate(
+                self.AGENT_ID,
+                agreements,
+                trust_probabilities,
+                [output],
+                n=20000,
+                seed=0,
+            )
+            np.testing.assert_allclose(simulation["shortfall"], 0.0)
+            self.assertAlmostEqual(
+                simulation["expected_profit"][0],
+                output["profit"],
+                # Four standard errors of the mean.
+                delta=4.0 * simulation["profit_std"][0] / np.sqrt(20000) + 1e-9,
+            )
+
+    def test_pick(self):
+        """
+        Picking between the ILP and the greedy signer must return the candidate with the best criterion, and simulate
+        them fast enough to run at the signing step.
+        """
+        random.seed(0)
+        signer_tests = SCMLContractsSignerTests.SCMLSignerTests
+        partners = {"A": 0.9, "B": 0.6, "C": 0.3}
+        agreements = [
+            signer_tests.generate_random_contract(partners=partners)
+            for _ in range(0, 100)
+        ]
+        candidates = [
+            SCMLContractsSigner.sign(self.AGENT_ID, agreements, partners),
+            SCMLContractsSigner.greedy_signer(self.AGENT_ID, agreements, partners),
+        ]
+        t0 = time.perf_counter()
+        best, simulation = SCMLBreachSimulator.pick(
+            self.AGENT_ID,
+            agreements,
+            partners,
+            candidates,
+            criterion="profit_p05",
+            n=1000,
+            seed=0,
+            penalty=0.2,
+        )
+        self.assertLess(time.perf_counter() - t0, 1.0)
+        self.assertEqual(simulation["profit"].shape, (2, 1000))
+        self.assertEqual(best, int(np.argmax(simulation["profit_p05"])))
+        self.assertTrue(
+            (simulation["profit_p05"] <= simulation["expected_profit"] + 1e-9).all()
+        )
+
+    def test_pick_direction(self):
+        """
+        Picking by a shortfall must return the candidate with the smallest one, and an unknown criterion must be
+        refused.
+        """
+        agreements = [
+            SCMLBreachSimulatorTests.contract("SUPPLIER", 0, 5, 10.0, True),
+            SCMLBreachSimulatorTests.contract("CUSTOMER", 1, 8, 20.0, False),
+        ]
+        trust = {"SUPPLIER": 0.5, "CUSTOMER": 1.0}
+        # The first candidate sells more than it buys, from an unreliable supplier, so it always falls short and loses
+        # money; the second signs nothing.
+        candidates = [[self.AGENT_ID, self.AGENT_ID], [None, None]]
+        for criterion in ("expected_shortfall", "shortfall_probability", "profit_std"):
+            best, simulation = SCMLBreachSimulator.pick(
+                self.AGENT_ID,
+                agreements,
+                trust,
+                candidates,
+                criterion=criterion,
+                n=100,
+                seed=0,
+                penalty=2.0,
+            )
+            self.assertEqual(best, 1)
+            self.assertEqual(best, int(np.argmin(simulation[criterion])))
+        best, _ = SCMLBreachSimulator.pick(
+            self.AGENT_ID, agreements, trust, candidates, n=100, seed=0, penalty=2.0
+        )
+        self.assertEqual(best, 1)
+        with self.assertRaises(ValueError):
+            SCMLBreachSimulator.pick(
+                self.AGENT_ID, agreements, trust, candidates, criterion="shortfall"
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,33 @@
+import asyncio
 from collections import defaultdict
-import itertools as it
+import concurrent.futures
+import functools
 import time
 
+import numpy as np
 import pulp
 from typing import Dict
 
+from SCMLAllocationProfiler import SCMLAllocationProfiler
+from SCMLCancellation import SCMLCancellation
+from SCMLCostModel import SCMLCostModel
+from SCMLKernels import SCMLKernels
+from SCMLMilp import SCMLMilp
+from SCMLMinExpectation import SCMLMinExpectation
+from SCMLResult import SCMLBusinessPlanResult
+from SCMLSolverStatistics import SCMLSolverStatistics
+
 
 class SCMLBusinessPlan:
+    # The timings reported in the output of compute_business_plan.
+    TIMINGS = (
+        "time_to_generate_variables",
+        "time_to_generate_objective",
+        "time_to_generate_constraints",
+        "time_to_solve",
+        "time_to_read_plan",
+    )
+
     @staticmethod
     def compute_min_expectation(dict_data: Dict[int, float], size: int) -> dict:
         """
@@ -17,6 +38,14 @@ class SCMLBusinessPlan:
         :param size: the support of random variable is from 0, ..., size.
         :return: a dictionary {y : E[min(y, X)]} for y ranging from 0, ..., size.
         """
+        if SCMLKernels.enabled:
+            probabilities = np.zeros(max(size - 1, 0))
+            for x, p in dict_data.items():
+                if 0 <= x < size - 1:
+                    probabilities[x] = p
+            return dict(
+                enumerate(SCMLKernels.min_expectation(probabilities, size).tolist())
+            )
         ret = {0: 0.0}
         temp = 1
         for i in range(1, size):
@@ -25,33 +54,345 @@ class SCMLBusinessPlan:
             ret[i] = ret[i - 1] + temp
         return ret
 
+    @staticmethod
+    def get_distribution_array(
+        Q: Dict[int, Dict[int, float]], horizon: int, q_max: int, dtype=np.float64
+    ):
+        """
+        Converts a distribution over quantities into an array that can be given to the business plan solver instead of
+        the map, e.g., to publish it once to the workers of a pool with SCMLSharedTables.
+        :param Q: a map {t : { q : P(Q = q @ time t} }.
+        :param horizon: an integer denoting the length of the plan.
+        :param q_max: and integer denoting the range over which quantities will be optimized, 0, ..., q_max.
+        :param dtype: the type of the array, e.g., np.float32 to halve its size.
+        :return: an array of shape (horizon, q_max) with P(Q = q @ time t) at [t, q]. The probabilities of quantities
+        q_max and above are left out, as they are not needed to compute the minima.
+        """
+        array = np.zeros((horizon, q_max), dtype=dtype)
+        for t in range(0, horizon):
+            for q, p in Q[t].items():
+                if 0 <= q < q_max:
+                    array[t, q] = p
+        return array
+
+    @staticmethod
+    def get_distribution(Q, t: int):
+        """
+        :param Q: a map {t : { q : P(Q = q @ time t} }, or an array as returned by get_distribution_array.
+        :param t: a time.
+        :return: the map { q : P(Q = q @ time t} }.
+        """
+        if isinstance(Q, np.ndarray):
+            support = np.flatnonzero(Q[t])
+            return dict(zip(support.tolist(), Q[t][support].tolist()))
+        return Q[t]
+
     @staticmethod
     def get_minima(
         horizon: int,
         q_max: int,
         Q_inn: Dict[int, Dict[int, float]],
         Q_out: Dict[int, Dict[int, float]],
+        sparse: bool = False,
     ):
         """
         Given the time horizon, the range of the domain optimization 0, ..., q_max, and the probability
         distribution on the input and output produce, this function returns two maps:
             {t : {q : E[min(q, Q_inn) } } and {t : {q : E[min(q, Q_out) } }.
         This maps are used by the business plan solver.
+        If sparse is True, the inner maps are SCMLMinExpectation objects, which only store the support points of the
+        distribution and evaluate E[min(q, X)] on demand. They are computed in O(k log k) for k support points instead
+        of O(q_max), which pays off when q_max is large and the distributions have a small support.
         :param horizon: an integer denoting the length of the plan.
         :param q_max: and integer denoting the range over which quantities will be optimized, 0, ..., q_max.
         :param Q_inn: a map {t : { q : P(Q_inn = q @ time t} }, i.e., probabilities of seeing quantities for the buy product for each time in the horizon.
         :param Q_out: a map {t : { q : P(Q_out = q @ time t} }, i.e., probabilities of seeing quantities for the sell product for each time in the horizon.
+        :param sparse: a boolean. If True, return piecewise-linear breakpoint representations instead of dense maps.
+        Q_inn and Q_out can also be arrays, see get_distribution_array.
         :return:
         """
-        inn = {
-            t: SCMLBusinessPlan.compute_min_expectation(Q_inn[t], q_max)
-            for t in range(0, horizon)
-        }
-        out = {
-            t: SCMLBusinessPlan.compute_min_expectation(Q_out[t], q_max)
-            for t in range(0, horizon)
-        }
-        return inn, out
+        if sparse:
+            return (
+                {
+                    t: SCMLMinExpectation(SCMLBusinessPlan.get_distribution(Q, t))
+                    for t in range(0, horizon)
+                }
+                for Q in (Q_inn, Q_out)
+            )
+        return (
+            {
+                t: SCMLBusinessPlan.compute_min_expectation(
+                    SCMLBusinessPlan.get_distribution(Q, t), q_max
+                )
+                for t in range(0, horizon)
+            }
+            for Q in (Q_inn, Q_out)
+        )
+
+    @staticmethod
+    def get_minima_arrays(
+        horizon: int,
+        q_max: int,
+        Q_inn: Dict[int, Dict[int, float]],
+        Q_out: Dict[int, Dict[int, float]],
+    ):
+        """
+        Same as get_minima, but returns the two maps as NumPy arrays of shape (horizon, q_max), i.e.,
+        inn[t, q] = E[min(q, Q_inn @ time t)] and out[t, q] = E[min(q, Q_out @ time t)].
+        The dynamic program of compute_min_expectation is computed for all times at once with cumulative sums.
+        Q_inn and Q_out can also be arrays, see get_distribution_array, which are read without copies or loops.
+        :param horizon: an integer denoting the length of the plan.
+        :param q_max: and integer denoting the range over which quantities will be optimized, 0, ..., q_max.
+        :param Q_inn: a map {t : { q : P(Q_inn = q @ time t} }, i.e., probabilities of seeing quantities for the buy product for each time in the horizon.
+        :param Q_out: a map {t : { q : P(Q_out = q @ time t} }, i.e., probabilities of seeing quantities for the sell product for each time in the horizon.
+        :return: two arrays of shape (horizon, q_max).
+        """
+
+        def minima(Q):
+            # E[min(q, X)] = sum_{i = 1}^{q} P(X >= i). Only probabilities of values below q_max - 1 are needed.
+            probabilities = np.zeros((horizon, max(q_max - 1, 0)))
+            if isinstance(Q, np.ndarray):
+                width = min(Q.shape[1], q_max - 1)
+                probabilities[:, :width] = Q[:horizon, :width]
+            else:
+                for t in range(0, horizon):
+                    for x, p in Q[t].items():
+                        if 0 <= x < q_max - 1:
+                            probabilities[t, x] = p
+            ret = np.zeros((horizon, q_max))
+            ret[:, 1:] = np.cumsum(1.0 - np.cumsum(probabilities, axis=1), axis=1)
+            return ret
+
+        return minima(Q_inn), minima(Q_out)
+
+    @staticmethod
+    def get_commitments(C: Dict[int, int] = None):
+        """
+        Returns a copy of the given commitments that defaults to zero for keys not given.
+        :param C: a map {t: quantity we already committed to at time t}, or None if there are no commitments.
+        :return: a defaultdict with the commitments.
+        """
+        _G = defaultdict(int)
+        if C is not None:
+            for k, v in C.items():
+                _G[k] = v
+        return _G
+
+    @staticmethod
+    def get_fixed_quantity(committed: int, q_max: int):
+        """
+        Returns the quantity a step is fixed to when it is forced to match a commitment. As there is no variable for
+        quantities outside of 0, ..., q_max - 1, such commitments fix the quantity to zero.
+        :param committed: the committed quantity.
+        :param q_max: and integer denoting the range over which quantities will be optimized, 0, ..., q_max.
+        :return: the fixed quantity.
+        """
+        return int(committed) if committed in range(0, q_max) else 0
+
+    @staticmethod
+    def get_rolling_start(
+        q_max: int,
+        inn,
+        out,
+        p_inn: Dict[int, float],
+        p_out: Dict[int, float],
+        C_inn: Dict[int, int],
+        C_out: Dict[int, int],
+        optimistic: bool,
+        step: int,
+    ):
+        """
+        Computes the net effect of the steps before `step`, whose quantities are fixed to the commitments, so that
+        they can be left out of the business plan model.
+        :param q_max: and integer denoting the range over which quantities will be optimized, 0, ..., q_max.
+        :param inn: the minima of the input, as returned by get_minima or get_minima_arrays.
+        :param out: the minima of the output, as returned by get_minima or get_minima_arrays.
+        :param p_inn: a map {t : price for buy product @ time t}.
+        :param p_out: a map {t : price for the sell product @ time t }.
+        :param C_inn: the commitments on the input, defaulting to zero (see get_commitments).
+        :param C_out: the commitments on the output, defaulting to zero (see get_commitments).
+        :param optimistic: a boolean. If False, the inventory is measured in expectation.
+        :param step: the first step that is part of the model.
+        :return: the output inventory available at `step` and the profit of the steps before `step`.
+        """
+        initial_inventory = 0.0
+        fixed_profit = 0.0
+        for t in range(0, step):
+            b = SCMLBusinessPlan.get_fixed_quantity(C_inn[t], q_max)
+            s = SCMLBusinessPlan.get_fixed_quantity(C_out[t], q_max)
+            if optimistic:
+                initial_inventory += b - s
+            else:
+                initial_inventory += inn[t][b] - out[t][s]
+            fixed_profit += out[t][s] * p_out[t] - inn[t][b] * p_inn[t]
+        return initial_inventory, fixed_profit
+
+    @staticmethod
+    def check_commitments(
+        horizon: int,
+        q_max: int,
+        inn,
+        out,
+        C_inn: Dict[int, int],
+        C_out: Dict[int, int],
+        optimistic: bool = True,
+        step: int = 0,
+        rolling: bool = False,
+        final_inventory: float = None,
+        grid: np.ndarray = None,
+        tolerance: float = 1e-6,
+    ):
+        """
+        Checks, without building the model, whether the commitments can be met by some business plan. The expected
+        quantities E[min(q, Q)] grow with q, so the plan that buys the largest quantity at each free step and sells the
+        smallest quantity that meets the commitment satisfies every inventory constraint that any plan does. Hence,
+        one pass over the steps tells whether the model is feasible, and which steps are not.
+        Same parameters as build_model.
+        :param tolerance: the violation of a constraint that is tolerated, as the solvers do.
+        :return: a map with 'feasible', and the list of 'issues', each a map with the 'step', the 'reason', the 'side'
+        ('inn' or 'out', or None), the 'committed' quantity, the 'limit' it exceeds and a 'message'. The reasons are
+        'commitment_unreachable' (no quantity reaches the expected quantity committed to), 'fixed_step_conflict' (the
+        quantity of the step is fixed, e.g., the sells of step 0, and cannot meet the commitment),
+        'inventory_shortfall' (the sells that meet the commitments exceed the largest possible inventory) and
+        'final_inventory'.
+        """
+        first = step if rolling else 0
+        quantities = np.arange(q_max)
+        issues = []
+        inventory = 0.0
+        for t in range(0, horizon):
+            # Quantities before `step` are fixed to the commitments. At step 0, only the sells are.
+            fixed = (t < step, t < step or (t == 0 and step == 0))
+            plan = []
+            for side, (name, minima, committed) in enumerate(
+                (("inn", inn, C_inn[t]), ("out", out, C_out[t]))
+            ):
+                if isinstance(minima, np.ndarray):
+                    row = minima[t]
+                elif isinstance(minima[t], SCMLMinExpectation):
+                    row = minima[t](quantities)
+                else:
+                    row = np.array([minima[t][k] for k in quantities])
+                # No variable set means a zero quantity, so zero is always possible.
+                allowed = (
+                    np.ones(q_max, dtype=bool)
+                    if grid is None
+                    else grid[side, t] | (quantities == 0)
+                )
+                if fixed[side] or t < first:
+                    q = SCMLBusinessPlan.get_fixed_quantity(committed, q_max)
+                    q = q if allowed[q] else 0
+                    if t >= first and row[q] < committed - tolerance:
+                        issues.append(
+                            {
+                                "step": t,
+                                "reason": "fixed_step_conflict",
+                                "side": name,
+                                "committed": committed,
+                                "limit": float(row[q]),
+                                "message": f"The quantity to {('buy', 'sell')[side]} at step {t} is fixed to {q}, "
+                                f"whose expected quantity {row[q]:.3f} is below the commitment {committed}",
+                            }
+                        )
+                else:
+                    meets = np.flatnonzero(allowed & (row >= committed - tolerance))
+                    largest = np.flatnonzero(allowed)[-1]
+                    if len(meets) == 0:
+                        issues.append(
+                            {
+                                "step": t,
+                                "reason": "commitment_unreachable",
+                                "side": name,
+                                "committed": committed,
+                                "limit": float(row[largest]),
+                                "message": f"The commitment to {('buy', 'sell')[side]} {committed} at step {t} "
+                                f"exceeds the largest expected quantity, {row[largest]:.3f}",
+                            }
+                        )
+                    q = largest if side == 0 or len(meets) == 0 else meets[0]
+                plan.append(row[q] if not optimistic else q)
+            bought, sold = plan
+            if first <= t and t > 0 and sold > inventory + tolerance:
+                issues.append(
+                    {
+                        "step": t,
+                        "reason": "inventory_shortfall",
+                        "side": None,
+                        "committed": float(sold),
+                        "limit": float(inventory),
+                        "message": f"Step {t} must sell at least {sold:.3f} to meet the commitments, but at most "
+                        f"{inventory:.3f} can be in inventory",
+                    }
+                )
+            inventory += bought - sold
+        if final_inventory is not None and inventory < final_inventory - tolerance:
+            issues.append(
+                {
+                    "step": horizon,
+                    "reason": "final_inventory",
+                    "side": None,
+                    "committed": final_inventory,
+                    "limit": float(inventory),
+                    "message": f"At most {inventory:.3f} can be left in inventory after the last step, below the "
+                    f"final inventory {final_inventory}",
+                }
+            )
+        return {"feasible": len(issues) == 0, "issues": issues}
+
+    @staticmethod
+    def get_infeasible_output(
+        horizon: int,
+        q_max: int,
+        C_inn: Dict[int, int],
+        C_out: Dict[int, int],
+        optimistic: bool,
+        rolling: bool,
+        engine: str,
+        report: dict,
+        time_to_check: float,
+    ):
+        """
+        Builds the output of a business plan whose commitments cannot be met, see check_commitments. No model is built.
+        :param horizon: an integer denoting the length of the plan.
+        :param q_max: and integer denoting the range over which quantities will be optimized, 0, ..., q_max.
+        :param C_inn: the commitments on the input, defaulting to zero (see get_commitments).
+        :param C_out: the commitments on the output, defaulting to zero (see get_commitments).
+        :param optimistic: see compute_business_plan.
+        :param rolling: see compute_business_plan.
+        :param engine: the engine that was asked for.
+        :param report: the report of check_commitments, attached as 'infeasibility'.
+        :param time_to_check: the time taken to compute the minima and check the commitments.
+        :return: a SCMLBusinessPlanResult whose plans only hold the commitments, with no profit and the status
+        'Infeasible'.
+        """
+        return SCMLBusinessPlanResult(
+            horizon=horizon,
+            q_max=q_max,
+            optimistic=optimistic,
+            rolling=rolling,
+            engine=engine,
+            time_to_generate_variables=time_to_check,
+            time_to_generate_objective=time_to_check,
+            time_to_generate_constraints=time_to_check,
+            time_to_solve=0.0,
+            time_to_read_plan=0.0,
+            statistics=dict(
+                SCMLSolverStatistics.empty(),
+                solver="precheck",
+                status="Infeasible",
+                message=report["issues"][0]["message"],
+            ),
+            buy_plan={
+                t: SCMLBusinessPlan.get_fixed_quantity(C_inn[t], q_max)
+                for t in range(0, horizon)
+            },
+            sell_plan={
+                t: SCMLBusinessPlan.get_fixed_quantity(C_out[t], q_max)
+                for t in range(0, horizon)
+            },
+            profit=None,
+            infeasibility=report,
+        )
 
     @staticmethod
     def compute_business_plan(
@@ -65,6 +406,17 @@ class SCMLBusinessPlan:
         C_out: Dict[int, int] = None,
         optimistic: bool = True,
         step: int = 0,
+        time_limit: float = None,
+        engine: str = "pulp",
+        rolling: bool = False,
+        sparse_minima: bool = False,
+        debug: bool = False,
+        final_inventory: float = None,
+        grid: np.ndarray = None,
+        minima: tuple = None,
+        precheck: bool = True,
+        profile: bool = False,
+        cancellation: SCMLCancellation = None,
     ):
         """
         Constructs the business plan.
@@ -78,30 +430,259 @@ class SCMLBusinessPlan:
         :param C_out: a map {t: quantity of the output that we already committed to through contracts/agreements (or hypothetical ones)}
         :param optimistic: a boolean.
         :param step: the first step at which quantities can be nonzero
-        :return: a map with all the information about the solver and the actual business plan.
+        :param time_limit: if given, the maximum number of seconds the solver is allowed to run before returning its best solution.
+        :param engine: one of two exact engines, 'pulp', to build the model with pulp and solve it with CBC, or 'milp', to
+        build the constraint matrix directly as a sparse array and solve it with scipy.optimize.milp, or 'auto', to choose
+        between these two the one that SCMLCostModel predicts to be the fastest. The entry 'engine' of the output holds the
+        engine used, and 'engine_choice' why it was chosen.
+        :param rolling: if True, the steps before `step`, whose quantities are fixed to the commitments, are left out of
+        the model. Their net effect is carried as a starting inventory and a constant profit, so the size of the model
+        only depends on the remaining horizon.
+        :param sparse_minima: if True, the minima are kept as piecewise-linear breakpoint representations (see
+        get_minima) and evaluated directly into the model coefficients, instead of being expanded to dense tables.
+        The 'inn' and 'out' entries of the output are then SCMLMinExpectation objects.
+        :param debug: if True, the minima, the prices and the model are attached to the output for inspection.
+        :param final_inventory: if given, the plan must leave at least this much output inventory after the last step,
+        e.g., to serve sells planned beyond the horizon (see compute_business_plan_hierarchical).
+        :param grid: if given, a boolean array of shape (2, horizon, q_max) telling which quantities are considered for
+        buying (grid[0, t]) and selling (grid[1, t]) at each time t. Only those quantities get a variable. Quantities the
+        steps are fixed to must be included. See compute_business_plan_adaptive.
+        :param minima: if given, the minima (inn, out) as arrays of shape (horizon, q_max), see get_minima_arrays, e.g.,
+        published once to the workers of a pool with SCMLSharedTables. Q_inn and Q_out are then not used. The milp engine
+        reads the arrays as they are, so they can be read-only views of shared memory.
+        :param precheck: if True, the commitments are checked before the model is built, see check_commitments. If they
+        cannot be met, no solver is run: the output has no profit, its plans only hold the commitments, its status is
+        'Infeasible' and the entry 'infeasibility' holds the report of check_commitments.
+        :param profile: if True, the entry 'allocations' of the output holds the memory allocated by each phase, see
+        SCMLAllocationProfiler: 'minima', 'variables', 'objective', 'constraints', 'solve' and 'read_plan'. Only the
+        pulp engine is profiled.
+        :param cancellation: if given, a handle to kill CBC from another thread, see SCMLCancellation and
+        compute_business_plan_async.
+        Q_inn and Q_out can also be arrays, see get_distribution_array.
+        :return: a SCMLBusinessPlanResult with the plans, the profit, the timings and the model size and solver
+        statistics (see SCMLSolverStatistics).
         """
         # initialized C_inn to all zeros if not given and make sure
         # it defaults to zero for keys not given in the inputs
-        if C_inn is None:
-            C_inn = defaultdict(int)
-        else:
-            _G = defaultdict(int)
-            for k, v in C_inn.items():
-                _G[k] = k
-            C_inn = _G
+        C_inn = SCMLBusinessPlan.get_commitments(C_inn)
+        C_out = SCMLBusinessPlan.get_commitments(C_out)
+
+        choice = None
+        if engine == "auto":
+            choice = SCMLCostModel.choose(
+                "plan",
+                SCMLCostModel.plan_features(
+                    horizon - step if rolling else horizon, q_max, optimistic
+                ),
+            )
+            engine = choice["engine"]
+        if engine == "milp":
+            output = SCMLBusinessPlan.compute_business_plan_milp(
+                horizon=horizon,
+                q_max=q_max,
+                Q_inn=Q_inn,
+                Q_out=Q_out,
+                p_inn=p_inn,
+                p_out=p_out,
+                C_inn=C_inn,
+                C_out=C_out,
+                optimistic=optimistic,
+                step=step,
+                time_limit=time_limit,
+                rolling=rolling,
+                sparse_minima=sparse_minima,
+                debug=debug,
+                final_inventory=final_inventory,
+                grid=grid,
+                minima=minima,
+                precheck=precheck,
+            )
+            output.engine_choice = choice
+            return output
+        if engine != "pulp":
+            raise ValueError(f"Unknown engine {engine}")
 
-        if C_out is None:
-            C_out = defaultdict(int)
-        else:
-            _G = defaultdict(int)
-            for k, v in C_out.items():
-                _G[k] = k
-            C_out = _G
         # Time the run of the algorithm.
+        with SCMLAllocationProfiler(profile) as profiler:
+            t0 = time.time()
+
+            # Generate the minima.
+            if minima is None:
+                inn, out = SCMLBusinessPlan.get_minima(
+                    horizon, q_max, Q_inn, Q_out, sparse=sparse_minima
+                )
+            else:
+                inn, out = (
+                    {t: dict(enumerate(m[t].tolist())) for t in range(0, horizon)}
+                    for m in minima
+                )
+            if precheck:
+                report = SCMLBusinessPlan.check_commitments(
+                    horizon,
+                    q_max,
+                    inn,
+                    out,
+                    C_inn,
+                    C_out,
+                    optimistic,
+                    step,
+                    rolling,
+                    final_inventory,
+                    grid,
+                )
+                if not report["feasible"]:
+                    output = SCMLBusinessPlan.get_infeasible_output(
+                        horizon,
+                        q_max,
+                        C_inn,
+                        C_out,
+                        optimistic,
+                        rolling,
+                        engine,
+                        report,
+                        time.time() - t0,
+                    )
+                    profiler.checkpoint("minima")
+                    output.allocations = profiler.stop()
+                    output.engine_choice = choice
+                    return output
+            time_to_generate_minima = time.time() - t0
+            profiler.checkpoint("minima")
+
+            # Generate the pulp problem.
+            business_plan_model = SCMLBusinessPlan.build_model(
+                horizon=horizon,
+                q_max=q_max,
+                inn=inn,
+                out=out,
+                p_inn=p_inn,
+                p_out=p_out,
+                C_inn=C_inn,
+                C_out=C_out,
+                optimistic=optimistic,
+                step=step,
+                rolling=rolling,
+                final_inventory=final_inventory,
+                grid=grid,
+                profiler=profiler,
+            )
+            model = business_plan_model["model"]
+
+            # Solve the ILP.
+            t0 = time.time()
+            statistics = SCMLSolverStatistics.solve_pulp(
+                model, time_limit, cancellation=cancellation
+            )
+            time_to_solve = time.time() - t0
+            profiler.checkpoint("solve")
+
+            # Read the solution.
+            t0 = time.time()
+            buy_plan, sell_plan = SCMLBusinessPlan.read_plan(
+                business_plan_model, C_inn, C_out
+            )
+            time_to_read_plan = time.time() - t0
+            profiler.checkpoint("read_plan")
+
+            return SCMLBusinessPlanResult(
+                horizon=horizon,
+                q_max=q_max,
+                optimistic=optimistic,
+                rolling=rolling,
+                engine=engine,
+                time_to_generate_variables=time_to_generate_minima
+                + business_plan_model["time_to_generate_variables"],
+                time_to_generate_objective=time_to_generate_minima
+                + business_plan_model["time_to_generate_objective"],
+                time_to_generate_constraints=time_to_generate_minima
+                + business_plan_model["time_to_generate_constraints"],
+                time_to_solve=time_to_solve,
+                time_to_read_plan=time_to_read_plan,
+                statistics=statistics,
+                buy_plan=buy_plan,
+                sell_plan=sell_plan,
+                profit=pulp.value(model.objective),
+                inn=inn if debug else None,
+                out=out if debug else None,
+                p_inn=p_inn if debug else None,
+                p_out=p_out if debug else None,
+                model=model if debug else None,
+                allocations=profiler.stop(),
+                engine_choice=choice,
+            )
+
+    @staticmethod
+    def get_objective(
+        inn_vars,
+        out_vars,
+        inn,
+        out,
+        p_inn: Dict[int, float],
+        p_out: Dict[int, float],
+        fixed_profit: float,
+    ):
+        """
+        Generates the objective function - the total profit of the plan. Profit = revenue - cost
+        Here, revenue is the money received from sales of outputs, and cost is the money used to buy inputs.
+        :param inn_vars: the input variables of the model, see build_model.
+        :param out_vars: the output variables of the model, see build_model.
+        :param inn: the minima of the input, as returned by get_minima.
+        :param out: the minima of the output, as returned by get_minima.
+        :param p_inn: a map {t : price for buy product @ time t}.
+        :param p_out: a map {t : price for the sell product @ time t }.
+        :param fixed_profit: the profit of the steps left out of the model, see get_rolling_start.
+        :return: a pulp expression.
+        """
+        return (
+            pulp.lpSum(
+                [out_vars[t, k] * out[t][k] * p_out[t] for t, k in out_vars]
+                + [-inn_vars[t, k] * inn[t][k] * p_inn[t] for t, k in inn_vars]
+            )
+            + fixed_profit
+        )
+
+    @staticmethod
+    def build_model(
+        horizon: int,
+        q_max: int,
+        inn,
+        out,
+        p_inn: Dict[int, float],
+        p_out: Dict[int, float],
+        C_inn: Dict[int, int],
+        C_out: Dict[int, int],
+        optimistic: bool = True,
+        step: int = 0,
+        rolling: bool = False,
+        final_inventory: float = None,
+        grid: np.ndarray = None,
+        profiler: SCMLAllocationProfiler = None,
+    ):
+        """
+        Generates the pulp model of the business plan. Same parameters as compute_business_plan, except that the
+        minima are given instead of the quantity distributions, and the commitments must already default to zero for
+        keys not given (see get_commitments). If a profiler is given, a checkpoint is recorded after the variables,
+        the objective and the constraints.
+        :return: a map with the model, its variables, the first step that is part of the model, the starting inventory
+        and the time it took to generate the model.
+        """
+        profiler = SCMLAllocationProfiler(False) if profiler is None else profiler
         t0 = time.time()
 
-        # Generate the minima.
-        inn, out = SCMLBusinessPlan.get_minima(horizon, q_max, Q_inn, Q_out)
+        # In rolling mode, the steps before `step` are left out of the model and only their net effect is kept.
+        first = step if rolling else 0
+        initial_inventory, fixed_profit = SCMLBusinessPlan.get_rolling_start(
+            q_max, inn, out, p_inn, p_out, C_inn, C_out, optimistic, first
+        )
+
+        # The quantities considered at each step for buying and for selling: all of 0, ..., q_max - 1 unless restricted.
+        inn_quantities, out_quantities = (
+            {
+                t: [k for k in range(0, q_max) if grid is None or grid[side, t, k]]
+                for t in range(first, horizon)
+            }
+            for side in (0, 1)
+        )
 
         # Generate the pulp problem.
         model = pulp.LpProblem("Business_Plan_Solver", pulp.LpMaximize)
@@ -110,7 +691,7 @@ class SCMLBusinessPlan:
         # inn_vars[t][k] == 1 iff in the business plan the agent tries to buy k inputs at time t
         inn_vars = pulp.LpVariable.dicts(
             "inn",
-            ((t, k) for t, k in it.product(range(0, horizon), range(0, q_max))),
+            ((t, k) for t in range(first, horizon) for k in inn_quantities[t]),
             lowBound=0,
             upBound=1,
             cat="Integer",
@@ -118,125 +699,1036 @@ class SCMLBusinessPlan:
         # out_vars[t][k] == 1 iff in the business plan the agent tries to sell k inputs at time t
         out_vars = pulp.LpVariable.dicts(
             "out",
-            ((t, k) for t, k in it.product(range(0, horizon), range(0, q_max))),
+            ((t, k) for t in range(first, horizon) for k in out_quantities[t]),
             lowBound=0,
             upBound=1,
             cat="Integer",
         )
         time_to_generate_variables = time.time() - t0
+        profiler.checkpoint("variables")
 
-        # Generate the objective function - the total profit of the plan. Profit = revenue - cost
-        # Here, revenue is the money received from sales of outputs, and cost is the money used to buy inputs.
-        model += pulp.lpSum(
-            [
-                out_vars[t, k] * out[t][k] * p_out[t]
-                - inn_vars[t, k] * inn[t][k] * p_inn[t]
-                for t, k in it.product(range(0, horizon), range(0, q_max))
-            ]
+        # Generate the objective function - the total profit of the plan.
+        model += SCMLBusinessPlan.get_objective(
+            inn_vars,
+            out_vars,
+            inn,
+            out,
+            p_inn,
+            p_out,
+            fixed_profit,
         )
         time_to_generate_objective = time.time() - t0
+        profiler.checkpoint("objective")
 
         # Generate the constraints. Only one quantity can be planned for at each time step for buying or selling.
-        for t in range(0, horizon):
-            model += sum([out_vars[t, k] for k in range(0, q_max)]) <= 1
-            model += sum([inn_vars[t, k] for k in range(0, q_max)]) <= 1
+        for t in range(first, horizon):
+            model += sum([out_vars[t, k] for k in out_quantities[t]]) <= 1
+            model += sum([inn_vars[t, k] for k in inn_quantities[t]]) <= 1
 
         # Document here: optimistic == True means no bluffing, otherwise there is bluffing going on
+        right_hand_size = initial_inventory
         if optimistic:
             # Constraints that ensure there are enough outputs to sell at each time step.
-            right_hand_size = sum(
-                [inn_vars[0, k] * k - out_vars[0, k] * k for k in range(0, q_max)]
-            )
-            for t in range(1, horizon):
-                model += (
-                    sum([out_vars[t, k] * k for k in range(0, q_max)])
-                    <= right_hand_size
-                )
+            for t in range(first, horizon):
+                if t > 0:
+                    model += (
+                        sum([out_vars[t, k] * k for k in out_quantities[t]])
+                        <= right_hand_size
+                    )
                 right_hand_size += sum(
-                    [inn_vars[t, k] * k - out_vars[t, k] * k for k in range(0, q_max)]
+                    [inn_vars[t, k] * k for k in inn_quantities[t]]
+                    + [-out_vars[t, k] * k for k in out_quantities[t]]
                 )
         else:
             # Constraints that ensure there are enough outputs, in expectation, to sell at each time step.
-            right_hand_size = sum(
-                [
-                    inn_vars[0, k] * inn[0][k] - out_vars[0, k] * out[0][k]
-                    for k in range(0, q_max)
-                ]
-            )
-            for t in range(1, horizon):
-                model += (
-                    sum([out_vars[t, k] * out[t][k] for k in range(0, q_max)])
-                    <= right_hand_size
-                )
+            for t in range(first, horizon):
+                if t > 0:
+                    model += (
+                        sum([out_vars[t, k] * out[t][k] for k in out_quantities[t]])
+                        <= right_hand_size
+                    )
                 right_hand_size += sum(
-                    [
-                        inn_vars[t, k] * inn[t][k] - out_vars[t, k] * out[t][k]
-                        for k in range(0, q_max)
-                    ]
+                    [inn_vars[t, k] * inn[t][k] for k in inn_quantities[t]]
+                    + [-out_vars[t, k] * out[t][k] for k in out_quantities[t]]
                 )
+        # The inventory left after the last step must cover whatever is planned beyond the horizon.
+        if final_inventory is not None:
+            model += right_hand_size >= final_inventory
         # Adding constraints from committed inputs/outputs
-        for t in range(0, horizon):
+        for t in range(first, horizon):
             model += (
-                sum([out_vars[t, k] * out[t][k] for k in range(0, q_max)]) >= C_out[t]
+                sum([out_vars[t, k] * out[t][k] for k in out_quantities[t]]) >= C_out[t]
             )
             model += (
-                sum([inn_vars[t, k] * inn[t][k] for k in range(0, q_max)]) >= C_inn[t]
+                sum([inn_vars[t, k] * inn[t][k] for k in inn_quantities[t]]) >= C_inn[t]
             )
         # We assume that the planning starts with no inventory and thus, the agent cannot sell anything at time 0.
         # Yasser: except if it already have committed to selling.
         # Yasser: Something seems strange here. Originally, this was setting all  to 0, Should not out_vars[0, 0]
         #         have been set to 1.
         if step == 0:
-            for k in range(0, q_max):
+            for k in out_quantities[0]:
                 if k == C_out[0]:
                     model += out_vars[0, k] == 1
                 else:
                     model += out_vars[0, k] == 0
-        else:
+        elif not rolling:
             # We force all quantities before `step` to be whatever we are committed to.
             for i in range(step):
-                for k in range(0, q_max):
+                for k in out_quantities[i]:
                     if k == C_out[i]:
                         model += out_vars[i, k] == 1
                     else:
                         model += out_vars[i, k] == 0
+                for k in inn_quantities[i]:
                     if k == C_inn[i]:
                         model += inn_vars[i, k] == 1
                     else:
                         model += inn_vars[i, k] == 0
 
         time_to_generate_constraints = time.time() - t0
-
-        # Solve the ILP.
-        t0 = time.time()
-        model.solve(pulp.PULP_CBC_CMD(msg=False))
-        time_to_solve = time.time() - t0
-
-        # Read the solution.
-        t0 = time.time()
-        buy_plan = {
-            t: sum([int(k * inn_vars[t, k].varValue) for k in range(0, q_max)])
-            for t in range(0, horizon)
-        }
-        sell_plan = {
-            t: sum([int(k * out_vars[t, k].varValue) for k in range(0, q_max)])
-            for t in range(0, horizon)
-        }
-        time_to_read_plan = time.time() - t0
+        profiler.checkpoint("constraints")
 
         return {
+            "model": model,
+            "inn_vars": inn_vars,
+            "out_vars": out_vars,
+            "inn_quantities": inn_quantities,
+            "out_quantities": out_quantities,
             "horizon": horizon,
             "q_max": q_max,
-            "out": out,
-            "inn": inn,
-            "p_out": p_out,
-            "p_inn": p_inn,
-            "optimistic": optimistic,
+            "first": first,
+            "initial_inventory": initial_inventory,
             "time_to_generate_variables": time_to_generate_variables,
             "time_to_generate_objective": time_to_generate_objective,
             "time_to_generate_constraints": time_to_generate_constraints,
-            "time_to_solve": time_to_solve,
-            "time_to_read_plan": time_to_read_plan,
-            "buy_plan": buy_plan,
-            "sell_plan": sell_plan,
         }
+
+    @staticmethod
+    def read_plan(business_plan_model, C_inn: Dict[int, int], C_out: Dict[int, int]):
+        """
+        Reads the plan from a solved model. The steps left out of the model in rolling mode are fixed to the
+        commitments.
+        :param business_plan_model: a map as returned by build_model, whose model has been solved.
+        :param C_inn: the commitments on the input, defaulting to zero (see get_commitments).
+        :param C_out: the commitments on the output, defaulting to zero (see get_commitments).
+        :return: the buy plan {t : quantity} and the sell plan {t : quantity}.
+        """
+        horizon = business_plan_model["horizon"]
+        q_max = business_plan_model["q_max"]
+        first = business_plan_model["first"]
+        inn_vars = business_plan_model["inn_vars"]
+        out_vars = business_plan_model["out_vars"]
+        buy_plan = {
+            t: SCMLBusinessPlan.get_fixed_quantity(C_inn[t], q_max)
+            for t in range(0, first)
+        }
+        sell_plan = {
+            t: SCMLBusinessPlan.get_fixed_quantity(C_out[t], q_max)
+            for t in range(0, first)
+        }
+        for t in range(first, horizon):
+            buy_plan[t] = sum(
+                [
+                    int(k * inn_vars[t, k].varValue)
+                    for k in business_plan_model["inn_quantities"][t]
+                ]
+            )
+            sell_plan[t] = sum(
+                [
+                    int(k * out_vars[t, k].varValue)
+                    for k in business_plan_model["out_quantities"][t]
+                ]
+            )
+        return buy_plan, sell_plan
+
+    @staticmethod
+    def compute_business_plan_milp(
+        horizon: int,
+        q_max: int,
+        Q_inn: Dict[int, Dict[int, float]],
+        Q_out: Dict[int, Dict[int, float]],
+        p_inn: Dict[int, float],
+        p_out: Dict[int, float],
+        C_inn: Dict[int, int],
+        C_out: Dict[int, int],
+        optimistic: bool = True,
+        step: int = 0,
+        time_limit: float = None,
+        rolling: bool = False,
+        sparse_minima: bool = False,
+        debug: bool = False,
+        final_inventory: float = None,
+        grid: np.ndarray = None,
+        integral: bool = True,
+        minima: tuple = None,
+        precheck: bool = True,
+    ):
+        """
+        Constructs the business plan with the array-based model of SCMLMilp. Same parameters as compute_business_plan,
+        except that the commitments must already default to zero for keys not given (see get_commitments).
+        :param integral: if False, the LP relaxation is solved instead. Its profit is then an upper bound on the profit
+        of any plan, and the plans are meaningless.
+        :return: a SCMLBusinessPlanResult with the plans, the profit and the timings.
+        """
+        t0 = time.time()
+        if sparse_minima and minima is None:
+            # The breakpoints are evaluated straight into the coefficient arrays of the model.
+            minima_inn, minima_out = SCMLBusinessPlan.get_minima(
+                horizon, q_max, Q_inn, Q_out, sparse=True
+            )
+            quantities = np.arange(q_max)
+            inn = np.array([minima_inn[t](quantities) for t in range(0, horizon)])
+            out = np.array([minima_out[t](quantities) for t in range(0, horizon)])
+        else:
+            inn, out = (
+                SCMLBusinessPlan.get_minima_arrays(horizon, q_max, Q_inn, Q_out)
+                if minima is None
+                else minima
+            )
+            # The minima are only expanded to the dictionaries of get_minima when they are attached to the output.
+            minima_inn = minima_out = None
+            if debug:
+                minima_inn = {
+                    t: dict(enumerate(inn[t].tolist())) for t in range(0, horizon)
+                }
+                minima_out = {
+                    t: dict(enumerate(out[t].tolist())) for t in range(0, horizon)
+                }
+        if precheck:
+            report = SCMLBusinessPlan.check_commitments(
+                horizon,
+                q_max,
+                inn,
+                out,
+                C_inn,
+                C_out,
+                optimistic,
+                step,
+                rolling,
+                final_inventory,
+                grid,
+            )
+            if not report["feasible"]:
+                return SCMLBusinessPlan.get_infeasible_output(
+                    horizon,
+                    q_max,
+                    C_inn,
+                    C_out,
+                    optimistic,
+                    rolling,
+                    "milp",
+                    report,
+                    time.time() - t0,
+                )
+        first = step if rolling else 0
+        initial_inventory, fixed_profit = SCMLBusinessPlan.get_rolling_start(
+            q_max, inn, out, p_inn, p_out, C_inn, C_out, optimistic, first
+        )
+
+        # Quantities before `step` are fixed to whatever we are committed to. At step 0, only the sells are.
+        fixed_inn = np.full(horizon, np.nan)
+        fixed_out = np.full(horizon, np.nan)
+        for t in range(0, step):
+            fixed_inn[t] = C_inn[t]
+            fixed_out[t] = C_out[t]
+        if step == 0:
+            fixed_out[0] = C_out[0]
+        time_to_generate_minima = time.time() - t0
+
+        solution = SCMLMilp.solve_business_plan(
+            inn=inn[first:],
+            out=out[first:],
+            p_inn=np.array([p_inn[t] for t in range(first, horizon)], dtype=float),
+            p_out=np.array([p_out[t] for t in range(first, horizon)], dtype=float),
+            C_inn=np.array([C_inn[t] for t in range(first, horizon)], dtype=float),
+            C_out=np.array([C_out[t] for t in range(first, horizon)], dtype=float),
+            fixed_inn=fixed_inn[first:],
+            fixed_out=fixed_out[first:],
+            optimistic=optimistic,
+            initial_inventory=initial_inventory if first > 0 else None,
+            time_limit=time_limit,
+            final_inventory=final_inventory,
+            grid=None if grid is None else grid[:, first:],
+            integral=integral,
+        )
+        buy_plan = {
+            t: SCMLBusinessPlan.get_fixed_quantity(C_inn[t], q_max)
+            for t in range(0, first)
+        }
+        sell_plan = {
+            t: SCMLBusinessPlan.get_fixed_quantity(C_out[t], q_max)
+            for t in range(0, first)
+        }
+        for t, (b, s) in enumerate(
+            zip(solution["buy_plan"].tolist(), solution["sell_plan"].tolist()), first
+        ):
+            buy_plan[t] = b
+            sell_plan[t] = s
+
+        return SCMLBusinessPlanResult(
+            horizon=horizon,
+            q_max=q_max,
+            optimistic=optimistic,
+            rolling=rolling,
+            engine="milp",
+            time_to_generate_variables=time_to_generate_minima
+            + solution["time_to_generate_variables"],
+            time_to_generate_objective=time_to_generate_minima
+            + solution["time_to_generate_objective"],
+            time_to_generate_constraints=time_to_generate_minima
+            + solution["time_to_generate_constraints"],
+            time_to_solve=solution["time_to_solve"],
+            time_to_read_plan=solution["time_to_read_plan"],
+            statistics=solution["statistics"],
+            buy_plan=buy_plan,
+            sell_plan=sell_plan,
+            profit=None
+            if solution["profit"] is None
+            else solution["profit"] + fixed_profit,
+            inn=minima_inn if debug else None,
+            out=minima_out if debug else None,
+            p_inn=p_inn if debug else None,
+            p_out=p_out if debug else None,
+        )
+
+    @staticmethod
+    def get_buckets(horizon: int, fine_end: int, bucket_size: int):
+        """
+        Splits the time steps into buckets of bucket_size consecutive steps. The steps before and after fine_end are
+        split separately, so that no bucket straddles fine_end.
+        :param horizon: an integer denoting the length of the plan.
+        :param fine_end: the first step that is not planned at full resolution.
+        :param bucket_size: the number of steps in a bucket. The last bucket of each side can be shorter.
+        :return: a list of ranges, one per bucket.
+        """
+        starts = list(range(0, fine_end, bucket_size)) + list(
+            range(fine_end, horizon, bucket_size)
+        )
+        return [range(s, e) for s, e in zip(starts, starts[1:] + [horizon])]
+
+    @staticmethod
+    def compute_business_plan_hierarchical(
+        horizon: int,
+        q_max: int,
+        Q_inn: Dict[int, Dict[int, float]],
+        Q_out: Dict[int, Dict[int, float]],
+        p_inn: Dict[int, float],
+        p_out: Dict[int, float],
+        C_inn: Dict[int, int] = None,
+        C_out: Dict[int, int] = None,
+        optimistic: bool = True,
+        step: int = 0,
+        time_limit: float = None,
+        engine: str = "pulp",
+        rolling: bool = False,
+        fine_steps: int = 10,
+        bucket_size: int = 5,
+        precheck: bool = True,
+        debug: bool = False,
+    ):
+        """
+        Constructs the business plan coarse-to-fine, for horizons too long to be planned at full resolution.
+        First, an aggregated plan is computed over buckets of bucket_size steps. Each bucket is a single step of the
+        aggregated model whose quantity distribution is the average of the distributions of its steps, i.e., the
+        distribution of the quantity at a random step of the bucket, and whose prices are the average prices. The
+        aggregated plan trades the same quantity at every step of a bucket, so the commitments of a bucket are summed
+        and spread over its steps, rounded up to an integer. The buckets that end before `step` are fixed.
+        Then, only the fine_steps steps from `step` on are planned at full resolution. The steps beyond them follow
+        the aggregated plan, raised to the smallest quantities that meet their commitments, and the output inventory
+        they need on arrival is imposed as final inventory of the fine plan, so the whole plan is feasible at full
+        resolution. If the fine steps cannot build up that inventory, the steps beyond them are left to their
+        commitments instead.
+        The parameters are the same as in compute_business_plan, plus:
+        :param fine_steps: the number of steps, from `step` on, planned at full resolution.
+        :param bucket_size: the number of steps aggregated in each bucket of the coarse plan.
+        :param precheck: if True, the commitments are checked over the whole horizon before any model is built, see
+            check_commitments.
+        :return: a SCMLBusinessPlanResult with the plans over the whole horizon, their expected profit and the timings of
+        both phases. With debug=True, the minima and prices are attached, but not the models. The statistics are the
+        ones of the fine plan. If the commitments cannot be met, or the aggregated plan is infeasible, there is no
+        profit and the plans only hold the commitments; the statistics and 'infeasibility' are then the ones of the
+        check or of the aggregated plan, whose steps are buckets.
+        """
+        fine_end = min(horizon, step + fine_steps)
+        if fine_end == horizon:
+            return SCMLBusinessPlan.compute_business_plan(
+                horizon=horizon,
+                q_max=q_max,
+                Q_inn=Q_inn,
+                Q_out=Q_out,
+                p_inn=p_inn,
+                p_out=p_out,
+                C_inn=C_inn,
+                C_out=C_out,
+                optimistic=optimistic,
+                step=step,
+                time_limit=time_limit,
+                engine=engine,
+                rolling=rolling,
+                precheck=precheck,
+                debug=debug,
+            )
+        t0 = time.time()
+        C_inn = SCMLBusinessPlan.get_commitments(C_inn)
+        C_out = SCMLBusinessPlan.get_commitments(C_out)
+        inn, out = SCMLBusinessPlan.get_minima_arrays(horizon, q_max, Q_inn, Q_out)
+        if precheck:
+            report = SCMLBusinessPlan.check_commitments(
+                horizon, q_max, inn, out, C_inn, C_out, optimistic, step, rolling
+            )
+            if not report["feasible"]:
+                return SCMLBusinessPlan.get_infeasible_output(
+                    horizon,
+                    q_max,
+                    C_inn,
+                    C_out,
+                    optimistic,
+                    rolling,
+                    engine,
+                    report,
+                    time.time() - t0,
+                )
+
+        # Aggregate the steps into buckets and solve the coarse plan.
+        buckets = SCMLBusinessPlan.get_buckets(horizon, fine_end, bucket_size)
+
+        def aggregate_distribution(Q, bucket):
+            aggregated = defaultdict(float)
+            for t in bucket:
+                for q, p in Q[t].items():
+                    aggregated[q] += p / len(bucket)
+            return dict(aggregated)
+
+        def aggregate(values, bucket):
+            return sum(values[t] for t in bucket) / len(bucket)
+
+        def aggregate_commitments(C, bucket):
+            return int(np.ceil(sum(C[t] for t in bucket) / len(bucket) - 1e-9))
+
+        coarse_output = SCMLBusinessPlan.compute_business_plan(
+            horizon=len(buckets),
+            q_max=q_max,
+            Q_inn={b: aggregate_distribution(Q_inn, r) for b, r in enumerate(buckets)},
+            Q_out={b: aggregate_distribution(Q_out, r) for b, r in enumerate(buckets)},
+            p_inn={b: aggregate(p_inn, r) for b, r in enumerate(buckets)},
+            p_out={b: aggregate(p_out, r) for b, r in enumerate(buckets)},
+            C_inn={b: aggregate_commitments(C_inn, r) for b, r in enumerate(buckets)},
+            C_out={b: aggregate_commitments(C_out, r) for b, r in enumerate(buckets)},
+            optimistic=optimistic,
+            step=sum(1 for r in buckets if r.stop <= step),
+            time_limit=time_limit,
+            engine=engine,
+            rolling=rolling,
+            precheck=precheck,
+        )
+        if coarse_output["profit"] is None:
+            return SCMLBusinessPlanResult(
+                horizon=horizon,
+                q_max=q_max,
+                optimistic=optimistic,
+                rolling=rolling,
+                engine=engine,
+                time_to_generate_variables=coarse_output["time_to_generate_variables"],
+                time_to_generate_objective=coarse_output["time_to_generate_objective"],
+                time_to_generate_constraints=coarse_output[
+                    "time_to_generate_constraints"
+                ],
+                time_to_solve=coarse_output["time_to_solve"],
+                time_to_read_plan=coarse_output["time_to_read_plan"],
+                statistics=coarse_output["statistics"],
+                buy_plan={
+                    t: SCMLBusinessPlan.get_fixed_quantity(C_inn[t], q_max)
+                    for t in range(0, horizon)
+                },
+                sell_plan={
+                    t: SCMLBusinessPlan.get_fixed_quantity(C_out[t], q_max)
+                    for t in range(0, horizon)
+                },
+                profit=None,
+                infeasibility=coarse_output["infeasibility"],
+            )
+
+        def meet_commitment(minima, committed):
+            # The smallest quantity whose expected quantity meets the commitment. The check guarantees there is one.
+            meets = np.flatnonzero(minima >= committed - 1e-6)
+            return int(meets[0]) if len(meets) > 0 else q_max - 1
+
+        # Expand the coarse plan beyond the fine steps, meeting the commitments.
+        buy_plan, sell_plan = {}, {}
+        for b, bucket in enumerate(buckets):
+            for t in bucket:
+                if t >= fine_end:
+                    buy_plan[t] = max(
+                        coarse_output["buy_plan"][b], meet_commitment(inn[t], C_inn[t])
+                    )
+                    sell_plan[t] = max(
+                        coarse_output["sell_plan"][b],
+                        meet_commitment(out[t], C_out[t]),
+                    )
+
+        # The output inventory needed at fine_end so that the expanded plan never sells more than it has.
+        def tail_requirement():
+            level, needed = 0.0, 0.0
+            for t in range(fine_end, horizon):
+                bought, sold = (
+                    (buy_plan[t], sell_plan[t])
+                    if optimistic
+                    else (inn[t, buy_plan[t]], out[t, sell_plan[t]])
+                )
+                needed = max(needed, sold - level)
+                level += bought - sold
+            return needed
+
+        def solve_fine(final_inventory):
+            return SCMLBusinessPlan.compute_business_plan(
+                horizon=fine_end,
+                q_max=q_max,
+                Q_inn=Q_inn,
+                Q_out=Q_out,
+                p_inn=p_inn,
+                p_out=p_out,
+                C_inn=C_inn,
+                C_out=C_out,
+                optimistic=optimistic,
+                step=step,
+                time_limit=time_limit,
+                engine=engine,
+                rolling=rolling,
+                final_inventory=final_inventory,
+                precheck=precheck,
+            )
+
+        def fine_inventory(fine_output):
+            return sum(
+                (
+                    fine_output["buy_plan"][t] - fine_output["sell_plan"][t]
+                    if optimistic
+                    else inn[t, fine_output["buy_plan"][t]]
+                    - out[t, fine_output["sell_plan"][t]]
+                )
+                for t in range(0, fine_end)
+            )
+
+        final_inventory = tail_requirement()
+        fine_output = solve_fine(final_inventory)
+        if fine_output["profit"] is None or (
+            fine_inventory(fine_output) < final_inventory - 1e-6
+        ):
+            # The fine steps cannot serve the coarse plan: only keep the commitments beyond them.
+            for t in range(fine_end, horizon):
+                buy_plan[t] = meet_commitment(inn[t], C_inn[t])
+                sell_plan[t] = meet_commitment(out[t], C_out[t])
+            final_inventory = tail_requirement()
+            fine_output = solve_fine(final_inventory)
+        for t in range(0, fine_end):
+            buy_plan[t] = fine_output["buy_plan"][t]
+            sell_plan[t] = fine_output["sell_plan"][t]
+
+        profit = fine_output["profit"]
+        if profit is not None:
+            profit += sum(
+                out[t, sell_plan[t]] * p_out[t] - inn[t, buy_plan[t]] * p_inn[t]
+                for t in range(fine_end, horizon)
+            )
+
+        return SCMLBusinessPlanResult(
+            horizon=horizon,
+            q_max=q_max,
+            optimistic=optimistic,
+            rolling=rolling,
+            engine=engine,
+            time_to_generate_variables=coarse_output["time_to_generate_variables"]
+            + fine_output["time_to_generate_variables"],
+            time_to_generate_objective=coarse_output["time_to_generate_objective"]
+            + fine_output["time_to_generate_objective"],
+            time_to_generate_constraints=coarse_output["time_to_generate_constraints"]
+            + fine_output["time_to_generate_constraints"],
+            time_to_solve=coarse_output["time_to_solve"] + fine_output["time_to_solve"],
+            time_to_read_plan=coarse_output["time_to_read_plan"]
+            + fine_output["time_to_read_plan"],
+            statistics=fine_output["statistics"],
+            buy_plan={t: buy_plan[t] for t in range(0, horizon)},
+            sell_plan={t: sell_plan[t] for t in range(0, horizon)},
+            profit=profit,
+            inn={t: dict(enumerate(inn[t].tolist())) for t in range(0, horizon)}
+            if debug
+            else None,
+            out={t: dict(enumerate(out[t].tolist())) for t in range(0, horizon)}
+            if debug
+            else None,
+            p_inn=p_inn if debug else None,
+            p_out=p_out if debug else None,
+            infeasibility=fine_output["infeasibility"],
+        )
+
+    @staticmethod
+    def refine_grid(
+        base: np.ndarray,
+        buy_plan: Dict[int, int],
+        sell_plan: Dict[int, int],
+        spacing: int,
+        width: int = 2,
+    ):
+        """
+        Builds a quantity grid around the quantities of a plan: for each step and side, the planned quantity k and the
+        quantities k + j * spacing, for 0 < |j| <= width, are kept, on top of the quantities of the base grid.
+        :param base: a boolean array of shape (2, horizon, q_max) with the quantities always kept, see
+            compute_business_plan. It is not modified.
+        :param buy_plan: a map {t : quantity to buy at time t}.
+        :param sell_plan: a map {t : quantity to sell at time t}.
+        :param spacing: the distance between consecutive quantities around the planned ones.
+        :param width: the number of quantities kept on each side of the planned ones.
+        :return: the new grid.
+        """
+        grid = base.copy()
+        q_max = grid.shape[2]
+        offsets = spacing * np.arange(-width, width + 1)
+        for side, plan in enumerate((buy_plan, sell_plan)):
+            for t, k in plan.items():
+                if t >= grid.shape[1]:
+                    continue
+                quantities = k + offsets
+                grid[
+                    side, t, quantities[(quantities >= 0) & (quantities < q_max)]
+                ] = True
+        return grid
+
+    @staticmethod
+    def compute_business_plan_adaptive(
+        horizon: int,
+        q_max: int,
+        Q_inn: Dict[int, Dict[int, float]],
+        Q_out: Dict[int, Dict[int, float]],
+        p_inn: Dict[int, float],
+        p_out: Dict[int, float],
+        C_inn: Dict[int, int] = None,
+        C_out: Dict[int, int] = None,
+        optimistic: bool = True,
+        step: int = 0,
+        time_limit: float = None,
+        engine: str = "pulp",
+        rolling: bool = False,
+        initial_points: int = 5,
+        max_rounds: int = None,
+        tolerance: float = 1e-4,
+        bound: bool = True,
+        debug: bool = False,
+    ):
+        """
+        Constructs the business plan on an adaptive quantity grid, for large q_max. The plan is first computed with
+        only initial_points evenly spaced quantities per step and side (plus the committed quantities). Then, the
+        spacing is halved and the plan recomputed on a grid with only a few quantities around the planned ones (see
+        refine_grid), until the spacing is 1 and the profit stops improving, or max_rounds plans have been computed.
+        The previous plan is always in the new grid, so the profit never decreases from one round to the next, while
+        each round solves a model about as small as the first one. Sparse grids that only grow are avoided on purpose:
+        their LP relaxations are weak and CBC can then take much longer on them than on the full grid.
+        The parameters are the same as in compute_business_plan, plus:
+        :param initial_points: the number of evenly spaced quantities of the initial grid, and of quantities kept
+            around each planned quantity in the following rounds.
+        :param max_rounds: if given, the maximum number of plans computed.
+        :param tolerance: once the spacing is 1, the rounds stop when the profit improves by less than this fraction.
+        :param bound: if True, the LP relaxation of the full-grid model is solved to bound the full-grid optimum.
+        :return: a SCMLBusinessPlanResult with the final plan, the timings summed over all rounds, and
+            'refinement_rounds': the number of plans computed,
+            'grid_size': the fraction of the full grid's variables used in the last round,
+            'upper_bound': an upper bound on the full-grid optimal profit, or None if bound is False,
+            'gap': (upper_bound - profit) / max(1, |upper_bound|), i.e., how far, at most, the plan is from the
+            full-grid optimum, or None if bound is False.
+        """
+        C_inn = SCMLBusinessPlan.get_commitments(C_inn)
+        C_out = SCMLBusinessPlan.get_commitments(C_out)
+
+        initial_points = max(2, min(initial_points, q_max))
+        base = np.zeros((2, horizon, q_max), dtype=bool)
+        for t in range(0, horizon):
+            base[0, t, SCMLBusinessPlan.get_fixed_quantity(C_inn[t], q_max)] = True
+            base[1, t, SCMLBusinessPlan.get_fixed_quantity(C_out[t], q_max)] = True
+        grid = base.copy()
+        grid[:, :, np.linspace(0, q_max - 1, initial_points).round().astype(int)] = True
+        spacing = max(1, (q_max - 1) // (initial_points - 1))
+
+        timings = defaultdict(float)
+        rounds = 0
+        output = None
+        while True:
+            previous = output
+            output = SCMLBusinessPlan.compute_business_plan(
+                horizon=horizon,
+                q_max=q_max,
+                Q_inn=Q_inn,
+                Q_out=Q_out,
+                p_inn=p_inn,
+                p_out=p_out,
+                C_inn=C_inn,
+                C_out=C_out,
+                optimistic=optimistic,
+                step=step,
+                time_limit=time_limit,
+                engine=engine,
+                rolling=rolling,
+                debug=debug,
+                grid=grid,
+            )
+            rounds += 1
+            for key in SCMLBusinessPlan.TIMINGS:
+                timings[key] += output[key]
+            if output["profit"] is None:
+                output = previous if previous is not None else output
+                break
+            if (
+                spacing == 1
+                and previous is not None
+                and output["profit"]
+                <= previous["profit"] + tolerance * max(1.0, abs(previous["profit"]))
+            ):
+                # The solvers stop within a small gap of the optimum, so plans of almost equal profit could
+                # alternate forever: stop as soon as the profit does not improve, and keep the best plan.
+                output = max(previous, output, key=lambda o: o["profit"])
+                break
+            if max_rounds is not None and rounds >= max_rounds:
+                break
+            spacing = max(1, spacing // 2)
+            grid = SCMLBusinessPlan.refine_grid(
+                base,
+                output["buy_plan"],
+                output["sell_plan"],
+                spacing,
+                width=initial_points // 2,
+            )
+
+        upper_bound = gap = None
+        if bound:
+            upper_bound = SCMLBusinessPlan.compute_business_plan_milp(
+                horizon=horizon,
+                q_max=q_max,
+                Q_inn=Q_inn,
+                Q_out=Q_out,
+                p_inn=p_inn,
+                p_out=p_out,
+                C_inn=C_inn,
+                C_out=C_out,
+                optimistic=optimistic,
+                step=step,
+                time_limit=time_limit,
+                rolling=rolling,
+                integral=False,
+            )["profit"]
+            if upper_bound is not None and output["profit"] is not None:
+                gap = (upper_bound - output["profit"]) / max(1.0, abs(upper_bound))
+
+        first = step if rolling else 0
+        return SCMLBusinessPlanResult(
+            **{
+                **output.as_dict(),
+                **timings,
+                "refinement_rounds": rounds,
+                "grid_size": grid[:, first:].sum() / (2 * (horizon - first) * q_max),
+                "upper_bound": upper_bound,
+                "gap": gap,
+            }
+        )
+
+    @staticmethod
+    def get_price_grid(prices, horizon: int):
+        """
+        Converts a grid of price vectors into an array.
+        :param prices: a list of maps {t : price @ time t}, or an array-like of shape (number of points, horizon).
+        :param horizon: an integer denoting the length of the plan.
+        :return: an array of shape (number of points, horizon).
+        """
+        if len(prices) > 0 and isinstance(prices[0], dict):
+            prices = [[p[t] for t in range(0, horizon)] for p in prices]
+        return np.atleast_2d(np.asarray(prices, dtype=float))
+
+    @staticmethod
+    def compute_business_plan_sweep(
+        horizon: int,
+        q_max: int,
+        Q_inn: Dict[int, Dict[int, float]],
+        Q_out: Dict[int, Dict[int, float]],
+        p_inn_grid,
+        p_out_grid,
+        C_inn: Dict[int, int] = None,
+        C_out: Dict[int, int] = None,
+        optimistic: bool = True,
+        step: int = 0,
+        time_limit: float = None,
+        engine: str = "pulp",
+        rolling: bool = False,
+        sparse_minima: bool = False,
+        skip_unchanged: bool = True,
+        precheck: bool = True,
+    ):
+        """
+        Constructs the business plans for a grid of price vectors, e.g., to evaluate pricing decisions. Prices only
+        appear in the objective, so the minima and the model are generated once and only the objective is replaced
+        at each point.
+        For a fixed plan, the profit is linear in the prices, so the optimal profit is a convex function of the prices.
+        Hence, if two points have the same optimal plan, that plan is also optimal at any point of the segment between
+        them (up to the solver's gap). When skip_unchanged is True, the grid is treated as a path: the end points are
+        solved first, and the points in between are only solved (by bisection) where the plans of the ends of a
+        segment differ, where they do not lie on that segment, or where either end is not optimal.
+        :param horizon: an integer denoting the length of the plan.
+        :param q_max: and integer denoting the range over which quantities will be optimized, 0, ..., q_max.
+        :param Q_inn: a map {t : { q : P(Q_inn = q @ time t} }, i.e., probabilities of seeing quantities for the buy product for each time in the horizon.
+        :param Q_out: a map {t : { q : P(Q_out = q @ time t} }, i.e., probabilities of seeing quantities for the sell product for each time in the horizon.
+        :param p_inn_grid: the buy prices of each point, in any of the forms accepted by get_price_grid.
+        :param p_out_grid: the sell prices of each point, in the same order.
+        :param C_inn: a map {t: quantity of the input that we already committed to through contracts/agreements (or hypothetical ones)}
+        :param C_out: a map {t: quantity of the output that we already committed to through contracts/agreements (or hypothetical ones)}
+        :param optimistic: a boolean.
+        :param step: the first step at which quantities can be nonzero
+        :param time_limit: if given, the maximum number of seconds the solver is allowed to run at each point.
+        :param engine: the engine, see compute_business_plan. With 'milp', the model structure is cached by SCMLMilp,
+        so only its coefficients are refilled at each point.
+        :param rolling: whether to leave the steps before `step` out of the model, see compute_business_plan.
+        :param sparse_minima: whether to keep the minima as breakpoint representations, see compute_business_plan.
+        Only used by the pulp engine.
+        :param skip_unchanged: if True, skip the points whose plan is known to be optimal from the plans around them.
+        :param precheck: if True, the commitments are checked once before the model is built, see check_commitments.
+        They do not depend on the prices, so if they cannot be met, no point is solved.
+        :return: a map with arrays, where G is the number of points and T the horizon: 'p_inn' (G, T), 'p_out' (G, T),
+        'buy_plans' (G, T), 'sell_plans' (G, T), 'profits' (G,), 'statuses' (G,), the status of each point with the
+        names of pulp.LpStatus, and 'solved' (G,), True for the points that were actually solved, as well as the
+        'engine' used, the time spent generating the model and solving, and the 'infeasibility' report of
+        check_commitments if the commitments cannot be met. The points that are not 'Optimal' have a NaN profit and
+        plans that only hold the commitments.
+        """
+        C_inn = SCMLBusinessPlan.get_commitments(C_inn)
+        C_out = SCMLBusinessPlan.get_commitments(C_out)
+        p_inn_grid = SCMLBusinessPlan.get_price_grid(p_inn_grid, horizon)
+        p_out_grid = SCMLBusinessPlan.get_price_grid(p_out_grid, horizon)
+        assert p_inn_grid.shape == p_out_grid.shape
+        size = len(p_inn_grid)
+
+        choice = None
+        if engine == "auto":
+            choice = SCMLCostModel.choose(
+                "plan",
+                SCMLCostModel.plan_features(
+                    horizon - step if rolling else horizon, q_max, optimistic
+                ),
+            )
+            engine = choice["engine"]
+        if engine not in ("pulp", "milp"):
+            raise ValueError(f"Unknown engine {engine}")
+
+        buy_plans = np.zeros((size, horizon), dtype=int)
+        sell_plans = np.zeros((size, horizon), dtype=int)
+        profits = np.full(size, np.nan)
+        statuses = np.full(size, None, dtype=object)
+        solved = np.zeros(size, dtype=bool)
+        # The plans of the points that are not optimal, which only hold the commitments.
+        fixed_plans = [
+            [
+                SCMLBusinessPlan.get_fixed_quantity(C[t], q_max)
+                for t in range(0, horizon)
+            ]
+            for C in (C_inn, C_out)
+        ]
+        time_to_solve = 0.0
+
+        def get_output(time_to_generate_model: float, report: dict = None):
+            return {
+                "horizon": horizon,
+                "q_max": q_max,
+                "optimistic": optimistic,
+                "rolling": rolling,
+                "engine": engine,
+                "engine_choice": choice,
+                "p_inn": p_inn_grid,
+                "p_out": p_out_grid,
+                "buy_plans": buy_plans,
+                "sell_plans": sell_plans,
+                "profits": profits,
+                "statuses": statuses,
+                "solved": solved,
+                "infeasibility": report,
+                "time_to_generate_model": time_to_generate_model,
+                "time_to_solve": time_to_solve,
+            }
+
+        # Generate the minima and the model once.
+        t0 = time.time()
+        if engine == "milp":
+            inn, out = SCMLBusinessPlan.get_minima_arrays(horizon, q_max, Q_inn, Q_out)
+        else:
+            inn, out = SCMLBusinessPlan.get_minima(
+                horizon, q_max, Q_inn, Q_out, sparse=sparse_minima
+            )
+        if precheck:
+            report = SCMLBusinessPlan.check_commitments(
+                horizon, q_max, inn, out, C_inn, C_out, optimistic, step, rolling
+            )
+            if not report["feasible"]:
+                buy_plans[:], sell_plans[:] = fixed_plans
+                statuses[:] = "Infeasible"
+                return get_output(time.time() - t0, report)
+        if engine == "pulp":
+            business_plan_model = SCMLBusinessPlan.build_model(
+                horizon=horizon,
+                q_max=q_max,
+                inn=inn,
+                out=out,
+                p_inn=dict(enumerate(p_inn_grid[0].tolist())),
+                p_out=dict(enumerate(p_out_grid[0].tolist())),
+                C_inn=C_inn,
+                C_out=C_out,
+                optimistic=optimistic,
+                step=step,
+                rolling=rolling,
+            )
+            model = business_plan_model["model"]
+            first = business_plan_model["first"]
+        time_to_generate_model = time.time() - t0
+
+        def solve(g: int):
+            nonlocal time_to_solve
+            t0 = time.time()
+            p_inn = dict(enumerate(p_inn_grid[g].tolist()))
+            p_out = dict(enumerate(p_out_grid[g].tolist()))
+            if engine == "milp":
+                output = SCMLBusinessPlan.compute_business_plan_milp(
+                    horizon=horizon,
+                    q_max=q_max,
+                    Q_inn=Q_inn,
+                    Q_out=Q_out,
+                    p_inn=p_inn,
+                    p_out=p_out,
+                    C_inn=C_inn,
+                    C_out=C_out,
+                    optimistic=optimistic,
+                    step=step,
+                    time_limit=time_limit,
+                    rolling=rolling,
+                    minima=(inn, out),
+                    precheck=False,
+                )
+                status = output["statistics"]["status"]
+                profit = output["profit"]
+                buy_plan, sell_plan = output["buy_plan"], output["sell_plan"]
+            else:
+                _, fixed_profit = SCMLBusinessPlan.get_rolling_start(
+                    q_max, inn, out, p_inn, p_out, C_inn, C_out, optimistic, first
+                )
+                model.setObjective(
+                    SCMLBusinessPlan.get_objective(
+                        business_plan_model["inn_vars"],
+                        business_plan_model["out_vars"],
+                        inn,
+                        out,
+                        p_inn,
+                        p_out,
+                        fixed_profit,
+                    )
+                )
+                status = SCMLSolverStatistics.solve_pulp(model, time_limit)["status"]
+                profit = pulp.value(model.objective)
+                if status == "Optimal":
+                    buy_plan, sell_plan = SCMLBusinessPlan.read_plan(
+                        business_plan_model, C_inn, C_out
+                    )
+            statuses[g] = status
+            if status == "Optimal":
+                buy_plans[g] = [buy_plan[t] for t in range(0, horizon)]
+                sell_plans[g] = [sell_plan[t] for t in range(0, horizon)]
+                profits[g] = profit
+            else:
+                buy_plans[g], sell_plans[g] = fixed_plans
+            solved[g] = True
+            time_to_solve += time.time() - t0
+
+        def on_segment(i: int, j: int):
+            # Whether all the points between i and j are convex combinations of the points i and j.
+            points = np.hstack((p_inn_grid[i : j + 1], p_out_grid[i : j + 1]))
+            direction = points[-1] - points[0]
+            offsets = points - points[0]
+            norm = direction @ direction
+            if norm == 0.0:
+                return np.allclose(offsets, 0.0)
+            weights = offsets @ direction / norm
+            return (
+                np.all(weights >= -1e-9)
+                and np.all(weights <= 1.0 + 1e-9)
+                and np.allclose(offsets, np.outer(weights, direction))
+            )
+
+        if not skip_unchanged:
+            for g in range(0, size):
+                solve(g)
+        else:
+            solve(0)
+            if size > 1:
+                solve(size - 1)
+            segments = [(0, size - 1)]
+            while segments:
+                i, j = segments.pop()
+                if j - i < 2:
+                    continue
+                if (
+                    statuses[i] == "Optimal"
+                    and statuses[j] == "Optimal"
+                    and np.array_equal(buy_plans[i], buy_plans[j])
+                    and np.array_equal(sell_plans[i], sell_plans[j])
+                    and on_segment(i, j)
+                ):
+                    # The plan is optimal all along the segment, and its profit is linear in the prices.
+                    buy_plans[i + 1 : j] = buy_plans[i]
+                    sell_plans[i + 1 : j] = sell_plans[i]
+                    statuses[i + 1 : j] = "Optimal"
+                    revenue = np.array(
+                        [out[t][sell_plans[i, t]] for t in range(0, horizon)]
+                    )
+                    cost = np.array(
+                        [inn[t][buy_plans[i, t]] for t in range(0, horizon)]
+                    )
+                    profits[i + 1 : j] = (
+                        p_out_grid[i + 1 : j] @ revenue - p_inn_grid[i + 1 : j] @ cost
+                    )
+                    continue
+                middle = (i + j) // 2
+                solve(middle)
+                segments += [(i, middle), (middle, j)]
+
+        return get_output(time_to_generate_model)
+
+    @staticmethod
+    async def compute_business_plan_async(
+        *args, timeout: float = None, executor=None, **kwargs
+    ):
+        """
+        Asyncio version of compute_business_plan. Both the model generation and the solve happen in an executor job,
+        so the event loop keeps serving other coroutines (e.g., other negotiations) while the plan is computed, and
+        several plans can be computed concurrently.
+        If the awaiting task is cancelled or the timeout expires, CBC is killed (see SCMLCancellation), so the job
+        ends as soon as the model generation does. The engines that do not run CBC cannot be killed: give them a
+        time_limit to bound how long the job keeps running.
+        The parameters are the same as in compute_business_plan, plus:
+        :param timeout: if given, the maximum number of seconds to wait for the plan. On expiration, asyncio.TimeoutError
+        is raised. It is independent of time_limit, which bounds the solver and returns its best plan.
+        :param executor: a concurrent.futures.Executor in which to run the job. If None, the loop's default executor is
+        used. CBC is only killed when the job runs in a thread of this process, e.g., not in a ProcessPoolExecutor.
+        :return: the same result returned by compute_business_plan.
+        """
+        # A job run in another process cannot be reached from here, so CBC is only killed in threads.
+        cancellation = (
+            None
+            if isinstance(executor, concurrent.futures.ProcessPoolExecutor)
+            else SCMLCancellation()
+        )
+        job = asyncio.get_running_loop().run_in_executor(
+            executor,
+            functools.partial(
+                SCMLBusinessPlan.compute_business_plan,
+                *args,
+                **kwargs,
+                cancellation=cancellation,
+            ),
+        )
+        try:
+            return await asyncio.wait_for(job, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            if cancellation is not None:
+                cancellation.cancel()
+            raise
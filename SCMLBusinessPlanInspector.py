@@ -139,3 +139,27 @@ class SCMLBusinessPlanInspector:
         ptable_stats.add_row(["optimistic", f"{business_plan_output['optimistic']}"])
 
         print(ptable_stats)
+
+    @staticmethod
+    def inspect_infeasibility(business_plan_output):
+        """
+        Prints the issues found by SCMLBusinessPlan.check_commitments, if the commitments of the plan cannot be met.
+        :param business_plan_output: the output of SCMLBusinessPlan.compute_business_plan.
+        """
+        report = business_plan_output["infeasibility"]
+        if report is None:
+            print("The commitments can be met.")
+            return
+        ptable_issues = PrettyTable()
+        ptable_issues.field_names = ["step", "reason", "side", "committed", "limit"]
+        for issue in report["issues"]:
+            ptable_issues.add_row(
+                [
+                    issue["step"],
+                    issue["reason"],
+                    issue["side"] or "",
+                    f"{issue['committed'] :.3f}",
+                    f"{issue['limit'] :.3f}",
+                ]
+            )
+        print(ptable_issues)
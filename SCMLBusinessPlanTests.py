@@ -1,4 +1,7 @@
+import asyncio
+import concurrent.futures
 import itertools as it
+import time
 import unittest
 
 import numpy as np
@@ -15,7 +18,8 @@ class SCMLBusinessTests(unittest.TestCase):
 
         # Random quantities inn
         random_quantities_inn = np.random.randint(0, q_max, (horizon, q_max))
-        normalization_qtt_inn = random_quantities_inn.sum(axis=1)
+        # A row of all zeros is left with no support instead of producing NaN probabilities.
+        normalization_qtt_inn = np.maximum(random_quantities_inn.sum(axis=1), 1)
         Q_inn = {
             t: {
                 q: random_quantities_inn[t][q] / normalization_qtt_inn[t]
@@ -26,7 +30,8 @@ class SCMLBusinessTests(unittest.TestCase):
 
         # Random quantities out
         random_quantities_out = np.random.randint(0, q_max, (horizon, q_max))
-        normalization_qtt_out = random_quantities_out.sum(axis=1)
+        # A row of all zeros is left with no support instead of producing NaN probabilities.
+        normalization_qtt_out = np.maximum(random_quantities_out.sum(axis=1), 1)
         Q_out = {
             t: {
                 q: random_quantities_out[t][q] / normalization_qtt_out[t]
@@ -75,6 +80,32 @@ class SCMLBusinessTests(unittest.TestCase):
             for q, expectation in minima_map.items():
                 self.assertGreaterEqual(expectation, 0)
 
+    def test_commitments(self):
+        """
+        The commitments must keep the committed quantities. The baseline read a commitment at time t as a commitment of
+        t units, e.g., {1: 3, 4: 2} as {1: 1, 4: 4}, which changed the plans of every caller with commitments.
+        """
+        commitments = SCMLBusinessPlan.get_commitments({1: 3, 4: 2})
+        self.assertEqual(commitments, {1: 3, 4: 2})
+        self.assertNotEqual(commitments, {1: 1, 4: 4})
+        self.assertEqual(SCMLBusinessPlan.get_commitments(None)[5], 0)
+        # Exactly 5 inputs arrive whatever the quantity planned, and inputs are too expensive to buy on their own, so
+        # only the committed 3 are bought at time 1, and sold at a loss, where the baseline bought 1 and lost 9.
+        horizon, q_max = 4, 6
+        for engine in ["pulp", "milp"]:
+            output = SCMLBusinessPlan.compute_business_plan(
+                horizon=horizon,
+                q_max=q_max,
+                Q_inn={t: {5: 1.0} for t in range(0, horizon)},
+                Q_out={t: {5: 1.0} for t in range(0, horizon)},
+                p_inn={t: 10.0 for t in range(0, horizon)},
+                p_out={t: 1.0 for t in range(0, horizon)},
+                C_inn={1: 3},
+                engine=engine,
+            )
+            self.assertEqual(output["buy_plan"], {0: 0, 1: 3, 2: 0, 3: 0})
+            self.assertAlmostEqual(output["profit"], -27.0)
+
     @staticmethod
     def solve_a_plan(horizon: int, q_max: int):
         # Fetch synthetic input
@@ -93,6 +124,7 @@ class SCMLBusinessTests(unittest.TestCase):
             Q_out=synthetic_input["Q_out"],
             p_inn=synthetic_input["p_inn"],
             p_out=synthetic_input["p_out"],
+            debug=True,
         )
         SCMLBusinessPlanInspector.inspect_business_plan(
             business_plan_output=business_plan_output
@@ -127,6 +159,435 @@ class SCMLBusinessTests(unittest.TestCase):
                 if business_plan_output["optimistic"]:
                     self.assertEqual(total_buy_qtty, total_sell_qtty)
 
+    def test_rolling_horizon(self):
+        """
+        Leaving the fixed steps out of the model must not change the plan's profit.
+        """
+        horizon, q_max = 10, 10
+        for engine, optimistic, step in it.product(
+            ["pulp", "milp"], [True, False], [1, 4]
+        ):
+            synthetic_input = SCMLBusinessTests.synthetic_input_creation(
+                horizon=horizon, q_max=q_max
+            )
+            # With no support, quantities are never limited by the market, so any commitment can be met.
+            synthetic_input["Q_inn"] = {t: {} for t in range(0, horizon)}
+            synthetic_input["Q_out"] = {t: {} for t in range(0, horizon)}
+            first_plan = SCMLBusinessPlan.compute_business_plan(
+                **synthetic_input, optimistic=optimistic, engine=engine
+            )
+            C_inn = {t: first_plan["buy_plan"][t] for t in range(0, step)}
+            C_out = {t: first_plan["sell_plan"][t] for t in range(0, step)}
+            full_output, rolling_output = (
+                SCMLBusinessPlan.compute_business_plan(
+                    **synthetic_input,
+                    C_inn=C_inn,
+                    C_out=C_out,
+                    optimistic=optimistic,
+                    step=step,
+                    engine=engine,
+                    rolling=rolling,
+                )
+                for rolling in (False, True)
+            )
+            self.assertTrue(rolling_output["rolling"])
+            self.assertAlmostEqual(
+                full_output["profit"], rolling_output["profit"], places=3
+            )
+            for t in range(0, step):
+                self.assertEqual(rolling_output["buy_plan"][t], C_inn[t])
+                self.assertEqual(rolling_output["sell_plan"][t], C_out[t])
+
+    def test_price_sweep(self):
+        """
+        Every point of a sweep, solved or skipped, must have the profit of a plan computed from scratch.
+        """
+        horizon, q_max = 8, 10
+        for engine, optimistic, skip_unchanged in it.product(
+            ["pulp", "milp"], [True, False], [True, False]
+        ):
+            synthetic_input = SCMLBusinessTests.synthetic_input_creation(
+                horizon=horizon, q_max=q_max
+            )
+            p_inn = np.array([synthetic_input["p_inn"][t] for t in range(0, horizon)])
+            p_out = np.array([synthetic_input["p_out"][t] for t in range(0, horizon)])
+            # A path of sell prices from a discount to a premium: the plan changes only a few times along it.
+            scales = np.linspace(0.5, 1.5, 9)
+            sweep_output = SCMLBusinessPlan.compute_business_plan_sweep(
+                horizon=horizon,
+                q_max=q_max,
+                Q_inn=synthetic_input["Q_inn"],
+                Q_out=synthetic_input["Q_out"],
+                p_inn_grid=np.tile(p_inn, (len(scales), 1)),
+                p_out_grid=np.outer(scales, p_out),
+                optimistic=optimistic,
+                engine=engine,
+                skip_unchanged=skip_unchanged,
+            )
+            self.assertEqual(sweep_output["buy_plans"].shape, (len(scales), horizon))
+            self.assertEqual(sweep_output["engine"], engine)
+            self.assertTrue((sweep_output["statuses"] == "Optimal").all())
+            if not skip_unchanged:
+                self.assertTrue(sweep_output["solved"].all())
+            for g, scale in enumerate(scales):
+                business_plan_output = SCMLBusinessPlan.compute_business_plan(
+                    horizon=horizon,
+                    q_max=q_max,
+                    Q_inn=synthetic_input["Q_inn"],
+                    Q_out=synthetic_input["Q_out"],
+                    p_inn=dict(enumerate(p_inn)),
+                    p_out=dict(enumerate(scale * p_out)),
+                    optimistic=optimistic,
+                )
+                self.assertLessEqual(
+                    abs(business_plan_output["profit"] - sweep_output["profits"][g]),
+                    1e-3 * max(1.0, abs(business_plan_output["profit"])),
+                )
+
+    def test_price_sweep_infeasible(self):
+        """
+        When the commitments cannot be met, no point of a sweep may report a profit.
+        """
+        horizon, q_max = 4, 6
+        # At most 1 output can be sold at each step, so selling 4 is impossible.
+        distribution = {t: {0: 0.5, 1: 0.5} for t in range(0, horizon)}
+        p_inn = np.full(horizon, 5.0)
+        p_out = np.full(horizon, 10.0)
+        output = SCMLBusinessPlan.compute_business_plan(
+            horizon=horizon,
+            q_max=q_max,
+            Q_inn=distribution,
+            Q_out=distribution,
+            p_inn=dict(enumerate(p_inn)),
+            p_out=dict(enumerate(p_out)),
+            C_out={2: 4},
+        )
+        self.assertIsNone(output["profit"])
+        for engine, precheck in it.product(["pulp", "milp"], [True, False]):
+            sweep_output = SCMLBusinessPlan.compute_business_plan_sweep(
+                horizon=horizon,
+                q_max=q_max,
+                Q_inn=distribution,
+                Q_out=distribution,
+                p_inn_grid=[p_inn, p_inn],
+                p_out_grid=[p_out, 2.0 * p_out],
+                C_out={2: 4},
+                engine=engine,
+                precheck=precheck,
+            )
+            self.assertTrue(np.isnan(sweep_output["profits"]).all())
+            self.assertEqual(list(sweep_output["statuses"]), ["Infeasible"] * 2)
+            self.assertEqual(sweep_output["solved"].any(), not precheck)
+            self.assertEqual(sweep_output["infeasibility"] is None, not precheck)
+
+    @staticmethod
+    def inventory_levels(business_plan_output, optimistic: bool):
+        """
+        Returns the output inventory available at each step of a plan, and the inventory left after the last step.
+        """
+        inn, out = SCMLBusinessPlan.get_minima_arrays(
+            business_plan_output["horizon"],
+            business_plan_output["q_max"],
+            business_plan_output["Q_inn"],
+            business_plan_output["Q_out"],
+        )
+        levels = [0.0]
+        for t in range(0, business_plan_output["horizon"]):
+            b = business_plan_output["buy_plan"][t]
+            s = business_plan_output["sell_plan"][t]
+            levels.append(levels[-1] + (b - s if optimistic else inn[t, b] - out[t, s]))
+        return levels
+
+    def test_final_inventory(self):
+        """
+        A plan asked to leave some inventory after the last step must do so.
+        """
+        for engine, optimistic in it.product(["pulp", "milp"], [True, False]):
+            synthetic_input = SCMLBusinessTests.synthetic_input_creation(
+                horizon=6, q_max=10
+            )
+            business_plan_output = SCMLBusinessPlan.compute_business_plan(
+                **synthetic_input,
+                optimistic=optimistic,
+                engine=engine,
+                final_inventory=3.0,
+            )
+            levels = SCMLBusinessTests.inventory_levels(
+                {**synthetic_input, **business_plan_output.as_dict()}, optimistic
+            )
+            self.assertGreaterEqual(levels[-1], 3.0 - 1e-6)
+
+    def test_hierarchical_plan(self):
+        """
+        The coarse-to-fine plan must be feasible at full resolution over the whole horizon, and cannot beat the plan
+        computed at full resolution.
+        """
+        horizon, q_max = 25, 8
+        for engine, optimistic in it.product(["pulp", "milp"], [True, False]):
+            synthetic_input = SCMLBusinessTests.synthetic_input_creation(
+                horizon=horizon, q_max=q_max
+            )
+            full_output = SCMLBusinessPlan.compute_business_plan(
+                **synthetic_input, optimistic=optimistic, engine=engine
+            )
+            hierarchical_output = SCMLBusinessPlan.compute_business_plan_hierarchical(
+                **synthetic_input,
+                optimistic=optimistic,
+                engine=engine,
+                fine_steps=8,
+                bucket_size=4,
+                debug=True,
+            )
+            self.assertEqual(len(hierarchical_output["buy_plan"]), horizon)
+            self.assertLessEqual(
+                hierarchical_output["profit"],
+                full_output["profit"] + 1e-3 * max(1.0, abs(full_output["profit"])),
+            )
+            # The reported profit is the expected profit of the plan at full resolution.
+            self.assertAlmostEqual(
+                hierarchical_output["profit"],
+                sum(
+                    hierarchical_output["out"][t][hierarchical_output["sell_plan"][t]]
+                    * synthetic_input["p_out"][t]
+                    - hierarchical_output["inn"][t][hierarchical_output["buy_plan"][t]]
+                    * synthetic_input["p_inn"][t]
+                    for t in range(0, horizon)
+                ),
+                places=3,
+            )
+            levels = SCMLBusinessTests.inventory_levels(
+                {**synthetic_input, **hierarchical_output.as_dict()}, optimistic
+            )
+            for t in range(1, horizon):
+                sold = (
+                    hierarchical_output["sell_plan"][t]
+                    if optimistic
+                    else hierarchical_output["out"][t][
+                        hierarchical_output["sell_plan"][t]
+                    ]
+                )
+                self.assertLessEqual(sold, levels[t] + 1e-6)
+
+    def test_hierarchical_commitments(self):
+        """
+        The coarse-to-fine plan must report the commitments that cannot be met at full resolution as infeasible, and
+        meet the ones beyond the fine steps that can be, even when no profit is made by trading.
+        """
+        unreachable_input = dict(
+            horizon=12,
+            q_max=6,
+            Q_inn={t: {0: 0.5, 1: 0.5} for t in range(0, 12)},
+            Q_out={t: {0: 0.5, 1: 0.5} for t in range(0, 12)},
+            p_inn={t: 1.0 for t in range(0, 12)},
+            p_out={t: 2.0 for t in range(0, 12)},
+            C_out={9: 4},
+        )
+        reachable_input = dict(
+            horizon=20,
+            q_max=6,
+            Q_inn={t: {5: 1.0} for t in range(0, 20)},
+            Q_out={t: {5: 1.0} for t in range(0, 20)},
+            # Trading loses money, so only the commitments are traded.
+            p_inn={t: 2.0 for t in range(0, 20)},
+            p_out={t: 1.0 for t in range(0, 20)},
+            C_inn={14: 2},
+            C_out={15: 3, 16: 3},
+        )
+        for engine, optimistic in it.product(["pulp", "milp"], [True, False]):
+            output = SCMLBusinessPlan.compute_business_plan_hierarchical(
+                **unreachable_input,
+                optimistic=optimistic,
+                engine=engine,
+                fine_steps=4,
+                bucket_size=3,
+            )
+            self.assertIsNone(output["profit"])
+            self.assertEqual(output["statistics"]["status"], "Infeasible")
+
+            output = SCMLBusinessPlan.compute_business_plan_hierarchical(
+                **reachable_input,
+                optimistic=optimistic,
+                engine=engine,
+                fine_steps=8,
+                bucket_size=4,
+            )
+            self.assertIsNotNone(output["profit"])
+            self.assertGreaterEqual(output["buy_plan"][14], 2)
+            self.assertGreaterEqual(output["sell_plan"][15], 3)
+            self.assertGreaterEqual(output["sell_plan"][16], 3)
+            levels = SCMLBusinessTests.inventory_levels(
+                {**reachable_input, **output.as_dict()}, optimistic
+            )
+            # No quantity exceeds 5, so they are all met for sure and both inventories are the same.
+            for t in range(1, 20):
+                self.assertLessEqual(output["sell_plan"][t], levels[t] + 1e-6)
+
+    def test_adaptive_grid(self):
+        """
+        The plan computed on the adaptive grid cannot beat the full-grid plan, which in turn cannot beat the bound.
+        """
+        horizon, q_max = 6, 20
+        for engine, optimistic in it.product(["pulp", "milp"], [True, False]):
+            synthetic_input = SCMLBusinessTests.synthetic_input_creation(
+                horizon=horizon, q_max=q_max
+            )
+            full_output = SCMLBusinessPlan.compute_business_plan(
+                **synthetic_input, optimistic=optimistic, engine=engine
+            )
+            adaptive_output = SCMLBusinessPlan.compute_business_plan_adaptive(
+                **synthetic_input, optimistic=optimistic, engine=engine
+            )
+            tolerance = 1e-3 * max(1.0, abs(full_output["profit"]))
+            self.assertLessEqual(
+                adaptive_output["profit"], full_output["profit"] + tolerance
+            )
+            self.assertGreaterEqual(
+                adaptive_output["upper_bound"], full_output["profit"] - tolerance
+            )
+            self.assertGreaterEqual(adaptive_output["gap"], -1e-3)
+            self.assertGreaterEqual(adaptive_output["refinement_rounds"], 2)
+            self.assertLess(adaptive_output["grid_size"], 1.0)
+            self.assertEqual(len(adaptive_output["buy_plan"]), horizon)
+
+    def test_refine_grid(self):
+        """
+        Manual example: the planned quantities and their neighbours at the given spacing are added to the base grid.
+        """
+        base = np.zeros((2, 2, 10), dtype=bool)
+        base[:, :, 0] = True
+        grid = SCMLBusinessPlan.refine_grid(base, {0: 5, 1: 1}, {0: 9, 1: 0}, 2, 1)
+        self.assertEqual(np.flatnonzero(grid[0, 0]).tolist(), [0, 3, 5, 7])
+        self.assertEqual(np.flatnonzero(grid[0, 1]).tolist(), [0, 1, 3])
+        self.assertEqual(np.flatnonzero(grid[1, 0]).tolist(), [0, 7, 9])
+        self.assertEqual(np.flatnonzero(grid[1, 1]).tolist(), [0, 2])
+        self.assertEqual(base.sum(), 4)
+
+    def test_slim_output(self):
+        """
+        Without debug=True, the output must only carry the plans, the profit and the timings.
+        """
+        synthetic_input = SCMLBusinessTests.synthetic_input_creation(
+            horizon=5, q_max=10
+        )
+        for engine in ("pulp", "milp"):
+            slim_output, debug_output = (
+                SCMLBusinessPlan.compute_business_plan(
+                    **synthetic_input, engine=engine, debug=debug
+                )
+                for debug in (False, True)
+            )
+            self.assertFalse(hasattr(slim_output, "__dict__"))
+            for key in ("inn", "out", "p_inn", "p_out", "model"):
+                self.assertIsNone(slim_output[key])
+            self.assertEqual(debug_output["p_inn"], synthetic_input["p_inn"])
+            self.assertEqual(debug_output["inn"][0][0], 0.0)
+            self.assertEqual(engine == "pulp", debug_output["model"] is not None)
+            self.assertAlmostEqual(slim_output["profit"], debug_output["profit"])
+            self.assertEqual(set(slim_output["buy_plan"]), set(range(0, 5)))
+            with self.assertRaises(KeyError):
+                slim_output["not_an_entry"]
+
+    def test_check_commitments(self):
+        """
+        Test that the check of the commitments agrees with the solvers, and that infeasible plans skip them.
+        """
+        np.random.seed(0)
+        for k in range(0, 60):
+            horizon, q_max = np.random.randint(2, 6), np.random.randint(3, 7)
+            arguments = dict(
+                SCMLBusinessTests.synthetic_input_creation(horizon, q_max),
+                C_inn={t: np.random.randint(0, q_max + 1) for t in range(0, horizon)},
+                C_out={t: np.random.choice([0, 1, q_max]) for t in range(0, horizon)},
+                optimistic=bool(np.random.randint(0, 2)),
+                step=np.random.randint(0, horizon),
+                rolling=bool(np.random.randint(0, 2)),
+                engine=("pulp", "milp")[k % 2],
+            )
+            solved = SCMLBusinessPlan.compute_business_plan(**arguments, precheck=False)
+            checked = SCMLBusinessPlan.compute_business_plan(**arguments)
+            self.assertEqual(
+                solved["statistics"]["status"] == "Infeasible",
+                checked["infeasibility"] is not None,
+            )
+            if checked["infeasibility"] is not None:
+                self.assertEqual(checked["statistics"]["solver"], "precheck")
+                self.assertIsNone(checked["profit"])
+
+        # A committed sale larger than any quantity, and a sale at step 0 with no inventory.
+        synthetic_input = SCMLBusinessTests.synthetic_input_creation(
+            horizon=5, q_max=10
+        )
+        output = SCMLBusinessPlan.compute_business_plan(
+            **synthetic_input, C_out={0: 2, 3: 50}
+        )
+        SCMLBusinessPlanInspector.inspect_infeasibility(output)
+        report = output["infeasibility"]
+        self.assertFalse(report["feasible"])
+        self.assertEqual(
+            {(issue["step"], issue["reason"]) for issue in report["issues"]},
+            {(0, "fixed_step_conflict"), (3, "commitment_unreachable")},
+        )
+
+    def test_async_plans(self):
+        """
+        Test that several plans computed concurrently on an event loop match the synchronous ones.
+        """
+        synthetic_inputs = [
+            SCMLBusinessTests.synthetic_input_creation(horizon=10, q_max=10)
+            for _ in range(0, 4)
+        ]
+
+        async def solve_all():
+            return await asyncio.gather(
+                *[
+                    SCMLBusinessPlan.compute_business_plan_async(**synthetic_input)
+                    for synthetic_input in synthetic_inputs
+                ]
+            )
+
+        async_outputs = asyncio.run(solve_all())
+        for synthetic_input, async_output in zip(synthetic_inputs, async_outputs):
+            sync_output = SCMLBusinessPlan.compute_business_plan(**synthetic_input)
+            self.assertEqual(sync_output["buy_plan"], async_output["buy_plan"])
+            self.assertEqual(sync_output["sell_plan"], async_output["sell_plan"])
+
+    def test_async_timeout(self):
+        """
+        Test that an expired timeout raises instead of blocking the loop.
+        """
+        synthetic_input = SCMLBusinessTests.synthetic_input_creation(
+            horizon=15, q_max=30
+        )
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(
+                SCMLBusinessPlan.compute_business_plan_async(
+                    **synthetic_input, timeout=0.001
+                )
+            )
+
+    def test_async_cancel(self):
+        """
+        Test that CBC is killed when the timeout expires, so the executor is free again long before CBC would end.
+        """
+        np.random.seed(0)
+        # CBC takes more than 10 seconds on this plan, and the model takes about one to build.
+        synthetic_input = SCMLBusinessTests.synthetic_input_creation(
+            horizon=60, q_max=60
+        )
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(
+                    SCMLBusinessPlan.compute_business_plan_async(
+                        **synthetic_input,
+                        optimistic=False,
+                        timeout=2.0,
+                        executor=executor,
+                    )
+                )
+            t0 = time.perf_counter()
+            executor.submit(lambda: None).result()
+            self.assertLess(time.perf_counter() - t0, 3.0)
+
 
 if __name__ == "__main__":
     unittest.main()
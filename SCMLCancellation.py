@@ -0,0 +1,89 @@
+import concurrent.futures
+import os
+import subprocess
+import threading
+
+import pulp
+
+
+class SCMLCancellation:
+    """
+    A handle to cancel a solver call that runs in another thread, e.g., the executor jobs of
+    SCMLBusinessPlan.compute_business_plan_async and SCMLContractsSigner.sign_async. A thread cannot be interrupted,
+    but the CBC run of the pulp engine is a separate process: when a cancellation is given to the solvers, CBC is
+    started through solve_pulp, and cancel kills it right away. If cancel comes before CBC is started, solve_pulp
+    raises instead of starting it. In both cases, the call raises concurrent.futures.CancelledError.
+    The engines that do not run CBC (e.g., 'milp', solved by HiGHS in the calling thread) cannot be killed, and run
+    until they finish or reach their time limit.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self.process = None
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        """
+        Cancels the call: kills CBC if it runs, and keeps it from being started otherwise. Can be called from any
+        thread, any number of times.
+        """
+        with self.lock:
+            self.cancelled = True
+            if self.process is not None and self.process.poll() is None:
+                self.process.kill()
+
+    def start(self, args: list, **kwargs):
+        """
+        Starts a process, unless the call was cancelled.
+        :param args: the arguments of subprocess.Popen.
+        :param kwargs: the keyword arguments of subprocess.Popen.
+        :return: the process.
+        """
+        with self.lock:
+            if self.cancelled:
+                raise concurrent.futures.CancelledError()
+            self.process = subprocess.Popen(args, **kwargs)
+            return self.process
+
+    def solve_pulp(self, model: pulp.LpProblem, solver: pulp.PULP_CBC_CMD):
+        """
+        Solves a pulp model with CBC as model.solve(solver) does, but starts CBC through start so that it can be
+        killed. The model is written and the solution read with the solver's own methods.
+        :param model: a pulp model.
+        :param solver: a pulp.PULP_CBC_CMD, whose log is written to its logPath if given.
+        :return: the status of the model.
+        """
+        tmp_mps, tmp_sol = solver.create_tmp_files(model.name, "mps", "sol")
+        was_none, dummy = model.fixObjective()
+        try:
+            variables, variables_names, constraints_names, _ = model.writeMPS(
+                tmp_mps, rename=1
+            )
+            args = [solver.path, tmp_mps]
+            if model.sense == pulp.LpMaximize:
+                args.append("max")
+            if solver.timeLimit is not None:
+                args += ["sec", str(solver.timeLimit)]
+            for option in solver.options + solver.getOptions():
+                args += option.split()
+            args += ["branch" if solver.mip else "initialSolve"]
+            args += ["printingOptions", "all", "solution", tmp_sol]
+            log_path = solver.optionsDict.get("logPath")
+            with open(log_path if log_path else os.devnull, "w") as log:
+                code = self.start(
+                    args, stdout=log, stderr=log, stdin=subprocess.DEVNULL
+                ).wait()
+            if self.cancelled:
+                raise concurrent.futures.CancelledError()
+            if code != 0 or not os.path.exists(tmp_sol):
+                raise pulp.PulpSolverError(f"Pulp: Error while executing {solver.path}")
+            status, values, _, _, _, solution_status = solver.readsol_MPS(
+                tmp_sol, model, variables, variables_names, constraints_names
+            )
+            model.assignVarsVals(values)
+            model.assignStatus(status, solution_status)
+        finally:
+            model.restoreObjective(was_none, dummy)
+            solver.delete_tmp_files(tmp_mps, tmp_sol)
+        model.solver = solver
+        return model.status
@@ -0,0 +1,56 @@
+import concurrent.futures
+import sys
+import threading
+import time
+import unittest
+
+import pulp
+
+from SCMLCancellation import SCMLCancellation
+from SCMLSolverStatistics import SCMLSolverStatistics
+
+
+class SCMLCancellationTests(unittest.TestCase):
+    def test_cancel(self):
+        """
+        Cancelling must kill a running process right away, and keep any other from being started.
+        """
+        cancellation = SCMLCancellation()
+        process = cancellation.start(
+            [sys.executable, "-c", "import time; time.sleep(30)"]
+        )
+        t0 = time.perf_counter()
+        threading.Timer(0.1, cancellation.cancel).start()
+        self.assertNotEqual(process.wait(timeout=10), 0)
+        self.assertLess(time.perf_counter() - t0, 5.0)
+        cancellation.cancel()
+        with self.assertRaises(concurrent.futures.CancelledError):
+            cancellation.start([sys.executable, "-c", "pass"])
+
+    def test_solve_pulp(self):
+        """
+        Starting CBC through a cancellation must solve the model as pulp does.
+        """
+        outputs = []
+        for cancellation in (None, SCMLCancellation()):
+            model = pulp.LpProblem("knapsack", pulp.LpMaximize)
+            x = [pulp.LpVariable(f"x_{i}", cat="Binary") for i in range(0, 10)]
+            model += pulp.lpSum((i + 1) * x[i] for i in range(0, 10))
+            model += pulp.lpSum((i % 4 + 1) * x[i] for i in range(0, 10)) <= 9
+            statistics = SCMLSolverStatistics.solve_pulp(
+                model, cancellation=cancellation
+            )
+            outputs.append(
+                (statistics["status"], pulp.value(model.objective), statistics["nodes"])
+            )
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0][0], "Optimal")
+
+        cancellation = SCMLCancellation()
+        cancellation.cancel()
+        with self.assertRaises(concurrent.futures.CancelledError):
+            SCMLSolverStatistics.solve_pulp(model, cancellation=cancellation)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,21 @@
+import asyncio
+import concurrent.futures
+import functools
+import numpy as np
+import os
 import pulp
 import time
 from negmas import Contract
-from typing import List, Dict
+from typing import List, Dict, Tuple
+
+from SCMLAllocationProfiler import SCMLAllocationProfiler
+from SCMLCancellation import SCMLCancellation
+from SCMLCostModel import SCMLCostModel
+from SCMLKernels import SCMLKernels
+from SCMLMilp import SCMLMilp
+from SCMLMinCostFlow import SCMLMinCostFlow
+from SCMLResult import SCMLSignerResult
+from SCMLSolverStatistics import SCMLSolverStatistics
 
 
 class SCMLContractsSigner:
@@ -13,6 +27,25 @@ class SCMLContractsSigner:
     PARTNER_TRUST = 4
     SUB_INDEX = 5
 
+    # The agreements' tuples as a structured array, in the same order as the indices above. Used to ship agreements to
+    # the processes of sign_many: converting the array back with tolist() gives the tuples again.
+    AGREEMENTS_DTYPE = np.dtype(
+        [
+            ("master_index", np.int64),
+            ("quantity", np.int64),
+            ("time", np.int64),
+            ("price", np.float64),
+            ("partner_trust", np.float64),
+        ]
+    )
+
+    # The engines of sign, see its docstring.
+    ENGINES = ("pulp", "milp", "flow", "auto")
+
+    # The persistent process pool of sign_many, and its number of workers.
+    pool = None
+    pool_workers = None
+
     @staticmethod
     def constraints_generation_helper(buy_agreements, buy_sign_vars, current_sell_time):
         """
@@ -93,31 +126,261 @@ class SCMLContractsSigner:
                 agreements_to_sell_outputs.append(agreement_tuple)
         return agreements_to_buy_inputs, agreements_to_sell_outputs
 
+    @staticmethod
+    def prune_agreements(buy_agreements: list, sell_agreements: list):
+        """
+        Removes the agreements that are not signed in any optimal solution, so that the ILP only contains agreements
+        that can matter. Two rules are applied with sorted sweeps over the delivery times, until neither removes
+        anything:
+        - a sell agreement is removed if its quantity exceeds the total quantity of the buy agreements delivered
+        strictly before it. This includes sell agreements with no earlier buy agreement.
+        - a buy agreement is removed if its expected cost is positive and at least the total expected revenue of the
+        sell agreements delivered strictly after it. This includes buy agreements at or after the last sell time.
+        Signing such a buy agreement is never better than dropping it together with all the later sell agreements.
+        Note that comparing unit prices alone is not safe: a buy agreement costlier per unit than any later sell can
+        still be needed to complete the quantity of a profitable sell agreement.
+        :param buy_agreements: the buy agreements, as returned by partition_agreements.
+        :param sell_agreements: the sell agreements, as returned by partition_agreements.
+        :return: the buy agreements and the sell agreements kept, in their original order, and the number of
+        agreements removed.
+        """
+
+        def as_arrays(agreements_tuples):
+            times = np.array(
+                [a[SCMLContractsSigner.TIME] for a in agreements_tuples], dtype=int
+            )
+            quantities = np.array(
+                [a[SCMLContractsSigner.QUANTITY] for a in agreements_tuples],
+                dtype=float,
+            )
+            values = np.array(
+                [
+                    a[SCMLContractsSigner.QUANTITY]
+                    * a[SCMLContractsSigner.PRICE]
+                    * a[SCMLContractsSigner.PARTNER_TRUST]
+                    for a in agreements_tuples
+                ],
+                dtype=float,
+            )
+            return times, quantities, values
+
+        buy_times, buy_quantities, buy_values = as_arrays(buy_agreements)
+        sell_times, sell_quantities, sell_values = as_arrays(sell_agreements)
+        buy_kept = np.ones(len(buy_agreements), dtype=bool)
+        sell_kept = np.ones(len(sell_agreements), dtype=bool)
+        while True:
+            # Total quantity of the kept buy agreements delivered strictly before each sell agreement.
+            order = np.argsort(buy_times[buy_kept], kind="stable")
+            times = buy_times[buy_kept][order]
+            supply = np.concatenate(([0.0], np.cumsum(buy_quantities[buy_kept][order])))
+            available = supply[np.searchsorted(times, sell_times, side="left")]
+            sell_pruned = sell_kept & (sell_quantities > available)
+            sell_kept &= ~sell_pruned
+
+            # Total expected revenue of the kept sell agreements delivered strictly after each buy agreement.
+            order = np.argsort(sell_times[sell_kept], kind="stable")
+            times = sell_times[sell_kept][order]
+            revenue = np.concatenate(
+                (np.cumsum(sell_values[sell_kept][order][::-1])[::-1], [0.0])
+            )
+            reachable = revenue[np.searchsorted(times, buy_times, side="right")]
+            buy_pruned = buy_kept & (buy_values > 0.0) & (buy_values >= reachable)
+            buy_kept &= ~buy_pruned
+
+            if not buy_pruned.any() and not sell_pruned.any():
+                break
+
+        return (
+            [a for a, kept in zip(buy_agreements, buy_kept) if kept],
+            [a for a, kept in zip(sell_agreements, sell_kept) if kept],
+            int((~buy_kept).sum() + (~sell_kept).sum()),
+        )
+
+    @staticmethod
+    def aggregate_agreements(agreements_tuples: list, aggregate: bool = True):
+        """
+        Groups the agreements with the same time, quantity, unit price and partner trust. Such agreements are
+        interchangeable, so the ILP only needs to decide how many of each group to sign, with one integer variable per
+        group bounded by the group size. This removes the symmetric solutions CBC would otherwise branch on.
+        :param agreements_tuples: buy or sell agreements, as returned by partition_agreements.
+        :param aggregate: if False, each agreement is its own group.
+        :return: a list of groups in order of first appearance, each a list of agreements in input order.
+        """
+        if not aggregate:
+            return [[a] for a in agreements_tuples]
+        groups = {}
+        for a in agreements_tuples:
+            groups.setdefault(
+                (
+                    a[SCMLContractsSigner.TIME],
+                    a[SCMLContractsSigner.QUANTITY],
+                    a[SCMLContractsSigner.PRICE],
+                    a[SCMLContractsSigner.PARTNER_TRUST],
+                ),
+                [],
+            ).append(a)
+        return list(groups.values())
+
+    @staticmethod
+    def has_identical_agreements(groups: list):
+        """
+        :param groups: groups of agreements, as returned by aggregate_agreements.
+        :return: True if two of the agreements have the same time, quantity, unit price and partner trust, whether they
+        are in the same group or not.
+        """
+        keys = {
+            (
+                a[SCMLContractsSigner.TIME],
+                a[SCMLContractsSigner.QUANTITY],
+                a[SCMLContractsSigner.PRICE],
+                a[SCMLContractsSigner.PARTNER_TRUST],
+            )
+            for group in groups
+            for a in group
+        }
+        return len(keys) < sum(len(group) for group in groups)
+
+    @staticmethod
+    def get_count_expression(name: str, size: int):
+        """
+        Builds the pulp expression of an integer count in [0, size] as a weighted sum of binary variables, with weights
+        1, 2, 4, ... and a last weight so that the weights add up to size. A group of size agreements then needs about
+        log2(size) binary variables instead of size of them. General integer variables are avoided on purpose: the CBC
+        shipped with pulp can report suboptimal solutions as optimal when they appear in the inventory constraints.
+        :param name: the name of the count. The binary variables are named name, name_1, name_2, ...
+        :param size: the maximum count.
+        :return: the pulp expression of the count.
+        """
+        weights = []
+        while sum(weights) + 2 ** len(weights) <= size:
+            weights.append(2 ** len(weights))
+        if sum(weights) < size:
+            weights.append(size - sum(weights))
+        return pulp.lpSum(
+            weight * pulp.LpVariable(name if j == 0 else f"{name}_{j}", cat="Binary")
+            for j, weight in enumerate(weights)
+        )
+
+    @staticmethod
+    def get_signatures(agent_id: str, how_many: int, groups: list, counts):
+        """
+        Maps the number of agreements to sign in each group to per-agreement signatures. Within a group, the agreements
+        that come first in the input list are signed first, so the mapping is deterministic.
+        :param agent_id: the agent's id (self.id of the calling agent)
+        :param how_many: the number of agreements given to the signer.
+        :param groups: the groups, as returned by aggregate_agreements.
+        :param counts: for each group, the number of its agreements to sign.
+        :return: a list of signatures, agent_id for the agreements to sign and None for the others.
+        """
+        list_of_signatures = [None] * how_many
+        for group, count in zip(groups, counts):
+            for agreement in group[: int(count)]:
+                list_of_signatures[
+                    agreement[SCMLContractsSigner.MASTER_INDEX]
+                ] = agent_id
+        return list_of_signatures
+
+    @staticmethod
+    def get_fractional_signatures(how_many: int, groups: list, counts):
+        """
+        Maps the fractional number of agreements to sign in each group to the signed fraction of each agreement, in the
+        same order as get_signatures: the agreements that come first in the input list are signed first.
+        :param how_many: the number of agreements given to the signer.
+        :param groups: the groups, as returned by aggregate_agreements.
+        :param counts: for each group, the fractional number of its agreements to sign.
+        :return: a list with the signed fraction, between 0 and 1, of each agreement.
+        """
+        fractional_signatures = [0.0] * how_many
+        for group, count in zip(groups, counts):
+            for k, agreement in enumerate(group):
+                fractional_signatures[
+                    agreement[SCMLContractsSigner.MASTER_INDEX]
+                ] = min(max(float(count) - k, 0.0), 1.0)
+        return fractional_signatures
+
+    @staticmethod
+    def get_trivial_choice(engine: str, max_gap: float):
+        """
+        :param engine: the engine given to the signer.
+        :param max_gap: see sign.
+        :return: the entry 'engine_choice' of the output when there are no sell agreements, so no engine runs: None
+        unless the engine is 'auto'.
+        """
+        if engine != "auto":
+            return None
+        return {
+            "engine": None,
+            "reason": "no engine was run: there are no sell agreements, so nothing is signed",
+            "predicted": {},
+            "features": None,
+            "max_gap": max_gap,
+        }
+
     @staticmethod
     def sign(
-        agent_id: str, agreements: List[Contract], trust_probabilities: Dict[str, float]
+        agent_id: str,
+        agreements: List[Contract],
+        trust_probabilities: Dict[str, float],
+        time_limit: float = None,
+        engine: str = "pulp",
+        debug: bool = False,
+        prune: bool = False,
+        aggregate: bool = False,
+        greedy_first: bool = False,
+        certificate_tolerance: float = 1e-6,
+        max_gap: float = 0.0,
+        profile: bool = False,
+        cancellation: SCMLCancellation = None,
     ):
         """
         Given a list of agreements and trust probabilities, each of type negmas.Contract, decides which agreements to sign.
         :param agent_id: the agent's id (self.id of the calling agent)
         :param agreements: a list of agreements, each of type negmas.Contracts.
         :param trust_probabilities: a dictionary mapping an agent's id to its trust probability
-        :return: a dictionary with information about the solver. In particular, the dictionary contains an entry 'list_of_signatures' which is
+        :param time_limit: if given, the maximum number of seconds the solver is allowed to run before returning its best solution.
+        :param engine: either 'pulp', to build the ILP with pulp and solve it with CBC, 'milp', to build the
+        constraint matrix directly as a sparse array and solve it with scipy.optimize.milp, or 'flow', to solve the
+        agreements as partially fulfillable with a min-cost flow and round the solution, see sign_flow, or 'auto', to
+        use the engine predicted to be the fastest by SCMLCostModel. The entry 'engine' of the output holds the engine
+        used, and 'engine_choice' why it was chosen.
+        :param debug: if True, the agreements, the trust probabilities and the model are attached to the output for inspection.
+        :param prune: if True, the agreements that cannot be part of an optimal solution are removed before the ILP is
+        built, see prune_agreements. The number of removed agreements is reported in the entry 'pruned'. Off by
+        default, so the model is built from all the agreements unless asked for.
+        :param aggregate: if True, identical agreements share one integer variable, see aggregate_agreements. Off by
+        default.
+        :param greedy_first: if True, the ILP is only built and solved when the greedy solution cannot be proven optimal,
+        see certify_greedy. The entry 'certified' of the output tells whether it was, and 'upper_bound' holds the bound.
+        Ignored by the engine 'flow'.
+        :param certificate_tolerance: the relative tolerance between the greedy profit and the bound, see certify_greedy.
+        :param max_gap: with engine='auto', the relative gap to the optimal profit that is tolerated. With 0, only the
+        exact engines are chosen. Otherwise, the flow can be chosen, and if the gap of its solution to its bound turns
+        out larger, the fastest exact engine is run instead.
+        :param profile: if True, the entry 'allocations' of the output holds the memory allocated by each phase, see
+        SCMLAllocationProfiler: 'variables', 'objective', 'constraints', 'solve' and 'read_signatures'. Only the pulp
+        engine is profiled.
+        :param cancellation: if given, a handle to kill CBC from another thread, see SCMLCancellation and sign_async.
+        :return: a SCMLSignerResult with information about the solver. In particular, the result contains an entry 'list_of_signatures' which is
          a list of the same length as the input list of agreements. The i-th element of the list 'list_of_signatures' is self.id/None in case
          the agent wants/do not wants to sign the i-th agreement in the input list.
         """
+        if engine not in SCMLContractsSigner.ENGINES:
+            raise ValueError(f"Unknown engine {engine}")
+
         # If the list of agreements is empty, then return an empty list of signatures.
         if len(agreements) == 0:
-            return {
-                "list_of_signatures": [],
-                "agent_id": agent_id,
-                "model": None,
-                "time_to_generate_ilp": None,
-                "time_to_solve_ilp": None,
-                "agreements": agreements,
-                "trust_probabilities": trust_probabilities,
-                "profit": None,
-            }
+            return SCMLSignerResult(
+                list_of_signatures=[],
+                fractional_signatures=[] if engine == "flow" else None,
+                agent_id=agent_id,
+                engine=engine,
+                engine_choice=SCMLContractsSigner.get_trivial_choice(engine, max_gap),
+                time_to_generate_ilp=None,
+                time_to_solve_ilp=None,
+                profit=None,
+                agreements=agreements if debug else None,
+                trust_probabilities=trust_probabilities if debug else None,
+            )
 
         # Partition agreements into buy and sell agreements.
         (
@@ -126,28 +389,197 @@ class SCMLContractsSigner:
         ) = SCMLContractsSigner.partition_agreements(
             agent_id, agreements, trust_probabilities
         )
+        signer_output = SCMLContractsSigner.sign_partitioned(
+            agent_id,
+            len(agreements),
+            agreements_to_buy_inputs,
+            agreements_to_sell_outputs,
+            time_limit,
+            engine,
+            debug,
+            prune,
+            aggregate,
+            greedy_first,
+            certificate_tolerance,
+            max_gap,
+            profile,
+            cancellation,
+        )
+        if debug:
+            signer_output.agreements = agreements
+            signer_output.trust_probabilities = trust_probabilities
+        return signer_output
+
+    @staticmethod
+    def sign_partitioned(
+        agent_id: str,
+        how_many: int,
+        agreements_to_buy_inputs: list,
+        agreements_to_sell_outputs: list,
+        time_limit: float = None,
+        engine: str = "pulp",
+        debug: bool = False,
+        prune: bool = False,
+        aggregate: bool = False,
+        greedy_first: bool = False,
+        certificate_tolerance: float = 1e-6,
+        max_gap: float = 0.0,
+        profile: bool = False,
+        cancellation: SCMLCancellation = None,
+    ):
+        """
+        Decides which agreements to sign, given the agreements already partitioned into buy and sell agreements. This
+        is the part of sign that does not need the negmas.Contract objects, so it can run in another process.
+        :param agent_id: the agent's id (self.id of the calling agent)
+        :param how_many: the number of agreements given to the signer.
+        :param agreements_to_buy_inputs: the buy agreements, as returned by partition_agreements.
+        :param agreements_to_sell_outputs: the sell agreements, as returned by partition_agreements.
+        :param time_limit: see sign.
+        :param engine: see sign.
+        :param debug: if True, the model is attached to the output for inspection.
+        :param prune: see sign.
+        :param aggregate: see sign.
+        :param greedy_first: see sign.
+        :param certificate_tolerance: see sign.
+        :param max_gap: see sign.
+        :param profile: see sign.
+        :param cancellation: see sign.
+        :return: the same result returned by sign, with 'agreements' and 'trust_probabilities' set to None.
+        """
+        pruned = 0
+        if prune:
+            (
+                agreements_to_buy_inputs,
+                agreements_to_sell_outputs,
+                pruned,
+            ) = SCMLContractsSigner.prune_agreements(
+                agreements_to_buy_inputs, agreements_to_sell_outputs
+            )
 
         # If there are no sell contracts, the signer has nothing to do and signs nothing.
         if len(agreements_to_sell_outputs) == 0:
-            return {
-                "list_of_signatures": [None] * len(agreements),
-                "agent_id": agent_id,
-                "model": None,
-                "time_to_generate_ilp": None,
-                "time_to_solve_ilp": None,
-                "agreements": agreements,
-                "trust_probabilities": trust_probabilities,
-                "profit": None,
-            }
+            return SCMLSignerResult(
+                list_of_signatures=[None] * how_many,
+                fractional_signatures=[0.0] * how_many if engine == "flow" else None,
+                agent_id=agent_id,
+                engine=engine,
+                engine_choice=SCMLContractsSigner.get_trivial_choice(engine, max_gap),
+                time_to_generate_ilp=None,
+                time_to_solve_ilp=None,
+                profit=None,
+                pruned=pruned,
+            )
 
+        buy_groups = SCMLContractsSigner.aggregate_agreements(
+            agreements_to_buy_inputs, aggregate
+        )
+        sell_groups = SCMLContractsSigner.aggregate_agreements(
+            agreements_to_sell_outputs, aggregate
+        )
+
+        choice = None
+        if engine == "auto":
+            choice = SCMLCostModel.choose(
+                "sign",
+                SCMLCostModel.signer_features(buy_groups, sell_groups),
+                max_gap,
+            )
+            engine = choice["engine"]
+
+        certificate = None
+        # The flow is solved faster than the LP relaxation of the certificate.
+        if greedy_first and engine != "flow":
+            certificate = SCMLContractsSigner.certify_greedy(
+                buy_groups, sell_groups, certificate_tolerance
+            )
+            if certificate["certified"]:
+                return SCMLSignerResult(
+                    list_of_signatures=SCMLContractsSigner.get_signatures(
+                        agent_id,
+                        how_many,
+                        buy_groups + sell_groups,
+                        certificate["counts"],
+                    ),
+                    agent_id=agent_id,
+                    engine=engine,
+                    time_to_generate_ilp=None,
+                    time_to_solve_ilp=None,
+                    time_to_certify=certificate["time_to_certify"],
+                    statistics=certificate["statistics"],
+                    profit=certificate["profit"],
+                    pruned=pruned,
+                    certified=True,
+                    upper_bound=certificate["upper_bound"],
+                    engine_choice=choice,
+                )
+
+        if engine == "flow":
+            signer_output = SCMLContractsSigner.sign_flow(
+                agent_id, how_many, buy_groups, sell_groups, pruned
+            )
+            gap = signer_output.statistics["gap"]
+            if choice is not None and gap > max_gap:
+                # The gap of the flow is only known once it is solved: fall back to the fastest exact engine.
+                engine = min(SCMLCostModel.EXACT_ENGINES, key=choice["predicted"].get)
+                choice = dict(
+                    choice,
+                    engine=engine,
+                    reason=f"{choice['reason']}; the flow was {gap:.2%} from its bound, more than max_gap, so "
+                    f"{engine} was run instead",
+                )
+        if engine == "milp":
+            signer_output = SCMLContractsSigner.sign_milp(
+                agent_id, how_many, buy_groups, sell_groups, time_limit, pruned
+            )
+        elif engine == "pulp":
+            signer_output = SCMLContractsSigner.sign_pulp(
+                agent_id,
+                how_many,
+                buy_groups,
+                sell_groups,
+                time_limit,
+                pruned,
+                debug,
+                profile,
+                cancellation,
+            )
+        signer_output.engine_choice = choice
+        if certificate is not None:
+            signer_output.certified = False
+            signer_output.upper_bound = certificate["upper_bound"]
+            signer_output.time_to_certify = certificate["time_to_certify"]
+        return signer_output
+
+    @staticmethod
+    def sign_pulp(
+        agent_id: str,
+        how_many: int,
+        buy_groups: list,
+        sell_groups: list,
+        time_limit: float = None,
+        pruned: int = 0,
+        debug: bool = False,
+        profile: bool = False,
+        cancellation: SCMLCancellation = None,
+    ):
+        """
+        Decides which agreements to sign with the pulp ILP, solved with CBC.
+        :param agent_id: the agent's id (self.id of the calling agent)
+        :param how_many: the number of agreements given to the signer.
+        :param buy_groups: the groups of buy agreements, as returned by aggregate_agreements.
+        :param sell_groups: the groups of sell agreements, as returned by aggregate_agreements. Must not be empty.
+        :param time_limit: if given, the maximum number of seconds CBC is allowed to run.
+        :param pruned: the number of agreements removed by prune_agreements, reported in the output.
+        :param debug: if True, the model is attached to the output for inspection.
+        :param profile: see sign.
+        :param cancellation: see sign.
+        :return: the same result returned by sign_partitioned.
+        """
         # For efficiency purposes, we order the agreements by delivery times. But, before we do, we must be able to
-        # recover the indices of the agreements as given to the solver, otherwise, we can't map the output to the right agreements.
-        buy_agreements = [
-            agreement + (i,) for i, agreement in enumerate(agreements_to_buy_inputs)
-        ]
-        sell_agreements = [
-            agreement + (i,) for i, agreement in enumerate(agreements_to_sell_outputs)
-        ]
+        # recover the indices of the groups as given to the solver, otherwise, we can't map the output to the right agreements.
+        # Each group is represented by its first agreement.
+        buy_agreements = [group[0] + (i,) for i, group in enumerate(buy_groups)]
+        sell_agreements = [group[0] + (i,) for i, group in enumerate(sell_groups)]
 
         # At this point an agreement is a tuple: (MASTER_INDEX, QUANTITY, TIME, PRICE, SUB_INDEX). Now we order by TIME.
         buy_agreements = sorted(
@@ -157,157 +589,620 @@ class SCMLContractsSigner:
             sell_agreements, key=lambda x: x[SCMLContractsSigner.TIME]
         )
 
-        # The code that follows will change the agreement lists, so we make a copy of them for later reference.
-        buy_agreements_copy = buy_agreements.copy()
-        sell_agreements_copy = sell_agreements.copy()
+        with SCMLAllocationProfiler(profile) as profiler:
+            t0 = time.time()
+            # Decision variables: the number of agreements of each group to sign, as an expression over binary variables.
+            buy_sign_vars = {
+                i: SCMLContractsSigner.get_count_expression(f"buy_sign_{i}", len(group))
+                for i, group in enumerate(buy_groups)
+            }
+            sell_sign_vars = {
+                i: SCMLContractsSigner.get_count_expression(
+                    f"sell_sign_{i}", len(group)
+                )
+                for i, group in enumerate(sell_groups)
+            }
 
-        t0 = time.time()
-        # Decision variables
-        buy_sign_vars = pulp.LpVariable.dicts(
-            "buy_sign",
-            (i for i, _ in enumerate(buy_agreements)),
-            lowBound=0,
-            upBound=1,
-            cat="Integer",
+            # Generate the pulp problem.
+            model = pulp.LpProblem("Contract_Signer_Solver", pulp.LpMaximize)
+            profiler.checkpoint("variables")
+
+            # The objective function is profit, defined as revenue minus cost.
+            model += pulp.lpSum(
+                [
+                    sell_agreements[i][SCMLContractsSigner.QUANTITY]
+                    * sell_agreements[i][SCMLContractsSigner.PRICE]
+                    * sell_agreements[i][SCMLContractsSigner.PARTNER_TRUST]
+                    * sell_sign_vars[s[SCMLContractsSigner.SUB_INDEX]]
+                    for i, s in enumerate(sell_agreements)
+                ]
+                + [
+                    -1.0
+                    * buy_agreements[i][SCMLContractsSigner.QUANTITY]
+                    * buy_agreements[i][SCMLContractsSigner.PRICE]
+                    * buy_agreements[i][SCMLContractsSigner.PARTNER_TRUST]
+                    * buy_sign_vars[b[SCMLContractsSigner.SUB_INDEX]]
+                    for i, b in enumerate(buy_agreements)
+                ]
+            )
+
+            profiler.checkpoint("objective")
+
+            # Construct the constraints. The constraint model inventory feasibility, i.e., we don't commit to a sell unless we have enough outputs.
+            current_sell_time = sell_agreements[0][SCMLContractsSigner.TIME]
+            current_sell_time_sum = []
+            partial_sell_sum = []
+            partial_buy_sum = []
+            result = []
+            while len(sell_agreements) > 0:
+                s = sell_agreements.pop(0)
+                if current_sell_time == s[SCMLContractsSigner.TIME]:
+                    current_sell_time_sum += [
+                        sell_sign_vars[s[SCMLContractsSigner.SUB_INDEX]]
+                        * s[SCMLContractsSigner.QUANTITY]
+                    ]
+                else:
+                    partial_buy_sum += (
+                        SCMLContractsSigner.constraints_generation_helper(
+                            buy_agreements, buy_sign_vars, current_sell_time
+                        )
+                    )
+                    result += [
+                        (
+                            current_sell_time_sum.copy(),
+                            partial_buy_sum.copy(),
+                            partial_sell_sum.copy(),
+                        )
+                    ]
+                    partial_sell_sum += current_sell_time_sum
+                    current_sell_time = s[SCMLContractsSigner.TIME]
+                    current_sell_time_sum = [
+                        sell_sign_vars[s[SCMLContractsSigner.SUB_INDEX]]
+                        * s[SCMLContractsSigner.QUANTITY]
+                    ]
+            partial_buy_sum += SCMLContractsSigner.constraints_generation_helper(
+                buy_agreements, buy_sign_vars, current_sell_time
+            )
+            result += [
+                (
+                    current_sell_time_sum.copy(),
+                    partial_buy_sum.copy(),
+                    partial_sell_sum.copy(),
+                )
+            ]
+            for left, middle, right in result:
+                model += sum(left) <= sum(middle) - sum(right)
+
+            # Measure the time taken to generate the ILP.
+            time_to_generate_ilp = time.time() - t0
+            profiler.checkpoint("constraints")
+
+            # Solve the integer program and hide the output given by the solver.
+            t0_solve = time.time()
+            # CBC's integer preprocessing sometimes cuts off the optimum of models with identical agreements, aggregated
+            # or not, and still reports the solution as optimal. It is only turned off for such models.
+            statistics = SCMLSolverStatistics.solve_pulp(
+                model,
+                time_limit,
+                options=["preprocess off"]
+                if SCMLContractsSigner.has_identical_agreements(
+                    buy_groups + sell_groups
+                )
+                else None,
+                cancellation=cancellation,
+            )
+            time_to_solve_ilp = time.time() - t0_solve
+            profiler.checkpoint("solve")
+
+            # Record which contracts should be signed.
+            list_of_signatures = SCMLContractsSigner.get_signatures(
+                agent_id,
+                how_many,
+                buy_groups + sell_groups,
+                [
+                    round(pulp.value(count) or 0)
+                    for count in list(buy_sign_vars.values())
+                    + list(sell_sign_vars.values())
+                ],
+            )
+            profiler.checkpoint("read_signatures")
+
+            # Return multiple objects for inspection purposes. In production, we care about the list of sign contracts, 'list_of_signatures'.
+            return SCMLSignerResult(
+                list_of_signatures=list_of_signatures,
+                agent_id=agent_id,
+                engine="pulp",
+                time_to_generate_ilp=time_to_generate_ilp,
+                time_to_solve_ilp=time_to_solve_ilp,
+                statistics=statistics,
+                profit=pulp.value(model.objective),
+                pruned=pruned,
+                model=model if debug else None,
+                allocations=profiler.stop(),
+            )
+
+    @staticmethod
+    def group_arrays(groups: list):
+        """
+        :param groups: groups of agreements, as returned by aggregate_agreements.
+        :return: four arrays with, for each group, the quantity, the delivery time and the expected value (quantity *
+        price * trust) of its agreements, and the number of agreements in the group.
+        """
+        quantities = np.array(
+            [g[0][SCMLContractsSigner.QUANTITY] for g in groups], dtype=float
         )
-        sell_sign_vars = pulp.LpVariable.dicts(
-            "sell_sign",
-            (i for i, _ in enumerate(sell_agreements)),
-            lowBound=0,
-            upBound=1,
-            cat="Integer",
+        times = np.array([g[0][SCMLContractsSigner.TIME] for g in groups], dtype=int)
+        values = np.array(
+            [
+                g[0][SCMLContractsSigner.QUANTITY]
+                * g[0][SCMLContractsSigner.PRICE]
+                * g[0][SCMLContractsSigner.PARTNER_TRUST]
+                for g in groups
+            ],
+            dtype=float,
         )
+        counts = np.array([len(g) for g in groups], dtype=float)
+        return quantities, times, values, counts
 
-        # Generate the pulp problem.
-        model = pulp.LpProblem("Contract_Signer_Solver", pulp.LpMaximize)
+    @staticmethod
+    def sign_milp(
+        agent_id: str,
+        how_many: int,
+        buy_groups: list,
+        sell_groups: list,
+        time_limit: float = None,
+        pruned: int = 0,
+    ):
+        """
+        Decides which agreements to sign with the array-based ILP of SCMLMilp.
+        :param agent_id: the agent's id (self.id of the calling agent)
+        :param how_many: the number of agreements given to the signer.
+        :param buy_groups: the groups of buy agreements, as returned by aggregate_agreements.
+        :param sell_groups: the groups of sell agreements, as returned by aggregate_agreements.
+        :param time_limit: if given, the maximum number of seconds HiGHS is allowed to run.
+        :param pruned: the number of agreements removed by prune_agreements, reported in the output.
+        :return: the same result returned by sign_partitioned, with 'model' set to None.
+        """
+        (
+            buy_quantities,
+            buy_times,
+            buy_values,
+            buy_counts,
+        ) = SCMLContractsSigner.group_arrays(buy_groups)
+        (
+            sell_quantities,
+            sell_times,
+            sell_values,
+            sell_counts,
+        ) = SCMLContractsSigner.group_arrays(sell_groups)
+        solution = SCMLMilp.solve_signer(
+            buy_quantities,
+            buy_times,
+            buy_values,
+            sell_quantities,
+            sell_times,
+            sell_values,
+            time_limit=time_limit,
+            buy_counts=buy_counts,
+            sell_counts=sell_counts,
+        )
 
-        # The objective function is profit, defined as revenue minus cost.
-        model += pulp.lpSum(
-            [
-                sell_agreements[i][SCMLContractsSigner.QUANTITY]
-                * sell_agreements[i][SCMLContractsSigner.PRICE]
-                * sell_agreements[i][SCMLContractsSigner.PARTNER_TRUST]
-                * sell_sign_vars[s[SCMLContractsSigner.SUB_INDEX]]
-                for i, s in enumerate(sell_agreements)
-            ]
-            + [
-                -1.0
-                * buy_agreements[i][SCMLContractsSigner.QUANTITY]
-                * buy_agreements[i][SCMLContractsSigner.PRICE]
-                * buy_agreements[i][SCMLContractsSigner.PARTNER_TRUST]
-                * buy_sign_vars[b[SCMLContractsSigner.SUB_INDEX]]
-                for i, b in enumerate(buy_agreements)
-            ]
+        list_of_signatures = SCMLContractsSigner.get_signatures(
+            agent_id,
+            how_many,
+            buy_groups + sell_groups,
+            np.concatenate((solution["buy_count"], solution["sell_count"])),
         )
 
-        # Construct the constraints. The constraint model inventory feasibility, i.e., we don't commit to a sell unless we have enough outputs.
-        current_sell_time = sell_agreements[0][SCMLContractsSigner.TIME]
-        current_sell_time_sum = []
-        partial_sell_sum = []
-        partial_buy_sum = []
-        result = []
-        while len(sell_agreements) > 0:
-            s = sell_agreements.pop(0)
-            if current_sell_time == s[SCMLContractsSigner.TIME]:
-                current_sell_time_sum += [
-                    sell_sign_vars[s[SCMLContractsSigner.SUB_INDEX]]
-                    * s[SCMLContractsSigner.QUANTITY]
-                ]
-            else:
-                partial_buy_sum += SCMLContractsSigner.constraints_generation_helper(
-                    buy_agreements, buy_sign_vars, current_sell_time
-                )
-                result += [
-                    (
-                        current_sell_time_sum.copy(),
-                        partial_buy_sum.copy(),
-                        partial_sell_sum.copy(),
-                    )
-                ]
-                partial_sell_sum += current_sell_time_sum
-                current_sell_time = s[SCMLContractsSigner.TIME]
-                current_sell_time_sum = [
-                    sell_sign_vars[s[SCMLContractsSigner.SUB_INDEX]]
-                    * s[SCMLContractsSigner.QUANTITY]
-                ]
-        partial_buy_sum += SCMLContractsSigner.constraints_generation_helper(
-            buy_agreements, buy_sign_vars, current_sell_time
+        return SCMLSignerResult(
+            list_of_signatures=list_of_signatures,
+            agent_id=agent_id,
+            engine="milp",
+            time_to_generate_ilp=solution["time_to_generate_ilp"],
+            time_to_solve_ilp=solution["time_to_solve_ilp"],
+            statistics=solution["statistics"],
+            profit=solution["profit"],
+            pruned=pruned,
         )
-        result += [
-            (
-                current_sell_time_sum.copy(),
-                partial_buy_sum.copy(),
-                partial_sell_sum.copy(),
-            )
-        ]
-        for left, middle, right in result:
-            model += sum(left) <= sum(middle) - sum(right)
 
-        # Measure the time taken to generate the ILP.
+    @staticmethod
+    def sign_flow(
+        agent_id: str,
+        how_many: int,
+        buy_groups: list,
+        sell_groups: list,
+        pruned: int = 0,
+    ):
+        """
+        Decides which agreements to sign with the min-cost flow of SCMLMinCostFlow, i.e., as if the agreements could be
+        partially fulfilled, and rounds the flow to whole agreements. The flow is solved in O(n log n), so this engine
+        scales to tens of thousands of agreements, but the rounded solution is not always optimal.
+        :param agent_id: the agent's id (self.id of the calling agent)
+        :param how_many: the number of agreements given to the signer.
+        :param buy_groups: the groups of buy agreements, as returned by aggregate_agreements.
+        :param sell_groups: the groups of sell agreements, as returned by aggregate_agreements.
+        :param pruned: the number of agreements removed by prune_agreements, reported in the output.
+        :return: the same result returned by sign_partitioned, with the profit of the rounded solution in 'profit', the
+        profit of the flow, an upper bound on the optimal profit, in 'upper_bound', and the signed fraction of each
+        agreement in 'fractional_signatures'.
+        """
+        t0 = time.time()
+        buy_arrays = SCMLContractsSigner.group_arrays(buy_groups)
+        sell_arrays = SCMLContractsSigner.group_arrays(sell_groups)
         time_to_generate_ilp = time.time() - t0
 
-        # Solve the integer program and hide the output given by the solver.
-        t0_solve = time.time()
-        model.solve(pulp.PULP_CBC_CMD(msg=False))
-        time_to_solve_ilp = time.time() - t0_solve
-
-        # Record which contracts should be signed. We start by assuming no contracts will be signed.
-        list_of_signatures = [None] * len(agreements)
-        for agreement in buy_agreements_copy:
-            if (
-                buy_sign_vars[agreement[SCMLContractsSigner.SUB_INDEX]].varValue
-                is not None
-                and int(
-                    buy_sign_vars[agreement[SCMLContractsSigner.SUB_INDEX]].varValue
-                )
-                == 1
-            ):
-                list_of_signatures[
-                    agreement[SCMLContractsSigner.MASTER_INDEX]
-                ] = agent_id
+        t0 = time.time()
+        solution = SCMLMinCostFlow.solve_signer(
+            *buy_arrays[:3],
+            *sell_arrays[:3],
+            buy_counts=buy_arrays[3],
+            sell_counts=sell_arrays[3],
+        )
+        (
+            buy_count,
+            sell_count,
+            solution["rounded_profit"],
+        ) = SCMLMinCostFlow.round_signer(
+            *buy_arrays[:3],
+            *sell_arrays[:3],
+            solution["buy_count"],
+            solution["sell_count"],
+        )
+        time_to_solve_ilp = time.time() - t0
 
-        for agreement in sell_agreements_copy:
-            if (
-                sell_sign_vars[agreement[SCMLContractsSigner.SUB_INDEX]].varValue
-                is not None
-                and int(
-                    sell_sign_vars[agreement[SCMLContractsSigner.SUB_INDEX]].varValue
-                )
-                == 1
-            ):
-                list_of_signatures[
-                    agreement[SCMLContractsSigner.MASTER_INDEX]
-                ] = agent_id
+        return SCMLSignerResult(
+            list_of_signatures=SCMLContractsSigner.get_signatures(
+                agent_id,
+                how_many,
+                buy_groups + sell_groups,
+                np.concatenate((buy_count, sell_count)),
+            ),
+            fractional_signatures=SCMLContractsSigner.get_fractional_signatures(
+                how_many,
+                buy_groups + sell_groups,
+                np.concatenate((solution["buy_count"], solution["sell_count"])),
+            ),
+            agent_id=agent_id,
+            engine="flow",
+            time_to_generate_ilp=time_to_generate_ilp,
+            time_to_solve_ilp=time_to_solve_ilp,
+            statistics=SCMLMinCostFlow.statistics(
+                len(buy_groups),
+                len(sell_groups),
+                len(np.union1d(buy_arrays[1] + 1, sell_arrays[1])),
+                solution,
+            ),
+            profit=solution["rounded_profit"],
+            pruned=pruned,
+            upper_bound=solution["profit"],
+        )
+
+    @staticmethod
+    def improved_greedy(
+        buy_quantities: np.ndarray,
+        buy_times: np.ndarray,
+        buy_values: np.ndarray,
+        buy_counts: np.ndarray,
+        sell_quantities: np.ndarray,
+        sell_times: np.ndarray,
+        sell_values: np.ndarray,
+        sell_counts: np.ndarray,
+    ):
+        """
+        A greedy signer over groups of agreements, given as arrays as returned by group_arrays. Sell agreements are
+        taken by decreasing revenue per unit, and each one is signed if the inputs it lacks can be bought for less than
+        its revenue, from the buy agreements delivered before it, cheapest per unit first. Unlike greedy_signer, the
+        units a buy agreement leaves over serve the next sell agreements. Finally, the buy agreements whose inputs are
+        not needed are dropped, the most expensive per unit first.
+        :return: an integer array with the number of agreements of each group to sign, buy groups first, as the columns
+        of SCMLMilp.signer_constraints.
+        """
+        num_buy = len(buy_quantities)
+        # The columns are read as slices of the CSC matrix, so the constraint matrix is never made dense.
+        A = SCMLMilp.signer_constraints(
+            buy_quantities, buy_times, sell_quantities, sell_times
+        ).tocsc()
+
+        def column(k):
+            return (
+                A.indices[A.indptr[k] : A.indptr[k + 1]],
+                A.data[A.indptr[k] : A.indptr[k + 1]],
+            )
 
-        # Return multiple objects for inspection purposes. In production, we care about the list of sign contracts, 'list_of_signatures'.
+        counts = np.zeros(A.shape[1], dtype=int)
+        # The left-hand side A @ counts of the inventory constraints, which must stay <= 0.
+        lhs = np.zeros(A.shape[0])
+        buy_order = np.argsort(buy_values / buy_quantities, kind="stable")
+        for j in np.argsort(-sell_values / sell_quantities, kind="stable"):
+            sell_rows, sell_column = column(num_buy + j)
+            for _ in range(0, int(sell_counts[j])):
+                new_lhs = lhs.copy()
+                new_lhs[sell_rows] += sell_column
+                bought = {}
+                cost = 0.0
+                for i in buy_order:
+                    # One unit of a buy agreement delivered before the sell one lowers all the rows it violates.
+                    missing = new_lhs.max()
+                    if missing <= 1e-9:
+                        break
+                    available = buy_counts[i] - counts[i]
+                    if buy_times[i] >= sell_times[j] or available <= 0:
+                        continue
+                    bought[i] = int(
+                        min(available, np.ceil(missing / buy_quantities[i] - 1e-9))
+                    )
+                    buy_rows, buy_column = column(i)
+                    new_lhs[buy_rows] += bought[i] * buy_column
+                    cost += bought[i] * buy_values[i]
+                if new_lhs.max() > 1e-9 or cost >= sell_values[j]:
+                    break
+                lhs = new_lhs
+                counts[num_buy + j] += 1
+                for i, how_many in bought.items():
+                    counts[i] += how_many
+        for i in buy_order[::-1]:
+            buy_rows, buy_column = column(i)
+            rows = buy_rows[buy_column < 0]
+            spare = (
+                np.floor(np.min(-lhs[rows]) / buy_quantities[i] + 1e-9)
+                if len(rows) > 0
+                else counts[i]
+            )
+            dropped = int(min(counts[i], spare))
+            counts[i] -= dropped
+            lhs[buy_rows] -= dropped * buy_column
+        return counts
+
+    @staticmethod
+    def certify_greedy(buy_groups: list, sell_groups: list, tolerance: float = 1e-6):
+        """
+        Tries to decide which agreements to sign without solving the ILP. The LP relaxation of the ILP gives an upper
+        bound on the optimal profit. If the LP solution happens to be integral, it is optimal. Otherwise, the solution
+        of improved_greedy is optimal if its profit is within tolerance of the bound.
+        :param buy_groups: the groups of buy agreements, as returned by aggregate_agreements.
+        :param sell_groups: the groups of sell agreements, as returned by aggregate_agreements. Must not be empty.
+        :param tolerance: the greedy solution is accepted if profit >= upper_bound - tolerance * max(1, |upper_bound|).
+        :return: a map with 'certified', True if the solution is proven optimal (within tolerance), the number of
+        agreements of each group to sign in 'counts' (buy groups first), its 'profit', the 'upper_bound', the
+        'statistics' of the certificate (see SCMLSolverStatistics) and the 'time_to_certify'.
+        """
+        t0 = time.time()
+        buy_arrays = SCMLContractsSigner.group_arrays(buy_groups)
+        sell_arrays = SCMLContractsSigner.group_arrays(sell_groups)
+        relaxation = SCMLMilp.solve_signer(
+            *buy_arrays[:3],
+            *sell_arrays[:3],
+            buy_counts=buy_arrays[3],
+            sell_counts=sell_arrays[3],
+            integral=False,
+        )
+        upper_bound = relaxation["profit"]
+        x = relaxation["result"].x
+        if x is not None and np.allclose(x, np.rint(x), atol=1e-9):
+            counts = np.rint(x).astype(int)
+            message = "Integral LP solution"
+        else:
+            counts = SCMLContractsSigner.improved_greedy(*buy_arrays, *sell_arrays)
+            message = "Greedy solution within tolerance of the LP bound"
+        num_buy = len(buy_groups)
+        profit = float(
+            sell_arrays[2] @ counts[num_buy:] - buy_arrays[2] @ counts[:num_buy]
+        )
+        certified = upper_bound is not None and profit >= upper_bound - tolerance * max(
+            1.0, abs(upper_bound)
+        )
+        statistics = dict(
+            relaxation["statistics"],
+            solver="certificate",
+            message=message,
+            integer_columns=len(counts),
+            objective=profit,
+            gap=SCMLSolverStatistics.relative_gap(profit, upper_bound),
+        )
         return {
-            "list_of_signatures": list_of_signatures,
-            "agent_id": agent_id,
-            "model": model,
-            "time_to_generate_ilp": time_to_generate_ilp,
-            "time_to_solve_ilp": time_to_solve_ilp,
-            "agreements": agreements,
-            "trust_probabilities": trust_probabilities,
-            "profit": pulp.value(model.objective),
+            "certified": certified,
+            "counts": counts,
+            "profit": profit,
+            "upper_bound": upper_bound,
+            "statistics": statistics,
+            "time_to_certify": time.time() - t0,
         }
 
     @staticmethod
-    def get_plan_as_lists(signer_output):
+    async def sign_async(*args, timeout: float = None, executor=None, **kwargs):
+        """
+        Asyncio version of sign. Both the ILP generation and the solve happen in an executor job, so the event loop
+        keeps serving other coroutines while the agreements are being decided, and several signers can run
+        concurrently.
+        If the awaiting task is cancelled or the timeout expires, CBC is killed (see SCMLCancellation), so the job
+        ends as soon as the ILP generation does. The engines that do not run CBC cannot be killed: give them a
+        time_limit to bound how long the job keeps running.
+        The parameters are the same as in sign, plus:
+        :param timeout: if given, the maximum number of seconds to wait for the signatures. On expiration,
+        asyncio.TimeoutError is raised. It is independent of time_limit, which bounds the solver and returns its best
+        solution.
+        :param executor: a concurrent.futures.Executor in which to run the job. If None, the loop's default executor is
+        used. CBC is only killed when the job runs in a thread of this process, e.g., not in a ProcessPoolExecutor.
+        :return: the same result returned by sign.
+        """
+        # A job run in another process cannot be reached from here, so CBC is only killed in threads.
+        cancellation = (
+            None
+            if isinstance(executor, concurrent.futures.ProcessPoolExecutor)
+            else SCMLCancellation()
+        )
+        job = asyncio.get_running_loop().run_in_executor(
+            executor,
+            functools.partial(
+                SCMLContractsSigner.sign, *args, **kwargs, cancellation=cancellation
+            ),
+        )
+        try:
+            return await asyncio.wait_for(job, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            if cancellation is not None:
+                cancellation.cancel()
+            raise
+
+    @staticmethod
+    def sign_arrays(
+        agent_id: str,
+        how_many: int,
+        buy_array: np.ndarray,
+        sell_array: np.ndarray,
+        time_limit: float = None,
+        engine: str = "pulp",
+        prune: bool = False,
+        aggregate: bool = False,
+        greedy_first: bool = False,
+        certificate_tolerance: float = 1e-6,
+        max_gap: float = 0.0,
+    ):
+        """
+        Same as sign_partitioned, with the buy and sell agreements given as arrays of dtype AGREEMENTS_DTYPE. This is
+        the job run by the processes of sign_many.
+        :return: the same result returned by sign_partitioned.
+        """
+        return SCMLContractsSigner.sign_partitioned(
+            agent_id,
+            how_many,
+            buy_array.tolist(),
+            sell_array.tolist(),
+            time_limit,
+            engine,
+            False,
+            prune,
+            aggregate,
+            greedy_first,
+            certificate_tolerance,
+            max_gap,
+        )
+
+    @staticmethod
+    def get_pool(workers: int):
+        """
+        Returns the persistent process pool of sign_many, creating it on first use or if the number of workers changed.
+        Reusing the pool across steps saves starting processes and importing pulp, scipy and negmas in each of them.
+        :param workers: the number of processes.
+        :return: a concurrent.futures.ProcessPoolExecutor.
+        """
+        if (
+            SCMLContractsSigner.pool is None
+            or SCMLContractsSigner.pool_workers != workers
+        ):
+            SCMLContractsSigner.close_pool()
+            SCMLContractsSigner.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers
+            )
+            SCMLContractsSigner.pool_workers = workers
+        return SCMLContractsSigner.pool
+
+    @staticmethod
+    def close_pool():
+        """
+        Shuts down the persistent process pool of sign_many, if any.
+        """
+        if SCMLContractsSigner.pool is not None:
+            SCMLContractsSigner.pool.shutdown()
+        SCMLContractsSigner.pool = None
+        SCMLContractsSigner.pool_workers = None
+
+    @staticmethod
+    def sign_many(
+        problems: List[Tuple[str, List[Contract], Dict[str, float]]],
+        workers: int = None,
+        time_limit: float = None,
+        engine: str = "pulp",
+        prune: bool = False,
+        aggregate: bool = False,
+        greedy_first: bool = False,
+        certificate_tolerance: float = 1e-6,
+        max_gap: float = 0.0,
+    ):
+        """
+        Signs the agreements of several agents at once, e.g., of all our agents hosted in the same process at the
+        signing phase of a step. The problems are independent, so they are solved in parallel in a persistent pool of
+        processes (see get_pool). Only the relevant information of each agreement is sent to the processes, as a
+        compact array of dtype AGREEMENTS_DTYPE, instead of pickling the negmas.Contract objects.
+        :param problems: a list of tuples (agent_id, agreements, trust_probabilities), each as the parameters of sign.
+        :param workers: the number of processes. Defaults to the number of cores. With 1 worker, the problems are solved
+        one after the other in the calling process.
+        :param time_limit: see sign. Applies to each problem.
+        :param engine: see sign.
+        :param prune: see sign.
+        :param aggregate: see sign.
+        :param greedy_first: see sign.
+        :param certificate_tolerance: see sign.
+        :param max_gap: see sign.
+        :return: a list with the output of each problem, in the same order as the problems, each as returned by sign
+        with debug=False.
+        """
+        if engine not in SCMLContractsSigner.ENGINES:
+            raise ValueError(f"Unknown engine {engine}")
+        workers = os.cpu_count() if workers is None else workers
+
+        jobs = []
+        for agent_id, agreements, trust_probabilities in problems:
+            (
+                agreements_to_buy_inputs,
+                agreements_to_sell_outputs,
+            ) = SCMLContractsSigner.partition_agreements(
+                agent_id, agreements, trust_probabilities
+            )
+            jobs.append(
+                (
+                    agent_id,
+                    len(agreements),
+                    np.array(
+                        agreements_to_buy_inputs,
+                        dtype=SCMLContractsSigner.AGREEMENTS_DTYPE,
+                    ),
+                    np.array(
+                        agreements_to_sell_outputs,
+                        dtype=SCMLContractsSigner.AGREEMENTS_DTYPE,
+                    ),
+                    time_limit,
+                    engine,
+                    prune,
+                    aggregate,
+                    greedy_first,
+                    certificate_tolerance,
+                    max_gap,
+                )
+            )
+
+        if workers <= 1:
+            return [SCMLContractsSigner.sign_arrays(*job) for job in jobs]
+        pool = SCMLContractsSigner.get_pool(workers)
+        futures = [pool.submit(SCMLContractsSigner.sign_arrays, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def get_plan_as_lists(signer_output, agreements: List[Contract] = None):
         """
         Given the dictionary object returned by a signer produces a number and two lists, the number being the horizon of the plan
         induced by the signed contracts, and the lists being the buy plan and the sell plan, in that order
         :param signer_output: the output of a signer
+        :param agreements: the agreements given to the signer. Only needed if the output does not carry them, i.e., if
+        it was computed without debug=True.
         :return: the horizon, and two lists: buy plan and sell plan.
         """
+        if agreements is None:
+            agreements = signer_output.get("agreements")
+        if agreements is None:
+            raise ValueError(
+                "The signer output does not carry the agreements: pass them as agreements=, or sign with debug=True"
+            )
+
         # Check if agreements are received
-        if len(signer_output["agreements"]) == 0:
+        if len(agreements) == 0:
             return 0, [], []
 
         # Compute the horizon of the agreements defined as the time of the farthest agreement.
-        horizon = max(a["agreement"]["time"] for a in signer_output["agreements"]) + 1
+        horizon = max(a["agreement"]["time"] for a in agreements) + 1
         buy_plan = [0 for _ in range(horizon)]
         sell_plan = [0 for _ in range(horizon)]
-        for i, a in enumerate(signer_output["agreements"]):
+        for i, a in enumerate(agreements):
             if signer_output["list_of_signatures"][i] is not None:
                 if a["annotation"]["is_buy"]:
                     buy_plan[a["agreement"]["time"]] = (
@@ -320,22 +1215,30 @@ class SCMLContractsSigner:
         return horizon, buy_plan, sell_plan
 
     @staticmethod
-    def is_sign_plan_consistent(signer_output):
+    def is_sign_plan_consistent(signer_output, agreements: List[Contract] = None):
         """
         Given the output of a signer, this function checks if the plan is feasible, i.e.,
         if it never has a negative number of output units assuming all inputs are turned
         into outputs in 1 time step and that all outputs are sold as indicated by the sign plan.
         :param signer_output: the output of SCMLContractsSigner.sign
+        :param agreements: the agreements given to the signer, see get_plan_as_lists.
         :return: True if the plan is implementable, otherwise False.
         """
         horizon, buy_plan, sell_plan = SCMLContractsSigner.get_plan_as_lists(
-            signer_output
+            signer_output, agreements
         )
         assert len(buy_plan) == len(sell_plan)
         # Sanity check: we cannot sell at the first time period.
         assert sell_plan[0] == 0
         # Sanity check: we should not buy at the last time period, as we can't sell.
         assert buy_plan[len(buy_plan) - 1] == 0
+        if SCMLKernels.enabled:
+            return bool(
+                SCMLKernels.is_inventory_consistent(
+                    np.array(buy_plan, dtype=np.int64),
+                    np.array(sell_plan, dtype=np.int64),
+                )
+            )
         output_inventory_level = 0
         for i in range(1, len(buy_plan)):
             output_inventory_level += buy_plan[i - 1] - sell_plan[i]
@@ -376,52 +1279,71 @@ class SCMLContractsSigner:
             reverse=True,
         )
 
-        profit = 0
-        set_of_signed_buy = set()
-        set_of_signed_sell = set()
-        for s in sell_agreements:
-            qtty_s_satisfied = 0
-            set_of_buy_for_s = set()
-            cost = 0
-            for i, b in enumerate(buy_agreements):
-                # This buy contract can be used to satisfy the current sell contract.
-                if b[SCMLContractsSigner.TIME] < s[SCMLContractsSigner.TIME]:
-                    qtty_s_satisfied += b[SCMLContractsSigner.QUANTITY]
-                    cost += (
-                        b[SCMLContractsSigner.QUANTITY]
-                        * b[SCMLContractsSigner.PRICE]
-                        * b[SCMLContractsSigner.PARTNER_TRUST]
-                    )
-                    set_of_buy_for_s.add(i)
-                    # Todo: check if the per-unit price is low enough to actually commit to buy the inputs for the sell contract under consideration.
-                    # We have enough to satisfy this contract.
-                    if qtty_s_satisfied >= s[SCMLContractsSigner.QUANTITY]:
-                        set_of_signed_sell.add(s[SCMLContractsSigner.MASTER_INDEX])
-                        set_of_signed_buy = set_of_signed_buy | {
-                            buy_agreements[i][SCMLContractsSigner.MASTER_INDEX]
-                            for i in set_of_buy_for_s
-                        }
-                        # Filter out from the buy agreements the buy agreements assigned to the sell contract.
-                        buy_agreements = [
-                            b
-                            for i, b in enumerate(buy_agreements)
-                            if i not in set_of_buy_for_s
-                        ]
-                        revenue = (
-                            s[SCMLContractsSigner.QUANTITY]
-                            * s[SCMLContractsSigner.PRICE]
-                            * s[SCMLContractsSigner.PARTNER_TRUST]
+        if SCMLKernels.enabled:
+            buy_signed, sell_signed, profit = SCMLKernels.greedy_matching(
+                *SCMLContractsSigner.group_arrays([[b] for b in buy_agreements])[:3],
+                *SCMLContractsSigner.group_arrays([[s] for s in sell_agreements])[:3],
+            )
+            profit = float(profit)
+            set_of_signed_buy = {
+                b[SCMLContractsSigner.MASTER_INDEX]
+                for b, signed in zip(buy_agreements, buy_signed)
+                if signed
+            }
+            set_of_signed_sell = {
+                s[SCMLContractsSigner.MASTER_INDEX]
+                for s, signed in zip(sell_agreements, sell_signed)
+                if signed
+            }
+        else:
+            profit = 0
+            set_of_signed_buy = set()
+            set_of_signed_sell = set()
+            for s in sell_agreements:
+                qtty_s_satisfied = 0
+                set_of_buy_for_s = set()
+                cost = 0
+                for i, b in enumerate(buy_agreements):
+                    # This buy contract can be used to satisfy the current sell contract.
+                    if b[SCMLContractsSigner.TIME] < s[SCMLContractsSigner.TIME]:
+                        qtty_s_satisfied += b[SCMLContractsSigner.QUANTITY]
+                        cost += (
+                            b[SCMLContractsSigner.QUANTITY]
+                            * b[SCMLContractsSigner.PRICE]
+                            * b[SCMLContractsSigner.PARTNER_TRUST]
                         )
-                        profit += revenue - cost
-                        break
+                        set_of_buy_for_s.add(i)
+                        # Todo: check if the per-unit price is low enough to actually commit to buy the inputs for the sell contract under consideration.
+                        # We have enough to satisfy this contract.
+                        if qtty_s_satisfied >= s[SCMLContractsSigner.QUANTITY]:
+                            set_of_signed_sell.add(s[SCMLContractsSigner.MASTER_INDEX])
+                            set_of_signed_buy = set_of_signed_buy | {
+                                buy_agreements[i][SCMLContractsSigner.MASTER_INDEX]
+                                for i in set_of_buy_for_s
+                            }
+                            # Filter out from the buy agreements the buy agreements assigned to the sell contract.
+                            buy_agreements = [
+                                b
+                                for i, b in enumerate(buy_agreements)
+                                if i not in set_of_buy_for_s
+                            ]
+                            revenue = (
+                                s[SCMLContractsSigner.QUANTITY]
+                                * s[SCMLContractsSigner.PRICE]
+                                * s[SCMLContractsSigner.PARTNER_TRUST]
+                            )
+                            profit += revenue - cost
+                            break
 
         return {
             "agent_id": agent_id,
             "agreements": agreements,
             "list_of_signatures": [
-                agent_id
-                if (i in set_of_signed_buy or i in set_of_signed_sell)
-                else None
+                (
+                    agent_id
+                    if (i in set_of_signed_buy or i in set_of_signed_sell)
+                    else None
+                )
                 for i, _ in enumerate(agreements)
             ],
             "trust_probabilities": trust_probabilities,
@@ -94,6 +94,12 @@ class SCMLContractsSignerInspector:
                 objective_value = pulp.value(signer_output["model"].objective)
             objective = f"{objective_value}"
         statistics_table.add_row(["optimal profit", f"{objective}"])
+        statistics_table.add_row(
+            ["pruned agreements", f"{signer_output.get('pruned')}"]
+        )
+        statistics_table.add_row(
+            ["certified without ILP", f"{signer_output.get('certified')}"]
+        )
 
         statistics_table.align["Statistic"] = "r"
         print(statistics_table)
@@ -1,10 +1,13 @@
+import asyncio
 import unittest
 import random
 import pprint
+import numpy as np
 from negmas import Contract
 from typing import Dict
 from SCMLContractsSigner import SCMLContractsSigner
 from SCMLContractsSignerInspector import SCMLContractsSignerInspector
+from SCMLSolverStatistics import SCMLSolverStatistics
 import pulp
 
 """
@@ -75,7 +78,7 @@ class SCMLSignerTests(unittest.TestCase):
         """
         # Empty list of agreements should raise an exception.
         signer_output_empty_list = SCMLContractsSigner.sign(
-            SCMLSignerTests.AGENT_ID, [], SCMLSignerTests.DEFAULT_TRUST_PROB
+            SCMLSignerTests.AGENT_ID, [], SCMLSignerTests.DEFAULT_TRUST_PROB, debug=True
         )
         SCMLContractsSignerInspector.signer_inspector(signer_output_empty_list)
         self.assertEqual(len(signer_output_empty_list["list_of_signatures"]), 0)
@@ -88,6 +91,7 @@ class SCMLSignerTests(unittest.TestCase):
                 for _ in range(0, 10)
             ],
             SCMLSignerTests.DEFAULT_TRUST_PROB,
+            debug=True,
         )
         SCMLContractsSignerInspector.signer_inspector(signer_output_all_buy)
         self.assertTrue(
@@ -105,6 +109,7 @@ class SCMLSignerTests(unittest.TestCase):
                 for _ in range(0, 10)
             ],
             SCMLSignerTests.DEFAULT_TRUST_PROB,
+            debug=True,
         )
         SCMLContractsSignerInspector.signer_inspector(signer_output_all_sell)
         self.assertTrue(
@@ -146,6 +151,7 @@ class SCMLSignerTests(unittest.TestCase):
             SCMLSignerTests.AGENT_ID,
             list_of_agreements,
             SCMLSignerTests.DEFAULT_TRUST_PROB,
+            debug=True,
         )
         SCMLContractsSignerInspector.signer_inspector(signer_output)
 
@@ -194,6 +200,7 @@ class SCMLSignerTests(unittest.TestCase):
             SCMLSignerTests.AGENT_ID,
             list_of_agreements,
             SCMLSignerTests.DEFAULT_TRUST_PROB,
+            debug=True,
         )
         SCMLContractsSignerInspector.signer_inspector(signer_output)
 
@@ -217,7 +224,7 @@ class SCMLSignerTests(unittest.TestCase):
 
         # Call the signer.
         signer_output = SCMLContractsSigner.sign(
-            SCMLSignerTests.AGENT_ID, list_of_agreements, partners
+            SCMLSignerTests.AGENT_ID, list_of_agreements, partners, debug=True
         )
         SCMLContractsSignerInspector.signer_inspector(signer_output)
         SCMLContractsSignerInspector.solver_statistics(signer_output)
@@ -309,6 +316,410 @@ class SCMLSignerTests(unittest.TestCase):
         # Check the consistency of the plan.
         self.assertTrue(SCMLContractsSigner.is_sign_plan_consistent(signer_output))
 
+    def test_slim_output(self):
+        """
+        The output of a default call does not carry the agreements: the plan helpers must ask for them, and work once
+        they are given.
+        """
+        list_of_agreements = [
+            SCMLSignerTests.generate_random_contract() for _ in range(0, 20)
+        ]
+        signer_output = SCMLContractsSigner.sign(
+            SCMLSignerTests.AGENT_ID,
+            list_of_agreements,
+            SCMLSignerTests.DEFAULT_TRUST_PROB,
+        )
+        self.assertIsNone(signer_output["agreements"])
+        with self.assertRaises(ValueError):
+            SCMLContractsSigner.get_plan_as_lists(signer_output)
+        with self.assertRaises(ValueError):
+            SCMLContractsSigner.is_sign_plan_consistent(signer_output)
+        self.assertTrue(
+            SCMLContractsSigner.is_sign_plan_consistent(
+                signer_output, list_of_agreements
+            )
+        )
+        self.assertEqual(
+            SCMLContractsSigner.get_plan_as_lists(signer_output, list_of_agreements),
+            SCMLContractsSigner.get_plan_as_lists(
+                SCMLContractsSigner.sign(
+                    SCMLSignerTests.AGENT_ID,
+                    list_of_agreements,
+                    SCMLSignerTests.DEFAULT_TRUST_PROB,
+                    debug=True,
+                )
+            ),
+        )
+
+    def test_pruning_manual(self):
+        """
+        Manual example: a sell agreement with no earlier buy agreement, a buy agreement after the last sell, and a buy
+        agreement costlier than all the revenue it could serve are pruned.
+        """
+        list_of_agreements = [
+            Contract(
+                partners=[SCMLSignerTests.AGENT_ID, SCMLSignerTests.OTHER_AGENT_ID],
+                agreement={"time": time, "quantity": quantity, "unit_price": price},
+                annotation={"is_buy": is_buy},
+            )
+            for time, quantity, price, is_buy in [
+                (6, 1, 110.0, False),
+                (4, 1, 10.0, True),
+                (3, 1, 100.0, True),
+                (1, 2, 12.0, False),
+                (5, 1, 11.01, False),
+                (6, 1, 1.0, True),
+                (5, 1, 120.0, True),
+            ]
+        ]
+        for engine in ("pulp", "milp"):
+            signer_output = SCMLContractsSigner.sign(
+                SCMLSignerTests.AGENT_ID,
+                list_of_agreements,
+                SCMLSignerTests.DEFAULT_TRUST_PROB,
+                engine=engine,
+                prune=True,
+            )
+            self.assertEqual(signer_output["pruned"], 3)
+            self.assertAlmostEqual(
+                signer_output["profit"],
+                100.0
+                * SCMLSignerTests.DEFAULT_TRUST_PROB[SCMLSignerTests.OTHER_AGENT_ID],
+            )
+            # Pruning is opt-in: by default, every agreement is part of the model.
+            self.assertEqual(
+                SCMLContractsSigner.sign(
+                    SCMLSignerTests.AGENT_ID,
+                    list_of_agreements,
+                    SCMLSignerTests.DEFAULT_TRUST_PROB,
+                    engine=engine,
+                )["pruned"],
+                0,
+            )
+
+    def test_pruning_keeps_profit(self):
+        """
+        Pruning must not change the optimal profit, and the pruned plans must be consistent.
+        """
+        for _ in range(0, 50):
+            list_of_agreements = [
+                SCMLSignerTests.generate_random_contract()
+                for _ in range(0, random.randint(1, 50))
+            ]
+            for engine in ("pulp", "milp"):
+                pruned_output, full_output = (
+                    SCMLContractsSigner.sign(
+                        SCMLSignerTests.AGENT_ID,
+                        list_of_agreements,
+                        SCMLSignerTests.DEFAULT_TRUST_PROB,
+                        engine=engine,
+                        prune=prune,
+                    )
+                    for prune in (True, False)
+                )
+                self.assertEqual(full_output["pruned"], 0)
+                self.assertTrue(
+                    SCMLContractsSigner.is_sign_plan_consistent(
+                        pruned_output, list_of_agreements
+                    )
+                )
+                # With no sell agreement left, the signer signs nothing. CBC and HiGHS stop within a small gap.
+                pruned_profit = pruned_output["profit"] or 0.0
+                full_profit = full_output["profit"] or 0.0
+                self.assertLessEqual(
+                    abs(pruned_profit - full_profit), 1e-3 * max(1.0, abs(full_profit))
+                )
+
+    def test_aggregation(self):
+        """
+        Identical agreements must share their variables, without changing the optimal profit, and the signatures must
+        be given to the first agreements of each group.
+        """
+        for _ in range(0, 20):
+            # Few distinct rows, each repeated several times, as in a busy market.
+            rows = [
+                SCMLSignerTests.generate_random_contract(horizon=5) for _ in range(0, 6)
+            ]
+            list_of_agreements = [
+                random.choice(rows) for _ in range(0, random.randint(1, 60))
+            ]
+            # The reference is the model with one binary variable per agreement, solved with HiGHS.
+            reference_profit = (
+                SCMLContractsSigner.sign(
+                    SCMLSignerTests.AGENT_ID,
+                    list_of_agreements,
+                    SCMLSignerTests.DEFAULT_TRUST_PROB,
+                    engine="milp",
+                    aggregate=False,
+                )["profit"]
+                or 0.0
+            )
+            for engine in ("pulp", "milp"):
+                aggregated_output, full_output = (
+                    SCMLContractsSigner.sign(
+                        SCMLSignerTests.AGENT_ID,
+                        list_of_agreements,
+                        SCMLSignerTests.DEFAULT_TRUST_PROB,
+                        engine=engine,
+                        aggregate=aggregate,
+                        debug=True,
+                    )
+                    for aggregate in (True, False)
+                )
+                self.assertTrue(
+                    SCMLContractsSigner.is_sign_plan_consistent(aggregated_output)
+                )
+                for output in (aggregated_output, full_output):
+                    self.assertLessEqual(
+                        abs((output["profit"] or 0.0) - reference_profit),
+                        1e-3 * max(1.0, abs(reference_profit)),
+                    )
+                if engine == "pulp" and full_output["model"] is not None:
+                    self.assertLessEqual(
+                        aggregated_output["model"].numVariables(),
+                        full_output["model"].numVariables(),
+                    )
+                    # Aggregation is opt-in: by default, every agreement has its own variable.
+                    self.assertEqual(
+                        SCMLContractsSigner.sign(
+                            SCMLSignerTests.AGENT_ID,
+                            list_of_agreements,
+                            SCMLSignerTests.DEFAULT_TRUST_PROB,
+                            debug=True,
+                        )["model"].numVariables(),
+                        full_output["model"].numVariables(),
+                    )
+                # Within a group of identical agreements, signed ones come first.
+                for row in rows:
+                    signatures = [
+                        aggregated_output["list_of_signatures"][i]
+                        for i, a in enumerate(list_of_agreements)
+                        if a is row
+                    ]
+                    self.assertEqual(
+                        signatures,
+                        sorted(signatures, key=lambda signature: signature is None),
+                    )
+
+    def test_preprocess_off(self):
+        """
+        Regression example: on this model with identical agreements, CBC's integer preprocessing returns a suboptimal
+        solution reported as optimal, so sign_pulp turns it off for such models. If the first assertion fails, the CBC
+        shipped with pulp no longer has this bug, and the option can be removed.
+        """
+        rows = [
+            (2, 1, 0.899424001995508, False),
+            (2, 4, 2.5441246877138526, False),
+            (1, 3, 1.5119183778222145, True),
+            (4, 3, 3.2536682083483446, True),
+            (1, 4, 2.2252471743015616, True),
+            (4, 2, 2.3578930923535415, False),
+        ]
+        list_of_agreements = [
+            Contract(
+                partners=[SCMLSignerTests.AGENT_ID, SCMLSignerTests.OTHER_AGENT_ID],
+                agreement={"time": time, "quantity": quantity, "unit_price": price},
+                annotation={"is_buy": is_buy},
+            )
+            for time, quantity, price, is_buy in (
+                rows[i]
+                for i in [4, 4, 1, 1, 2, 3, 5, 1, 3, 3, 0, 5, 3, 3, 0, 3, 0, 4, 2]
+                + [3, 4, 0, 5, 3, 4, 4, 0, 2, 0, 2, 2, 2, 2, 5, 4, 5, 2]
+            )
+        ]
+        optimal = SCMLContractsSigner.sign(
+            SCMLSignerTests.AGENT_ID,
+            list_of_agreements,
+            SCMLSignerTests.DEFAULT_TRUST_PROB,
+            engine="milp",
+        )["profit"]
+        signer_output = SCMLContractsSigner.sign(
+            SCMLSignerTests.AGENT_ID,
+            list_of_agreements,
+            SCMLSignerTests.DEFAULT_TRUST_PROB,
+            debug=True,
+        )
+        self.assertAlmostEqual(signer_output["profit"], optimal, places=6)
+        model = signer_output["model"]
+        profits = {}
+        for options in (None, ["preprocess off"]):
+            statistics = SCMLSolverStatistics.solve_pulp(model, options=options)
+            self.assertEqual(statistics["status"], "Optimal")
+            profits[options is None] = pulp.value(model.objective)
+        self.assertLess(profits[True], optimal - 1.0)
+        self.assertAlmostEqual(profits[False], optimal, places=6)
+
+    def test_improved_greedy(self):
+        """
+        Manual example: the units left over by a buy agreement serve later sell agreements, and a sell agreement whose
+        inputs cost more than its revenue is not signed.
+        """
+        counts = SCMLContractsSigner.improved_greedy(
+            buy_quantities=np.array([3.0, 1.0]),
+            buy_times=np.array([1, 1]),
+            buy_values=np.array([3.0, 100.0]),
+            buy_counts=np.array([1.0, 1.0]),
+            sell_quantities=np.array([1.0, 2.0, 1.0]),
+            sell_times=np.array([2, 3, 3]),
+            sell_values=np.array([5.0, 8.0, 50.0]),
+            sell_counts=np.array([1.0, 1.0, 1.0]),
+        )
+        self.assertEqual(counts.tolist(), [1, 0, 1, 0, 1])
+
+    def test_greedy_first(self):
+        """
+        The calls answered without the ILP must be optimal, and the others must give the ILP's solution.
+        """
+        certified = 0
+        for _ in range(0, 40):
+            list_of_agreements = [
+                SCMLSignerTests.generate_random_contract(horizon=random.randint(3, 10))
+                for _ in range(0, random.randint(1, 30))
+            ]
+            reference = SCMLContractsSigner.sign(
+                SCMLSignerTests.AGENT_ID,
+                list_of_agreements,
+                SCMLSignerTests.DEFAULT_TRUST_PROB,
+                engine="milp",
+            )
+            reference_profit = reference["profit"] or 0.0
+            signer_output = SCMLContractsSigner.sign(
+                SCMLSignerTests.AGENT_ID,
+                list_of_agreements,
+                SCMLSignerTests.DEFAULT_TRUST_PROB,
+                engine="milp",
+                greedy_first=True,
+                debug=True,
+            )
+            self.assertTrue(SCMLContractsSigner.is_sign_plan_consistent(signer_output))
+            if reference["statistics"] is None:
+                self.assertIsNone(signer_output["certified"])
+                continue
+            tolerance = 1e-6 * max(1.0, abs(reference_profit))
+            self.assertGreaterEqual(
+                signer_output["upper_bound"], reference_profit - tolerance
+            )
+            if signer_output["certified"]:
+                certified += 1
+                self.assertEqual(signer_output["statistics"]["solver"], "certificate")
+                self.assertIsNone(signer_output["time_to_solve_ilp"])
+                self.assertGreaterEqual(
+                    signer_output["profit"], reference_profit - tolerance
+                )
+            else:
+                self.assertEqual(signer_output["statistics"]["solver"], "highs")
+                self.assertEqual(
+                    signer_output["list_of_signatures"],
+                    reference["list_of_signatures"],
+                )
+        self.assertGreater(certified, 0)
+
+    def test_slim_output(self):
+        """
+        Without debug=True, the output must not keep the agreements, the trust probabilities or the model alive.
+        """
+        list_of_agreements = [
+            SCMLSignerTests.generate_random_contract() for _ in range(0, 30)
+        ]
+        for engine in ("pulp", "milp"):
+            slim_output, debug_output = (
+                SCMLContractsSigner.sign(
+                    SCMLSignerTests.AGENT_ID,
+                    list_of_agreements,
+                    SCMLSignerTests.DEFAULT_TRUST_PROB,
+                    engine=engine,
+                    debug=debug,
+                )
+                for debug in (False, True)
+            )
+            self.assertFalse(hasattr(slim_output, "__dict__"))
+            for key in ("agreements", "trust_probabilities", "model"):
+                self.assertIsNone(slim_output[key])
+            self.assertIs(debug_output["agreements"], list_of_agreements)
+            self.assertEqual(engine == "pulp", debug_output["model"] is not None)
+            self.assertEqual(
+                slim_output["list_of_signatures"], debug_output["list_of_signatures"]
+            )
+            self.assertTrue(
+                SCMLContractsSigner.is_sign_plan_consistent(
+                    slim_output, list_of_agreements
+                )
+            )
+
+    def test_sign_async(self):
+        """
+        Test that several signers run concurrently on an event loop give the same profits as the synchronous signer.
+        """
+        lists_of_agreements = [
+            [SCMLSignerTests.generate_random_contract() for _ in range(0, 30)]
+            for _ in range(0, 4)
+        ]
+
+        async def sign_all():
+            return await asyncio.gather(
+                *[
+                    SCMLContractsSigner.sign_async(
+                        SCMLSignerTests.AGENT_ID,
+                        list_of_agreements,
+                        SCMLSignerTests.DEFAULT_TRUST_PROB,
+                    )
+                    for list_of_agreements in lists_of_agreements
+                ]
+            )
+
+        async_outputs = asyncio.run(sign_all())
+        for list_of_agreements, async_output in zip(lists_of_agreements, async_outputs):
+            sync_output = SCMLContractsSigner.sign(
+                SCMLSignerTests.AGENT_ID,
+                list_of_agreements,
+                SCMLSignerTests.DEFAULT_TRUST_PROB,
+            )
+            self.assertTrue(
+                SCMLContractsSigner.is_sign_plan_consistent(
+                    async_output, list_of_agreements
+                )
+            )
+            if sync_output["profit"] is not None:
+                self.assertAlmostEqual(sync_output["profit"], async_output["profit"])
+
+    def test_sign_many(self):
+        """
+        Test that signing the problems of several agents in a process pool gives, in order, the same signatures as
+        signing them one by one.
+        """
+        problems = [
+            (
+                f"{SCMLSignerTests.AGENT_ID}_{i}",
+                [
+                    SCMLSignerTests.generate_random_contract()
+                    for _ in range(0, random.randint(0, 30))
+                ],
+                SCMLSignerTests.DEFAULT_TRUST_PROB,
+            )
+            for i in range(0, 6)
+        ]
+        # Each agent signs its own agreements.
+        for agent_id, list_of_agreements, _ in problems:
+            for agreement in list_of_agreements:
+                agreement.partners = [agent_id, SCMLSignerTests.OTHER_AGENT_ID]
+        for engine, workers in (("pulp", 2), ("milp", 2), ("pulp", 1)):
+            many_outputs = SCMLContractsSigner.sign_many(
+                problems, workers=workers, engine=engine
+            )
+            self.assertEqual(len(many_outputs), len(problems))
+            for (agent_id, list_of_agreements, trust), many_output in zip(
+                problems, many_outputs
+            ):
+                output = SCMLContractsSigner.sign(
+                    agent_id, list_of_agreements, trust, engine=engine
+                )
+                self.assertEqual(many_output["agent_id"], agent_id)
+                self.assertEqual(
+                    many_output["list_of_signatures"], output["list_of_signatures"]
+                )
+                self.assertEqual(many_output["profit"], output["profit"])
+        SCMLContractsSigner.close_pool()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,378 @@
+import argparse
+import itertools as it
+import json
+import os
+import time
+
+import numpy as np
+from prettytable import PrettyTable
+
+
+class SCMLCostModel:
+    """
+    Predicts how long each engine of SCMLContractsSigner.sign and SCMLBusinessPlan.compute_business_plan takes on an
+    instance, from its size, to choose the engine of engine='auto'. There is one log-linear model per problem and
+    engine: log(seconds) = weights . feature_vector. The weights are fitted on the instances of benchmark, which
+    python -m SCMLCostModel runs, and saved to a file. Setting the environment variable SCML_COST_MODEL to that file
+    makes it the cost model of every process. Otherwise, the defaults below, fitted the same way, are used. The file is
+    only read when the cost model is first used, see get_weights.
+    """
+
+    # The engines of each problem. Only the exact engines are guaranteed to return an optimal solution. The profit of
+    # the others is within a gap of the optimum that is only known once they are solved.
+    ENGINES = {"sign": ("pulp", "milp", "flow"), "plan": ("pulp", "milp")}
+    EXACT_ENGINES = ("pulp", "milp")
+
+    # The weights of each problem and engine, in the order of feature_vector, fitted with python -m SCMLCostModel.
+    DEFAULT_WEIGHTS = {
+        "sign": {
+            "pulp": [-7.91, 0.39, 0.39, 0.4, 0.19],
+            "milp": [-7.85, 0.33, 0.33, 0.46, 0.26],
+            "flow": [-8.28, 0.26, 0.26, -0.1, -0.06],
+        },
+        "plan": {
+            "pulp": [-7.5, 1.25, 0.71, 1.27],
+            "milp": [-7.18, 1.1, 0.78, 1.34],
+        },
+    }
+
+    # The weights in use, see get_weights and load.
+    weights = None
+
+    @staticmethod
+    def get_weights():
+        """
+        Returns the weights in use. They are only read the first time they are needed: from the file in the environment
+        variable SCML_COST_MODEL if it is set, and DEFAULT_WEIGHTS otherwise.
+        :return: the weights, as DEFAULT_WEIGHTS.
+        """
+        if SCMLCostModel.weights is None:
+            path = os.environ.get("SCML_COST_MODEL")
+            if path:
+                SCMLCostModel.load(path)
+            else:
+                SCMLCostModel.weights = SCMLCostModel.DEFAULT_WEIGHTS
+        return SCMLCostModel.weights
+
+    @staticmethod
+    def signer_features(buy_groups: list, sell_groups: list):
+        """
+        :param buy_groups: the groups of buy agreements, as returned by SCMLContractsSigner.aggregate_agreements.
+        :param sell_groups: the groups of sell agreements, as returned by SCMLContractsSigner.aggregate_agreements.
+        :return: the features of a signer instance: the number of 'agreements', of 'groups' and of distinct delivery
+        'times', and the largest 'quantity'.
+        """
+        # The signer imports this module, so it is imported here.
+        from SCMLContractsSigner import SCMLContractsSigner
+
+        groups = buy_groups + sell_groups
+        return {
+            "agreements": sum(len(g) for g in groups),
+            "groups": len(groups),
+            "times": len({g[0][SCMLContractsSigner.TIME] for g in groups}),
+            "quantity": max(
+                (g[0][SCMLContractsSigner.QUANTITY] for g in groups), default=0
+            ),
+        }
+
+    @staticmethod
+    def plan_features(horizon: int, q_max: int, optimistic: bool = True):
+        """
+        :param horizon: the number of steps in the model.
+        :param q_max: see SCMLBusinessPlan.compute_business_plan.
+        :param optimistic: see SCMLBusinessPlan.compute_business_plan.
+        :return: the features of a business plan instance.
+        """
+        return {"horizon": horizon, "q_max": q_max, "optimistic": optimistic}
+
+    @staticmethod
+    def feature_vector(problem: str, features: dict):
+        """
+        :param problem: 'sign' or 'plan'.
+        :param features: the features of an instance, see signer_features and plan_features.
+        :return: the array the weights of the problem multiply.
+        """
+        if problem == "sign":
+            values = (
+                features["agreements"],
+                features["groups"],
+                features["times"],
+                features["quantity"],
+            )
+            return np.concatenate(([1.0], np.log1p(values)))
+        return np.array(
+            [
+                1.0,
+                np.log1p(features["horizon"]),
+                np.log1p(features["q_max"]),
+                0.0 if features["optimistic"] else 1.0,
+            ]
+        )
+
+    @staticmethod
+    def predict(problem: str, features: dict):
+        """
+        :param problem: 'sign' or 'plan'.
+        :param features: the features of an instance, see signer_features and plan_features.
+        :return: a map {engine : predicted seconds}.
+        """
+        x = SCMLCostModel.feature_vector(problem, features)
+        return {
+            engine: float(
+                np.exp(np.dot(SCMLCostModel.get_weights()[problem][engine], x))
+            )
+            for engine in SCMLCostModel.ENGINES[problem]
+        }
+
+    @staticmethod
+    def choose(problem: str, features: dict, max_gap: float = 0.0):
+        """
+        Chooses the engine predicted to be the fastest among the ones that can meet the required optimality.
+        :param problem: 'sign' or 'plan'.
+        :param features: the features of the instance, see signer_features and plan_features.
+        :param max_gap: the relative gap to the optimal profit that is tolerated. With 0, only exact engines are
+        considered. Otherwise, the caller must check the gap of an inexact engine once it is solved.
+        :return: a map with the chosen 'engine', the 'reason' of the choice, the 'predicted' seconds of every engine,
+        the 'features' and the 'max_gap'.
+        """
+        predicted = SCMLCostModel.predict(problem, features)
+        candidates = [
+            engine
+            for engine in SCMLCostModel.ENGINES[problem]
+            if engine in SCMLCostModel.EXACT_ENGINES or max_gap > 0.0
+        ]
+        engine = min(candidates, key=predicted.get)
+        reason = (
+            f"fastest predicted engine among "
+            f"{'all' if len(candidates) == len(predicted) else 'the exact ones'}: "
+            + ", ".join(f"{e} {predicted[e] * 1e3 : .2f} ms" for e in candidates)
+        )
+        return {
+            "engine": engine,
+            "reason": reason,
+            "predicted": predicted,
+            "features": features,
+            "max_gap": max_gap,
+        }
+
+    @staticmethod
+    def benchmark(
+        signer_sizes=(10, 30, 100, 300, 1000),
+        signer_horizons=(5, 20),
+        signer_quantities=(10, 100),
+        plan_horizons=(5, 10, 20),
+        plan_q_maxes=(5, 10, 20, 40),
+        repeats: int = 2,
+        seed: int = 0,
+    ):
+        """
+        Times every engine on random instances of several sizes, as the synthetic inputs of the tests.
+        :param signer_sizes: the numbers of agreements of the signer instances.
+        :param signer_horizons: the delivery times of the agreements are drawn from 0, ..., horizon - 1.
+        :param signer_quantities: the quantities of the agreements are drawn from 1, ..., quantity - 1.
+        :param plan_horizons: the horizons of the business plan instances.
+        :param plan_q_maxes: the values of q_max of the business plan instances.
+        :param repeats: the number of instances of each size.
+        :param seed: the seed of the random instances.
+        :return: a list of samples, each a map with the 'problem', the 'engine', the 'features' and the 'seconds'.
+        """
+        # The solvers import this module, so they are imported here.
+        from SCMLBusinessPlan import SCMLBusinessPlan
+        from SCMLContractsSigner import SCMLContractsSigner
+
+        rng = np.random.default_rng(seed)
+        samples = []
+        for n, horizon, quantity, _ in it.product(
+            signer_sizes, signer_horizons, signer_quantities, range(repeats)
+        ):
+            is_buy = rng.random(n) < 0.5
+            agreements = [
+                (
+                    i,
+                    int(rng.integers(1, quantity)),
+                    int(rng.integers(0, horizon)),
+                    float(rng.uniform(7, 12) if is_buy[i] else rng.uniform(10, 15)),
+                    float(rng.uniform(0.5, 1.0)),
+                )
+                for i in range(0, n)
+            ]
+            buy_agreements = [a for a in agreements if is_buy[a[0]]]
+            sell_agreements = [a for a in agreements if not is_buy[a[0]]]
+            pruned_buy, pruned_sell, _ = SCMLContractsSigner.prune_agreements(
+                buy_agreements, sell_agreements
+            )
+            if len(pruned_sell) == 0:
+                continue
+            features = SCMLCostModel.signer_features(
+                SCMLContractsSigner.aggregate_agreements(pruned_buy),
+                SCMLContractsSigner.aggregate_agreements(pruned_sell),
+            )
+            for engine in SCMLCostModel.ENGINES["sign"]:
+                t0 = time.perf_counter()
+                SCMLContractsSigner.sign_partitioned(
+                    "benchmark", n, buy_agreements, sell_agreements, engine=engine
+                )
+                samples.append(
+                    {
+                        "problem": "sign",
+                        "engine": engine,
+                        "features": features,
+                        "seconds": time.perf_counter() - t0,
+                    }
+                )
+
+        for horizon, q_max, _ in it.product(
+            plan_horizons, plan_q_maxes, range(repeats)
+        ):
+            Q_inn, Q_out = (
+                {
+                    t: dict(enumerate((weights / weights.sum()).tolist()))
+                    for t, weights in enumerate(
+                        rng.integers(1, q_max, (horizon, q_max)).astype(float)
+                    )
+                }
+                for _ in range(0, 2)
+            )
+            instance = {
+                "horizon": horizon,
+                "q_max": q_max,
+                "Q_inn": Q_inn,
+                "Q_out": Q_out,
+                "p_inn": dict(enumerate(rng.uniform(7, 12, horizon).tolist())),
+                "p_out": dict(enumerate(rng.uniform(10, 15, horizon).tolist())),
+            }
+            for optimistic, engine in it.product(
+                (True, False), SCMLCostModel.ENGINES["plan"]
+            ):
+                t0 = time.perf_counter()
+                SCMLBusinessPlan.compute_business_plan(
+                    **instance, optimistic=optimistic, engine=engine
+                )
+                samples.append(
+                    {
+                        "problem": "plan",
+                        "engine": engine,
+                        "features": SCMLCostModel.plan_features(
+                            horizon, q_max, optimistic
+                        ),
+                        "seconds": time.perf_counter() - t0,
+                    }
+                )
+        return samples
+
+    @staticmethod
+    def fit(samples: list):
+        """
+        Fits the weights of every problem and engine by least squares on the logarithm of the times.
+        :param samples: the samples, as returned by benchmark.
+        :return: the weights, as DEFAULT_WEIGHTS. The problems and engines with fewer samples than weights keep the
+        weights in use.
+        """
+        weights = {
+            problem: dict(engines)
+            for problem, engines in SCMLCostModel.get_weights().items()
+        }
+        for problem, engines in SCMLCostModel.ENGINES.items():
+            for engine in engines:
+                selected = [
+                    s
+                    for s in samples
+                    if s["problem"] == problem and s["engine"] == engine
+                ]
+                if len(selected) == 0:
+                    continue
+                X = np.array(
+                    [
+                        SCMLCostModel.feature_vector(problem, s["features"])
+                        for s in selected
+                    ]
+                )
+                if len(selected) < X.shape[1]:
+                    continue
+                y = np.log([max(s["seconds"], 1e-6) for s in selected])
+                w = np.linalg.lstsq(X, y, rcond=None)[0]
+                weights[problem][engine] = np.round(w, 2).tolist()
+        return weights
+
+    @staticmethod
+    def save(path: str, weights: dict):
+        """
+        :param path: the file to write.
+        :param weights: the weights, as returned by fit.
+        """
+        with open(path, "w") as file:
+            json.dump(weights, file, indent=2)
+
+    @staticmethod
+    def load(path: str):
+        """
+        Makes the weights saved in a file the ones in use.
+        :param path: a file written by save.
+        :return: the weights.
+        """
+        with open(path) as file:
+            SCMLCostModel.weights = json.load(file)
+        return SCMLCostModel.weights
+
+    @staticmethod
+    def print_fit(samples: list, weights: dict):
+        """
+        Prints, for every problem and engine, the number of samples and how far the predictions are from the times.
+        :param samples: the samples, as returned by benchmark.
+        :param weights: the weights, as returned by fit.
+        """
+        ptable = PrettyTable()
+        ptable.field_names = [
+            "problem",
+            "engine",
+            "samples",
+            "median time",
+            "median error",
+            "weights",
+        ]
+        for problem, engines in SCMLCostModel.ENGINES.items():
+            for engine in engines:
+                selected = [
+                    s
+                    for s in samples
+                    if s["problem"] == problem and s["engine"] == engine
+                ]
+                if len(selected) == 0:
+                    continue
+                predicted = np.exp(
+                    [
+                        np.dot(
+                            weights[problem][engine],
+                            SCMLCostModel.feature_vector(problem, s["features"]),
+                        )
+                        for s in selected
+                    ]
+                )
+                seconds = np.array([s["seconds"] for s in selected])
+                ptable.add_row(
+                    [
+                        problem,
+                        engine,
+                        len(selected),
+                        f"{np.median(seconds) * 1e3 : .2f} ms",
+                        f"x{np.median(np.exp(np.abs(np.log(predicted / seconds)))) : .2f}",
+                        weights[problem][engine],
+                    ]
+                )
+        print(ptable)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Times the engines of the signer and the business plan solver on random instances and fits the "
+        "cost model of engine='auto'. Set SCML_COST_MODEL to the output file to use it."
+    )
+    parser.add_argument("--output", default="scml_cost_model.json")
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    benchmark_samples = SCMLCostModel.benchmark(repeats=args.repeats, seed=args.seed)
+    fitted_weights = SCMLCostModel.fit(benchmark_samples)
+    SCMLCostModel.print_fit(benchmark_samples, fitted_weights)
+    SCMLCostModel.save(args.output, fitted_weights)
+    print(f"Saved to {args.output}")
@@ -0,0 +1,174 @@
+import copy
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+import SCMLBusinessPlanTests
+import SCMLContractsSignerTests
+from SCMLBusinessPlan import SCMLBusinessPlan
+from SCMLContractsSigner import SCMLContractsSigner
+from SCMLCostModel import SCMLCostModel
+
+
+class SCMLCostModelTests(unittest.TestCase):
+    def test_fit(self):
+        """
+        Fitting times generated by known weights must recover them.
+        """
+        np.random.seed(0)
+        weights = {"pulp": [-6.0, 0.5, 0.2, 1.0], "milp": [-8.0, 0.8, 0.9, 0.3]}
+        samples = []
+        for _ in range(0, 50):
+            features = SCMLCostModel.plan_features(
+                np.random.randint(1, 50),
+                np.random.randint(1, 50),
+                bool(np.random.randint(0, 2)),
+            )
+            for engine, w in weights.items():
+                samples.append(
+                    {
+                        "problem": "plan",
+                        "engine": engine,
+                        "features": features,
+                        "seconds": float(
+                            np.exp(
+                                np.dot(
+                                    w, SCMLCostModel.feature_vector("plan", features)
+                                )
+                            )
+                        ),
+                    }
+                )
+        fitted = SCMLCostModel.fit(samples)
+        for engine, w in weights.items():
+            self.assertTrue(np.allclose(fitted["plan"][engine], w, atol=0.01))
+        # Without samples, the weights in use are kept.
+        self.assertEqual(fitted["sign"], SCMLCostModel.get_weights()["sign"])
+
+    def test_choose(self):
+        """
+        The choice must be the fastest predicted engine, among the exact ones unless a gap is tolerated.
+        """
+        features = {"agreements": 100, "groups": 90, "times": 10, "quantity": 20}
+        predicted = SCMLCostModel.predict("sign", features)
+        exact = SCMLCostModel.choose("sign", features)
+        self.assertIn(exact["engine"], SCMLCostModel.EXACT_ENGINES)
+        self.assertEqual(
+            exact["engine"], min(SCMLCostModel.EXACT_ENGINES, key=predicted.get)
+        )
+        inexact = SCMLCostModel.choose("sign", features, max_gap=0.05)
+        self.assertEqual(inexact["engine"], min(predicted, key=predicted.get))
+        self.assertEqual(inexact["max_gap"], 0.05)
+
+    def test_sign_auto(self):
+        """
+        The signer must record its choice, and only return a solution within max_gap of the optimum, falling back to an
+        exact engine when the flow is not close enough.
+        """
+        random.seed(0)
+        signer_tests = SCMLContractsSignerTests.SCMLSignerTests
+        fallbacks = 0
+        for _ in range(0, 50):
+            agreements = [
+                signer_tests.generate_random_contract()
+                for _ in range(0, random.randint(1, 30))
+            ]
+            optimal = SCMLContractsSigner.sign(
+                signer_tests.AGENT_ID,
+                agreements,
+                signer_tests.DEFAULT_TRUST_PROB,
+                engine="milp",
+            )
+            for max_gap in (0.0, 1e-9, 1.0):
+                output = SCMLContractsSigner.sign(
+                    signer_tests.AGENT_ID,
+                    agreements,
+                    signer_tests.DEFAULT_TRUST_PROB,
+                    engine="auto",
+                    max_gap=max_gap,
+                )
+                choice = output["engine_choice"]
+                self.assertEqual(choice["max_gap"], max_gap)
+                self.assertTrue(
+                    SCMLContractsSigner.is_sign_plan_consistent(output, agreements)
+                )
+                if optimal["profit"] is None:
+                    # No sell agreements: no engine is run.
+                    self.assertIsNone(choice["engine"])
+                    continue
+                self.assertEqual(output["engine"], choice["engine"])
+                if max_gap == 0.0:
+                    self.assertIn(output["engine"], SCMLCostModel.EXACT_ENGINES)
+                if max_gap == 1e-9 and output["engine"] != "flow":
+                    self.assertIn("more than max_gap", choice["reason"])
+                    fallbacks += 1
+                self.assertGreaterEqual(
+                    output["profit"],
+                    (1.0 - max_gap) * optimal["profit"] - 1e-6,
+                )
+        self.assertGreater(fallbacks, 0)
+
+    def test_plan_auto(self):
+        """
+        The business plan solver must record its choice and return the optimal profit.
+        """
+        np.random.seed(0)
+        synthetic_input = (
+            SCMLBusinessPlanTests.SCMLBusinessTests.synthetic_input_creation(8, 10)
+        )
+        output = SCMLBusinessPlan.compute_business_plan(
+            **synthetic_input, engine="auto"
+        )
+        choice = output["engine_choice"]
+        self.assertIn(choice["engine"], SCMLCostModel.ENGINES["plan"])
+        self.assertEqual(output["engine"], choice["engine"])
+        self.assertEqual(choice["features"], SCMLCostModel.plan_features(8, 10, True))
+        optimal = SCMLBusinessPlan.compute_business_plan(
+            **synthetic_input, engine="pulp"
+        )
+        self.assertAlmostEqual(output["profit"], optimal["profit"], places=4)
+
+    def test_weights_file(self):
+        """
+        The weights of the file in SCML_COST_MODEL must only be read when the cost model is first used, and the choice
+        must be attached to the output of whichever engine it picks.
+        """
+        np.random.seed(0)
+        synthetic_input = (
+            SCMLBusinessPlanTests.SCMLBusinessTests.synthetic_input_creation(5, 5)
+        )
+        previous = os.environ.get("SCML_COST_MODEL")
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "weights.json")
+                os.environ["SCML_COST_MODEL"] = path
+                for fastest in SCMLCostModel.ENGINES["plan"]:
+                    weights = copy.deepcopy(SCMLCostModel.DEFAULT_WEIGHTS)
+                    for engine in SCMLCostModel.ENGINES["plan"]:
+                        weights["plan"][engine] = [
+                            -10.0 if engine == fastest else 0.0,
+                            0.0,
+                            0.0,
+                            0.0,
+                        ]
+                    SCMLCostModel.save(path, weights)
+                    SCMLCostModel.weights = None
+                    output = SCMLBusinessPlan.compute_business_plan(
+                        **synthetic_input, engine="auto"
+                    )
+                    self.assertEqual(SCMLCostModel.weights, weights)
+                    self.assertEqual(output["engine"], fastest)
+                    self.assertEqual(output["engine_choice"]["engine"], fastest)
+        finally:
+            if previous is None:
+                del os.environ["SCML_COST_MODEL"]
+            else:
+                os.environ["SCML_COST_MODEL"] = previous
+            SCMLCostModel.weights = None
+
+
+if __name__ == "__main__":
+    unittest.main()
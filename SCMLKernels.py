@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def jit(function):
+    """
+    Compiles a kernel with Numba, if it is installed, and caches the machine code on disk next to this module, so that
+    new processes, e.g., the workers of a pool, load it instead of compiling it again. Otherwise, the kernel is left
+    as a plain Python function.
+    :param function: a function over NumPy arrays and numbers only.
+    :return: the compiled function, or the function itself.
+    """
+    return function if numba is None else numba.njit(cache=True)(function)
+
+
+class SCMLKernels:
+    """
+    Array kernels for the per-element loops of the solvers: the dynamic program of
+    SCMLBusinessPlan.compute_min_expectation, the inventory check of SCMLContractsSigner.is_sign_plan_consistent and
+    the matching loop of SCMLContractsSigner.greedy_signer. The kernels are compiled with Numba when it is installed,
+    which is optional. The callers use them only if enabled is True, and otherwise run their pure Python code. Both
+    compute the same results, with the same floating point operations in the same order.
+    """
+
+    # Whether Numba is installed, i.e., whether the kernels are compiled.
+    available = numba is not None
+
+    # Whether the callers use the kernels. By default, only if they are compiled: interpreted, the kernels are
+    # slower than the code of the callers. Setting the environment variable SCML_KERNELS to 0 disables them.
+    enabled = available and os.environ.get("SCML_KERNELS", "1") != "0"
+
+    @staticmethod
+    @jit
+    def min_expectation(probabilities: np.ndarray, size: int):
+        """
+        :param probabilities: an array with P(X = x) at [x], for x = 0, ..., size - 2 at least.
+        :param size: the support of random variable is from 0, ..., size.
+        :return: an array with E[min(y, X)] at [y], for y = 0, ..., size - 1, see
+        SCMLBusinessPlan.compute_min_expectation.
+        """
+        minima = np.zeros(max(size, 1))
+        temp = 1.0
+        for i in range(1, size):
+            temp -= probabilities[i - 1]
+            minima[i] = minima[i - 1] + temp
+        return minima
+
+    @staticmethod
+    @jit
+    def is_inventory_consistent(buy_plan: np.ndarray, sell_plan: np.ndarray):
+        """
+        :param buy_plan: an array with the quantity bought at each time.
+        :param sell_plan: an array with the quantity sold at each time.
+        :return: True if the output inventory never goes negative, see SCMLContractsSigner.is_sign_plan_consistent.
+        """
+        output_inventory_level = 0
+        for i in range(1, len(buy_plan)):
+            output_inventory_level += buy_plan[i - 1] - sell_plan[i]
+            if output_inventory_level < 0:
+                return False
+        return True
+
+    @staticmethod
+    @jit
+    def greedy_matching(
+        buy_quantities: np.ndarray,
+        buy_times: np.ndarray,
+        buy_values: np.ndarray,
+        sell_quantities: np.ndarray,
+        sell_times: np.ndarray,
+        sell_values: np.ndarray,
+    ):
+        """
+        The matching loop of SCMLContractsSigner.greedy_signer. Each sell agreement, in the given order, is signed if
+        the buy agreements delivered before it and not used yet, in the given order, cover its quantity. The buy
+        agreements counted for it are then used, even if they cover more than its quantity.
+        :param buy_quantities: an array with the quantity of each buy agreement, in ascending order of expected cost.
+        :param buy_times: an array with the delivery time of each buy agreement.
+        :param buy_values: an array with the expected cost of each buy agreement.
+        :param sell_quantities: an array with the quantity of each sell agreement, in descending order of expected
+        revenue.
+        :param sell_times: an array with the delivery time of each sell agreement.
+        :param sell_values: an array with the expected revenue of each sell agreement.
+        :return: a boolean array, True for the signed buy agreements, another for the signed sell agreements, and the
+        expected profit.
+        """
+        buy_signed = np.zeros(len(buy_quantities), dtype=np.bool_)
+        sell_signed = np.zeros(len(sell_quantities), dtype=np.bool_)
+        chosen = np.zeros(len(buy_quantities), dtype=np.int64)
+        profit = 0.0
+        for s in range(len(sell_quantities)):
+            quantity_satisfied = 0
+            cost = 0.0
+            k = 0
+            for i in range(len(buy_quantities)):
+                if not buy_signed[i] and buy_times[i] < sell_times[s]:
+                    quantity_satisfied += buy_quantities[i]
+                    cost += buy_values[i]
+                    chosen[k] = i
+                    k += 1
+                    if quantity_satisfied >= sell_quantities[s]:
+                        sell_signed[s] = True
+                        for j in range(k):
+                            buy_signed[chosen[j]] = True
+                        profit += sell_values[s] - cost
+                        break
+        return buy_signed, sell_signed, profit
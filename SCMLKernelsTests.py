@@ -0,0 +1,121 @@
+import random
+import unittest
+
+import numpy as np
+
+import SCMLContractsSignerTests
+from SCMLBusinessPlan import SCMLBusinessPlan
+from SCMLContractsSigner import SCMLContractsSigner
+from SCMLKernels import SCMLKernels
+
+
+class SCMLKernelsTests(unittest.TestCase):
+    @staticmethod
+    def in_both_modes(function, *args):
+        """
+        :return: the results of the function with the kernels disabled and enabled. If Numba is not installed, the
+        kernels run interpreted.
+        """
+        enabled = SCMLKernels.enabled
+        try:
+            results = []
+            for mode in (False, True):
+                SCMLKernels.enabled = mode
+                results.append(function(*args))
+            return results
+        finally:
+            SCMLKernels.enabled = enabled
+
+    def test_min_expectation(self):
+        """
+        The kernel must compute exactly the same minima as the dynamic program.
+        """
+        np.random.seed(0)
+        for _ in range(0, 200):
+            size = np.random.randint(0, 30)
+            support = np.random.randint(0, size + 5, size=np.random.randint(0, 8))
+            # Sometimes leave some mass beyond the support, as allowed by compute_min_expectation.
+            probabilities = np.random.dirichlet(np.ones(len(support) + 1))[:-1]
+            dict_data = dict(zip(support.tolist(), probabilities.tolist()))
+            python, kernel = SCMLKernelsTests.in_both_modes(
+                SCMLBusinessPlan.compute_min_expectation, dict_data, size
+            )
+            self.assertEqual(python, kernel)
+
+    def test_greedy_signer(self):
+        """
+        The kernels must sign the same agreements, with exactly the same profit, and agree on the consistency of any
+        plan.
+        """
+        random.seed(0)
+        signer_tests = SCMLContractsSignerTests.SCMLSignerTests
+        checked = 0
+        for _ in range(0, 100):
+            agreements = [
+                signer_tests.generate_random_contract()
+                for _ in range(0, random.randint(1, 40))
+            ]
+            python, kernel = SCMLKernelsTests.in_both_modes(
+                SCMLContractsSigner.greedy_signer,
+                signer_tests.AGENT_ID,
+                agreements,
+                signer_tests.DEFAULT_TRUST_PROB,
+            )
+            self.assertEqual(python["list_of_signatures"], kernel["list_of_signatures"])
+            self.assertEqual(python["profit"], kernel["profit"])
+
+            # Random plans, most of them inconsistent.
+            horizon = max((a.agreement["time"] for a in agreements), default=0)
+            signer_output = {
+                "agreements": agreements,
+                "list_of_signatures": [
+                    signer_tests.AGENT_ID
+                    if random.random() < 0.5
+                    and 0 < a.agreement["time"] + a.annotation["is_buy"] <= horizon
+                    else None
+                    for a in agreements
+                ],
+            }
+            for output in (python, signer_output):
+                consistent = SCMLKernelsTests.in_both_modes(
+                    SCMLContractsSigner.is_sign_plan_consistent, output
+                )
+                self.assertEqual(consistent[0], consistent[1])
+                checked += not consistent[0]
+        self.assertGreater(checked, 0)
+
+    @unittest.skipUnless(SCMLKernels.available, "Numba is not installed")
+    def test_compiled(self):
+        """
+        The compiled kernels must agree with their Python source.
+        """
+        np.random.seed(1)
+        probabilities = np.random.dirichlet(np.ones(20))
+        self.assertTrue(
+            np.array_equal(
+                SCMLKernels.min_expectation(probabilities, 20),
+                SCMLKernels.min_expectation.py_func(probabilities, 20),
+            )
+        )
+        plans = np.random.randint(0, 5, size=(2, 30))
+        self.assertEqual(
+            SCMLKernels.is_inventory_consistent(*plans),
+            SCMLKernels.is_inventory_consistent.py_func(*plans),
+        )
+        arrays = (
+            np.random.randint(1, 10, size=15).astype(float),
+            np.random.randint(0, 10, size=15),
+            np.sort(np.random.random(15) * 100),
+            np.random.randint(1, 10, size=10).astype(float),
+            np.random.randint(0, 10, size=10),
+            np.sort(np.random.random(10) * 100)[::-1].copy(),
+        )
+        compiled = SCMLKernels.greedy_matching(*arrays)
+        python = SCMLKernels.greedy_matching.py_func(*arrays)
+        self.assertTrue(np.array_equal(compiled[0], python[0]))
+        self.assertTrue(np.array_equal(compiled[1], python[1]))
+        self.assertEqual(compiled[2], python[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,322 @@
+import argparse
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, Tuple
+
+import numpy as np
+from negmas import Contract
+from prettytable import PrettyTable
+
+from SCMLBusinessPlan import SCMLBusinessPlan
+from SCMLContractsSigner import SCMLContractsSigner
+from SCMLSolverStatistics import SCMLSolverStatistics
+from SCMLTrustEstimator import SCMLTrustEstimator
+
+
+class SCMLMarketSimulator:
+    """
+    A self-contained local market to measure the throughput of the signer and the business plan solver when they run
+    together over a whole game, with no negmas world and no network. Each step:
+    - 'generate': agreements with partners drawn from the configured populations are generated,
+    - 'sign': SCMLContractsSigner.sign decides which ones to sign, with trust probabilities estimated from the
+    partners' past breaches (see SCMLTrustEstimator),
+    - 'plan': SCMLBusinessPlan.compute_business_plan plans the next horizon steps, with the signed quantities as
+    commitments C_inn and C_out. The plan is rolling (see the parameter rolling of compute_business_plan): the past
+    steps are fixed to the quantities actually delivered, so the inventory they left is taken into account,
+    - 'execute': the signed agreements due at the current step are executed, each partner breaching with its
+    population's breach rate, and the trust estimator is updated. Then, time advances.
+    The market, i.e., the distributions of the quantities and the prices at each time, is drawn once per time.
+    """
+
+    PHASES = ("generate", "sign", "plan", "execute")
+
+    def __init__(
+        self,
+        populations: Dict[str, Tuple[int, float]] = None,
+        horizon: int = 10,
+        q_max: int = 10,
+        agreements_per_step: int = 10,
+        engine: str = "pulp",
+        sign_kwargs: dict = None,
+        plan_kwargs: dict = None,
+        seed: int = None,
+    ):
+        """
+        :param populations: a map {population name : (number of partners, breach rate)}. The partners of a population
+        are named '<name>_<i>', and each breaches a contract with probability equal to the breach rate. Defaults to
+        a reliable and an unreliable population.
+        :param horizon: the number of steps ahead covered by the agreements and by the business plan.
+        :param q_max: the range of quantities of the business plan, 0, ..., q_max - 1. The agreements' quantities are
+        drawn so that commitments mostly stay in this range.
+        :param agreements_per_step: the number of agreements generated each step, half buys and half sells on average.
+        :param engine: the engine of both the signer and the business plan solver, 'pulp', 'milp' or 'auto'.
+        :param sign_kwargs: further keyword arguments for SCMLContractsSigner.sign, e.g., {'aggregate': False}.
+        :param plan_kwargs: further keyword arguments for SCMLBusinessPlan.compute_business_plan, e.g.,
+        {'optimistic': False}.
+        :param seed: a seed for the random generator.
+        """
+        if populations is None:
+            populations = {"reliable": (10, 0.05), "unreliable": (5, 0.4)}
+        self.agent_id = "SIMULATED"
+        self.breach_rates = {
+            f"{name}_{i}": breach_rate
+            for name, (count, breach_rate) in populations.items()
+            for i in range(0, count)
+        }
+        self.partner_ids = list(self.breach_rates)
+        self.horizon = horizon
+        self.q_max = q_max
+        self.agreements_per_step = agreements_per_step
+        self.engine = engine
+        self.sign_kwargs = {} if sign_kwargs is None else sign_kwargs
+        self.plan_kwargs = {} if plan_kwargs is None else plan_kwargs
+        self.rng = np.random.default_rng(seed)
+        self.trust_estimator = SCMLTrustEstimator(partners=self.partner_ids)
+        self.current_step = 0
+        # The signed agreements not yet executed, by delivery time.
+        self.book = defaultdict(list)
+        # The signed quantities by delivery time, or the delivered quantities for past times.
+        self.C_inn = defaultdict(int)
+        self.C_out = defaultdict(int)
+        self.market = {"Q_inn": {}, "Q_out": {}, "p_inn": {}, "p_out": {}}
+        self.latencies = {phase: [] for phase in SCMLMarketSimulator.PHASES}
+        # The model size and solver statistics of the 'sign' and 'plan' phases.
+        self.solver_statistics = SCMLSolverStatistics()
+        self.signed = 0
+        self.breached = 0
+        self.infeasible_plans = 0
+
+    def generate_agreements(self):
+        """
+        Generates the agreements of the current step, with random partners, delivery times in the next horizon - 1
+        steps, small quantities, and the same price ranges as the synthetic inputs of the tests: buy prices in [7, 12]
+        and sell prices in [10, 15].
+        :return: a list of negmas.Contract.
+        """
+        n = self.agreements_per_step
+        is_buy = self.rng.random(n) < 0.5
+        times = self.current_step + self.rng.integers(1, self.horizon, n)
+        quantities = self.rng.integers(1, max(2, self.q_max // 4), n)
+        prices = np.where(
+            is_buy, self.rng.uniform(7, 12, n), self.rng.uniform(10, 15, n)
+        )
+        partners = self.rng.choice(self.partner_ids, n)
+        return [
+            Contract(
+                partners=[self.agent_id, str(partners[i])],
+                agreement={
+                    "time": int(times[i]),
+                    "quantity": int(quantities[i]),
+                    "unit_price": float(prices[i]),
+                },
+                annotation={"is_buy": bool(is_buy[i])},
+            )
+            for i in range(0, n)
+        ]
+
+    def extend_market(self, end: int):
+        """
+        Draws the distributions of the quantities the market offers and demands, and the expected prices, for the
+        times up to end that were not drawn yet, as in the synthetic inputs of the tests. The market is liquid: the
+        quantities are at least q_max // 2, so commitments up to that quantity can be met with certainty. Otherwise,
+        as commitments bound the expected traded quantities, selling exactly the units in inventory would already
+        make the plan infeasible.
+        :param end: the first time not to draw.
+        """
+        low = self.q_max // 2
+        for t in range(len(self.market["p_inn"]), end):
+            for key in ("Q_inn", "Q_out"):
+                weights = self.rng.integers(1, self.q_max, self.q_max - low)
+                weights = weights / weights.sum()
+                self.market[key][t] = dict(
+                    zip(range(low, self.q_max), weights.tolist())
+                )
+            self.market["p_inn"][t] = float(self.rng.uniform(7, 12))
+            self.market["p_out"][t] = float(self.rng.uniform(10, 15))
+
+    def step(self):
+        """
+        Runs one step of the market and records the latency of each of its phases.
+        """
+        t0 = time.perf_counter()
+        agreements = self.generate_agreements()
+        t1 = time.perf_counter()
+        signer_output = SCMLContractsSigner.sign(
+            self.agent_id,
+            agreements,
+            self.trust_estimator.trust_probabilities,
+            engine=self.engine,
+            **self.sign_kwargs,
+        )
+        for agreement, signature in zip(
+            agreements, signer_output["list_of_signatures"]
+        ):
+            if signature is not None:
+                t = agreement.agreement["time"]
+                self.book[t].append(agreement)
+                C = self.C_inn if agreement.annotation["is_buy"] else self.C_out
+                C[t] += agreement.agreement["quantity"]
+                self.signed += 1
+        t2 = time.perf_counter()
+        self.extend_market(self.current_step + self.horizon)
+        plan_output = SCMLBusinessPlan.compute_business_plan(
+            horizon=self.current_step + self.horizon,
+            q_max=self.q_max,
+            **self.market,
+            C_inn=self.C_inn,
+            C_out=self.C_out,
+            step=self.current_step,
+            rolling=True,
+            engine=self.engine,
+            **self.plan_kwargs,
+        )
+        if (
+            plan_output["profit"] is None
+            or plan_output["statistics"]["status"] == "Infeasible"
+        ):
+            self.infeasible_plans += 1
+        self.solver_statistics.add(signer_output, "sign")
+        self.solver_statistics.add(plan_output, "plan")
+        t3 = time.perf_counter()
+        due = self.book.pop(self.current_step, [])
+        if len(due) > 0:
+            fulfilled = self.rng.random(len(due)) >= np.array(
+                [
+                    self.breach_rates[
+                        a.partners[0]
+                        if a.partners[0] != self.agent_id
+                        else a.partners[1]
+                    ]
+                    for a in due
+                ]
+            )
+            self.trust_estimator.update_from_contracts(self.agent_id, due, fulfilled)
+            self.breached += int((~fulfilled).sum())
+            # Breached agreements deliver nothing.
+            for agreement, delivered in zip(due, fulfilled):
+                if not delivered:
+                    C = self.C_inn if agreement.annotation["is_buy"] else self.C_out
+                    C[self.current_step] -= agreement.agreement["quantity"]
+        self.current_step += 1
+        t4 = time.perf_counter()
+        for phase, latency in zip(
+            SCMLMarketSimulator.PHASES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)
+        ):
+            self.latencies[phase].append(latency)
+
+    def run(self, steps: int, trace_memory: bool = True):
+        """
+        Runs the given number of steps and reports the throughput.
+        :param steps: the number of steps.
+        :param trace_memory: if True, the peak memory is measured with tracemalloc. Tracing slows allocations down, so
+        the throughput is lower than without it. Memory used by CBC, which runs in its own process, is not counted.
+        :return: a map with the number of 'steps', the total 'seconds', 'steps_per_second', the 'latencies' of each
+        phase as a map {phase : {'mean', 'p50', 'p90', 'p99', 'max'}} in seconds, the 'peak_memory' in bytes (None
+        if trace_memory is False), and the numbers of 'signed' and 'breached' agreements and of 'infeasible_plans'
+        during these steps. Plans are counted as infeasible when they have no profit or the solver proved their model
+        infeasible.
+        """
+        assert steps > 0
+        before = (self.signed, self.breached, self.infeasible_plans)
+        if trace_memory:
+            tracemalloc.start()
+        t0 = time.perf_counter()
+        try:
+            for _ in range(0, steps):
+                self.step()
+        finally:
+            seconds = time.perf_counter() - t0
+            peak_memory = None
+            if trace_memory:
+                peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        return {
+            "steps": steps,
+            "seconds": seconds,
+            "steps_per_second": steps / seconds if seconds > 0 else float("inf"),
+            "latencies": {
+                phase: SCMLMarketSimulator.percentiles(self.latencies[phase][-steps:])
+                for phase in SCMLMarketSimulator.PHASES
+            },
+            "peak_memory": peak_memory,
+            "signed": self.signed - before[0],
+            "breached": self.breached - before[1],
+            "infeasible_plans": self.infeasible_plans - before[2],
+        }
+
+    @staticmethod
+    def percentiles(latencies):
+        """
+        :param latencies: a list of latencies.
+        :return: a map with the mean, the 50th, 90th and 99th percentiles and the maximum of the latencies.
+        """
+        latencies = np.asarray(latencies, dtype=float)
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        return {
+            "mean": float(latencies.mean()),
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "max": float(latencies.max()),
+        }
+
+    @staticmethod
+    def print_report(report, title: str = "Simulated market"):
+        """
+        Prints a report returned by run.
+        :param report: the report.
+        :param title: a human readable title.
+        """
+        latency_table = PrettyTable()
+        latency_table.field_names = ["phase", "mean", "p50", "p90", "p99", "max"]
+        for phase, latencies in report["latencies"].items():
+            latency_table.add_row(
+                [phase]
+                + [
+                    f"{1000 * latencies[k] : .2f} ms"
+                    for k in latency_table.field_names[1:]
+                ]
+            )
+        print(f"\n--- {title} ---")
+        print(
+            f"{report['steps']} steps in {report['seconds'] : .2f} sec., "
+            f"{report['steps_per_second'] : .2f} steps/sec."
+        )
+        if report["peak_memory"] is not None:
+            print(f"peak memory: {report['peak_memory'] / 2 ** 20 : .2f} MiB")
+        print(
+            f"signed: {report['signed']}, breached: {report['breached']}, "
+            f"infeasible plans: {report['infeasible_plans']}"
+        )
+        print(latency_table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measures the throughput of the signer and the business plan solver in a simulated market."
+    )
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--horizon", type=int, default=10)
+    parser.add_argument("--q-max", type=int, default=10)
+    parser.add_argument("--agreements-per-step", type=int, default=10)
+    parser.add_argument("--engine", choices=("pulp", "milp", "auto"), default="pulp")
+    parser.add_argument("--pessimistic", action="store_true")
+    parser.add_argument("--greedy-first", action="store_true")
+    parser.add_argument("--no-trace-memory", action="store_true")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    simulator = SCMLMarketSimulator(
+        horizon=args.horizon,
+        q_max=args.q_max,
+        agreements_per_step=args.agreements_per_step,
+        engine=args.engine,
+        sign_kwargs={"greedy_first": args.greedy_first},
+        plan_kwargs={"optimistic": not args.pessimistic},
+        seed=args.seed,
+    )
+    SCMLMarketSimulator.print_report(
+        simulator.run(args.steps, trace_memory=not args.no_trace_memory),
+        title=f"Simulated market, engine {args.engine}",
+    )
+    simulator.solver_statistics.print_summary()
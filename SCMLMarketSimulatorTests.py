@@ -0,0 +1,51 @@
+import unittest
+
+from SCMLMarketSimulator import SCMLMarketSimulator
+
+
+class SCMLMarketSimulatorTests(unittest.TestCase):
+    def test_run(self):
+        """
+        Run a short game with each engine and check the report.
+        """
+        for engine in ("pulp", "milp"):
+            simulator = SCMLMarketSimulator(
+                horizon=6, q_max=8, agreements_per_step=8, engine=engine, seed=0
+            )
+            report = simulator.run(8)
+            SCMLMarketSimulator.print_report(report, title=f"engine {engine}")
+            self.assertEqual(report["steps"], 8)
+            self.assertEqual(simulator.current_step, 8)
+            self.assertGreater(report["steps_per_second"], 0.0)
+            self.assertGreater(report["peak_memory"], 0)
+            self.assertGreater(report["signed"], 0)
+            for phase in SCMLMarketSimulator.PHASES:
+                latencies = report["latencies"][phase]
+                self.assertLessEqual(latencies["p50"], latencies["p90"])
+                self.assertLessEqual(latencies["p90"], latencies["p99"])
+                self.assertLessEqual(latencies["p99"], latencies["max"])
+            # Only the agreements due after the current step are left to execute.
+            self.assertTrue(all(t >= simulator.current_step for t in simulator.book))
+
+    def test_seeded_market(self):
+        """
+        With the same seed, the market and the signed agreements must be the same.
+        """
+        for engine in ("pulp", "milp"):
+            reports = [
+                SCMLMarketSimulator(
+                    horizon=5,
+                    q_max=6,
+                    engine=engine,
+                    seed=3,
+                    populations={"all": (4, 0.2)},
+                ).run(6, trace_memory=False)
+                for _ in range(0, 2)
+            ]
+            self.assertIsNone(reports[0]["peak_memory"])
+            self.assertEqual(reports[0]["signed"], reports[1]["signed"])
+            self.assertEqual(reports[0]["breached"], reports[1]["breached"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,368 @@
+import functools
+import time
+
+import numpy as np
+import scipy.sparse
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+from SCMLSolverStatistics import SCMLSolverStatistics
+
+
+class SCMLMilp:
+    """
+    Array-based versions of the business plan and contract signer ILPs. Instead of building pulp expressions term by
+    term, the constraint matrices are emitted directly as scipy.sparse CSR arrays and solved with scipy.optimize.milp
+    (HiGHS). The models are exactly the ones built with pulp in SCMLBusinessPlan and SCMLContractsSigner.
+    """
+
+    @staticmethod
+    def expand_ranges(starts: np.ndarray, stops: np.ndarray):
+        """
+        Given two arrays of the same length, returns the concatenation of the ranges [starts[i], stops[i]) together
+        with the index i of the range each element comes from.
+        :param starts: an integer array with the (inclusive) start of each range.
+        :param stops: an integer array with the (exclusive) end of each range.
+        :return: two integer arrays, the concatenated ranges and the range index of each element.
+        """
+        counts = np.maximum(stops - starts, 0)
+        owner = np.repeat(np.arange(len(starts)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        return starts[owner] + offsets, owner
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def business_plan_structure(horizon: int, q_max: int, optimistic: bool):
+        """
+        Computes the sparsity structure of the business plan ILP for the given dimensions. The result is cached, so
+        repeated calls with the same (horizon, q_max, optimistic) only need to refill the coefficients that depend on
+        the minima. Columns are ordered as inn(t, k) followed by out(t, k), with (t, k) in row-major order.
+        Rows are ordered as: one quantity per step for outputs, one quantity per step for inputs, inventory for
+        steps 0, ..., horizon - 1, commitments on outputs, commitments on inputs. The inventory row of step 0 only
+        matters when planning starts with some inventory, see solve_business_plan.
+        :param horizon: an integer denoting the length of the plan.
+        :param q_max: and integer denoting the range over which quantities will be optimized, 0, ..., q_max.
+        :param optimistic: a boolean. If True, the inventory rows have constant coefficients.
+        :return: a tuple (indptr, indices, data_template, fill_positions, fill_sources, num_rows). The data of the CSR
+        matrix is obtained as data_template with data[fill_positions] = values[fill_sources], where values is the
+        concatenation of the flattened out minima, inn minima and negated inn minima.
+        """
+        n = horizon * q_max
+        steps = np.repeat(np.arange(horizon), q_max)
+        quantities = np.tile(np.arange(q_max), horizon).astype(float)
+        columns = np.arange(n)
+        inventory_row_0 = 2 * horizon
+        commitment_row_0 = 3 * horizon
+
+        # Each entry is (rows, columns, constant values, sources). A source of -1 means the value is constant.
+        entries = [
+            (steps, n + columns, np.ones(n), np.full(n, -1)),
+            (horizon + steps, columns, np.ones(n), np.full(n, -1)),
+            (commitment_row_0 + steps, n + columns, np.zeros(n), columns),
+            (commitment_row_0 + horizon + steps, columns, np.zeros(n), n + columns),
+        ]
+        # Outputs sold at step s count in the inventory rows of steps s, s + 1, ...
+        out_rows, owner = SCMLMilp.expand_ranges(steps, np.full(n, horizon))
+        entries += [
+            (
+                inventory_row_0 + out_rows,
+                n + owner,
+                quantities[owner] if optimistic else np.zeros(len(owner)),
+                np.full(len(owner), -1) if optimistic else owner,
+            )
+        ]
+        # Inputs bought at step s count in the inventory rows of steps s + 1, s + 2, ...
+        inn_rows, owner = SCMLMilp.expand_ranges(steps + 1, np.full(n, horizon))
+        entries += [
+            (
+                inventory_row_0 + inn_rows,
+                owner,
+                -quantities[owner] if optimistic else np.zeros(len(owner)),
+                np.full(len(owner), -1) if optimistic else 2 * n + owner,
+            )
+        ]
+
+        rows, cols, constants, sources = (
+            np.concatenate([entry[i] for entry in entries]) for i in range(4)
+        )
+        order = np.lexsort((cols, rows))
+        rows, cols, constants, sources = (
+            rows[order],
+            cols[order],
+            constants[order],
+            sources[order],
+        )
+        num_rows = 5 * horizon
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=num_rows))))
+        fill_positions = np.flatnonzero(sources >= 0)
+        structure = (
+            indptr,
+            cols,
+            constants,
+            fill_positions,
+            sources[fill_positions],
+            num_rows,
+        )
+        for array in structure[:-1]:
+            array.setflags(write=False)
+        return structure
+
+    @staticmethod
+    def solve_business_plan(
+        inn: np.ndarray,
+        out: np.ndarray,
+        p_inn: np.ndarray,
+        p_out: np.ndarray,
+        C_inn: np.ndarray,
+        C_out: np.ndarray,
+        fixed_inn: np.ndarray,
+        fixed_out: np.ndarray,
+        optimistic: bool = True,
+        initial_inventory: float = None,
+        time_limit: float = None,
+        final_inventory: float = None,
+        grid: np.ndarray = None,
+        integral: bool = True,
+    ):
+        """
+        Builds and solves the business plan ILP from arrays.
+        :param inn: an array of shape (horizon, q_max) with inn[t, q] = E[min(q, Q_inn @ time t)].
+        :param out: an array of shape (horizon, q_max) with out[t, q] = E[min(q, Q_out @ time t)].
+        :param p_inn: an array with the expected price of the input product at each time.
+        :param p_out: an array with the expected price of the output product at each time.
+        :param C_inn: an array with the committed quantity of the input at each time.
+        :param C_out: an array with the committed quantity of the output at each time.
+        :param fixed_inn: an array with the quantity of the input each step is fixed to, or NaN for free steps.
+        :param fixed_out: an array with the quantity of the output each step is fixed to, or NaN for free steps.
+        :param optimistic: a boolean.
+        :param initial_inventory: the output inventory available at the first step. If None, the plan starts at time 0
+        with no inventory and, as in the pulp model, there is no inventory constraint at the first step.
+        :param time_limit: if given, the maximum number of seconds HiGHS is allowed to run.
+        :param final_inventory: if given, the output inventory left after the last step must be at least this much.
+        :param grid: if given, a boolean array of shape (2, horizon, q_max) telling which quantities are considered for
+        buying (grid[0]) and selling (grid[1]) at each time. The columns of the other quantities are dropped.
+        :param integral: if False, the LP relaxation is solved instead, and its profit is an upper bound on the
+        optimal profit. The plans are then meaningless.
+        :return: a map with the buy plan and sell plan (as arrays), the profit, the solver result, its statistics (see
+        SCMLSolverStatistics) and the timings.
+        """
+        t0 = time.time()
+        horizon, q_max = inn.shape
+        n = horizon * q_max
+        (
+            indptr,
+            indices,
+            data_template,
+            fill_positions,
+            fill_sources,
+            num_rows,
+        ) = SCMLMilp.business_plan_structure(horizon, q_max, optimistic)
+
+        # Variable bounds. Fixed steps have exactly the variable of the fixed quantity set to 1, if any.
+        lower = np.zeros((2, horizon, q_max))
+        upper = np.ones((2, horizon, q_max))
+        quantities = np.arange(q_max)
+        for side, fixed in enumerate((fixed_inn, fixed_out)):
+            is_fixed = ~np.isnan(fixed)
+            lower[side, is_fixed] = upper[side, is_fixed] = (
+                quantities[None, :] == fixed[is_fixed, None]
+            )
+        time_to_generate_variables = time.time() - t0
+
+        # The objective is profit, i.e., revenue minus cost. milp minimizes, hence the signs.
+        c = np.concatenate(
+            ((inn * p_inn[:, None]).ravel(), -(out * p_out[:, None]).ravel())
+        )
+        time_to_generate_objective = time.time() - t0
+
+        # Refill the coefficients that depend on the minima.
+        data = data_template.copy()
+        data[fill_positions] = np.concatenate((out.ravel(), inn.ravel(), -inn.ravel()))[
+            fill_sources
+        ]
+        A = scipy.sparse.csr_matrix(
+            (data, indices, indptr), shape=(num_rows, 2 * n), copy=False
+        )
+        row_lower = np.concatenate(
+            (np.full(3 * horizon, -np.inf), C_out, C_inn)
+        ).astype(float)
+        row_upper = np.concatenate(
+            (
+                np.ones(2 * horizon),
+                np.full(horizon, initial_inventory or 0.0),
+                np.full(2 * horizon, np.inf),
+            )
+        )
+        if initial_inventory is None:
+            row_upper[2 * horizon] = np.inf
+        if final_inventory is not None:
+            # The inventory left after the last step is the net of all buys and sells.
+            if optimistic:
+                bought = sold = np.tile(quantities, horizon).astype(float)
+            else:
+                bought, sold = inn.ravel(), out.ravel()
+            A = scipy.sparse.vstack(
+                (A, scipy.sparse.csr_matrix(np.concatenate((bought, -sold))[None, :])),
+                format="csr",
+            )
+            row_lower = np.append(
+                row_lower, final_inventory - (initial_inventory or 0.0)
+            )
+            row_upper = np.append(row_upper, np.inf)
+        columns = np.ones(2 * n, dtype=bool) if grid is None else grid.ravel()
+        if grid is not None:
+            A = A[:, columns]
+        time_to_generate_constraints = time.time() - t0
+
+        t0 = time.time()
+        integrality = np.full(columns.sum(), 1 if integral else 0)
+        result = milp(
+            c[columns],
+            integrality=integrality,
+            bounds=Bounds(lower.ravel()[columns], upper.ravel()[columns]),
+            constraints=LinearConstraint(A, row_lower, row_upper),
+            options={} if time_limit is None else {"time_limit": time_limit},
+        )
+        time_to_solve = time.time() - t0
+
+        t0 = time.time()
+        if result.x is None:
+            buy_plan = np.zeros(horizon, dtype=int)
+            sell_plan = np.zeros(horizon, dtype=int)
+            profit = None
+        else:
+            x = np.zeros(2 * n, dtype=int)
+            x[columns] = np.rint(result.x)
+            x = x.reshape((2, horizon, q_max))
+            buy_plan = x[0] @ quantities
+            sell_plan = x[1] @ quantities
+            profit = -result.fun
+        time_to_read_plan = time.time() - t0
+
+        return {
+            "result": result,
+            "statistics": SCMLSolverStatistics.milp_statistics(A, integrality, result),
+            "buy_plan": buy_plan,
+            "sell_plan": sell_plan,
+            "profit": profit,
+            "time_to_generate_variables": time_to_generate_variables,
+            "time_to_generate_objective": time_to_generate_objective,
+            "time_to_generate_constraints": time_to_generate_constraints,
+            "time_to_solve": time_to_solve,
+            "time_to_read_plan": time_to_read_plan,
+        }
+
+    @staticmethod
+    def signer_constraints(
+        buy_quantities: np.ndarray,
+        buy_times: np.ndarray,
+        sell_quantities: np.ndarray,
+        sell_times: np.ndarray,
+    ):
+        """
+        Builds the inventory constraints of the contract signer as a CSR matrix. There is one row per distinct sell
+        time tau: sum of sell quantities at times <= tau minus sum of buy quantities at times < tau must be <= 0.
+        Columns are ordered as buy agreements followed by sell agreements.
+        :param buy_quantities: an array with the quantity of each buy agreement.
+        :param buy_times: an array with the delivery time of each buy agreement.
+        :param sell_quantities: an array with the quantity of each sell agreement.
+        :param sell_times: an array with the delivery time of each sell agreement.
+        :return: the constraint matrix, of shape (number of distinct sell times, number of agreements).
+        """
+        num_buy = len(buy_quantities)
+        sell_time_rows = np.unique(sell_times)
+        num_rows = len(sell_time_rows)
+        buy_rows, buy_owner = SCMLMilp.expand_ranges(
+            np.searchsorted(sell_time_rows, buy_times, side="right"),
+            np.full(num_buy, num_rows),
+        )
+        sell_rows, sell_owner = SCMLMilp.expand_ranges(
+            np.searchsorted(sell_time_rows, sell_times, side="left"),
+            np.full(len(sell_quantities), num_rows),
+        )
+        return scipy.sparse.csr_matrix(
+            (
+                np.concatenate(
+                    (-buy_quantities[buy_owner], sell_quantities[sell_owner])
+                ).astype(float),
+                (
+                    np.concatenate((buy_rows, sell_rows)),
+                    np.concatenate((buy_owner, num_buy + sell_owner)),
+                ),
+            ),
+            shape=(num_rows, num_buy + len(sell_quantities)),
+        )
+
+    @staticmethod
+    def solve_signer(
+        buy_quantities: np.ndarray,
+        buy_times: np.ndarray,
+        buy_values: np.ndarray,
+        sell_quantities: np.ndarray,
+        sell_times: np.ndarray,
+        sell_values: np.ndarray,
+        time_limit: float = None,
+        buy_counts: np.ndarray = None,
+        sell_counts: np.ndarray = None,
+        integral: bool = True,
+    ):
+        """
+        Builds and solves the contract signer ILP from arrays. Each row may stand for a group of identical agreements,
+        in which case its variable is the number of agreements of the group to sign.
+        :param buy_quantities: an array with the quantity of each buy agreement.
+        :param buy_times: an array with the delivery time of each buy agreement.
+        :param buy_values: an array with the expected cost of each buy agreement, i.e., quantity * price * trust.
+        :param sell_quantities: an array with the quantity of each sell agreement.
+        :param sell_times: an array with the delivery time of each sell agreement.
+        :param sell_values: an array with the expected revenue of each sell agreement, i.e., quantity * price * trust.
+        :param time_limit: if given, the maximum number of seconds HiGHS is allowed to run.
+        :param buy_counts: if given, an array with the number of agreements of each buy row. Defaults to ones.
+        :param sell_counts: if given, an array with the number of agreements of each sell row. Defaults to ones.
+        :param integral: if False, the LP relaxation is solved instead, and its profit is an upper bound on the
+        optimal profit. The counts are then the rounded LP solution, which may be infeasible.
+        :return: a map with integer arrays 'buy_count' and 'sell_count' with the number of agreements of each row to
+        sign, boolean arrays 'buy_signed' and 'sell_signed', the profit, the solver result, its statistics (see
+        SCMLSolverStatistics) and the timings.
+        """
+        t0 = time.time()
+        num_buy = len(buy_quantities)
+        A = SCMLMilp.signer_constraints(
+            buy_quantities, buy_times, sell_quantities, sell_times
+        )
+        c = np.concatenate((buy_values, -sell_values)).astype(float)
+        upper = np.concatenate(
+            (
+                np.ones(num_buy) if buy_counts is None else buy_counts,
+                np.ones(len(sell_values)) if sell_counts is None else sell_counts,
+            )
+        )
+        time_to_generate_ilp = time.time() - t0
+
+        t0 = time.time()
+        integrality = np.full(len(c), 1 if integral else 0)
+        result = milp(
+            c,
+            integrality=integrality,
+            bounds=Bounds(0, upper),
+            constraints=LinearConstraint(A, -np.inf, 0),
+            options={} if time_limit is None else {"time_limit": time_limit},
+        )
+        time_to_solve_ilp = time.time() - t0
+
+        count = (
+            np.zeros(len(c), dtype=int)
+            if result.x is None
+            else np.rint(result.x).astype(int)
+        )
+        return {
+            "result": result,
+            "statistics": SCMLSolverStatistics.milp_statistics(A, integrality, result),
+            "buy_count": count[:num_buy],
+            "sell_count": count[num_buy:],
+            "buy_signed": count[:num_buy] > 0,
+            "sell_signed": count[num_buy:] > 0,
+            "profit": None if result.x is None else -result.fun,
+            "time_to_generate_ilp": time_to_generate_ilp,
+            "time_to_solve_ilp": time_to_solve_ilp,
+        }
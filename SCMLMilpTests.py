@@ -0,0 +1,118 @@
+import itertools as it
+import random
+import unittest
+
+import numpy as np
+
+from SCMLBusinessPlan import SCMLBusinessPlan
+import SCMLBusinessPlanTests
+from SCMLContractsSigner import SCMLContractsSigner
+import SCMLContractsSignerTests
+from SCMLMilp import SCMLMilp
+
+
+class SCMLMilpTests(unittest.TestCase):
+    HOW_MANY_RUNS = 5
+    RELATIVE_GAP = 1e-3
+
+    def test_minima_arrays(self):
+        """
+        The vectorized minima must agree with the dynamic program of compute_min_expectation.
+        """
+        synthetic_input = (
+            SCMLBusinessPlanTests.SCMLBusinessTests.synthetic_input_creation(10, 30)
+        )
+        arguments = {
+            k: synthetic_input[k] for k in ("horizon", "q_max", "Q_inn", "Q_out")
+        }
+        inn, out = SCMLBusinessPlan.get_minima(**arguments)
+        inn_array, out_array = SCMLBusinessPlan.get_minima_arrays(**arguments)
+        for t, q in it.product(range(0, 10), range(0, 30)):
+            self.assertAlmostEqual(inn[t][q], inn_array[t, q])
+            self.assertAlmostEqual(out[t][q], out_array[t, q])
+
+    def test_structure_is_cached(self):
+        """
+        Repeated calls with the same dimensions must reuse the same sparsity structure.
+        """
+        structure = SCMLMilp.business_plan_structure(7, 11, True)
+        self.assertIs(structure, SCMLMilp.business_plan_structure(7, 11, True))
+        self.assertIsNot(structure, SCMLMilp.business_plan_structure(7, 11, False))
+        self.assertFalse(structure[0].flags.writeable)
+
+    def test_business_plan_same_profit_as_pulp(self):
+        """
+        The milp engine must find plans with the same optimal profit as the pulp engine.
+        """
+        for _ in range(0, SCMLMilpTests.HOW_MANY_RUNS):
+            for horizon, q_max, optimistic, step in it.product(
+                [5, 10], [5, 15], [True, False], [0, 2]
+            ):
+                synthetic_input = (
+                    SCMLBusinessPlanTests.SCMLBusinessTests.synthetic_input_creation(
+                        horizon=horizon, q_max=q_max
+                    )
+                )
+                pulp_output = SCMLBusinessPlan.compute_business_plan(
+                    **synthetic_input, optimistic=optimistic, step=step
+                )
+                milp_output = SCMLBusinessPlan.compute_business_plan(
+                    **synthetic_input, optimistic=optimistic, step=step, engine="milp"
+                )
+                self.assertEqual(milp_output["engine"], "milp")
+                # Both CBC and HiGHS stop within a small relative gap of the optimum.
+                self.assertLessEqual(
+                    abs(pulp_output["profit"] - milp_output["profit"]),
+                    SCMLMilpTests.RELATIVE_GAP * max(1.0, abs(pulp_output["profit"])),
+                )
+                if optimistic:
+                    # We can never sell more than what we bought.
+                    self.assertGreaterEqual(
+                        sum(milp_output["buy_plan"].values()),
+                        sum(milp_output["sell_plan"].values()),
+                    )
+
+    def test_signer_same_profit_as_pulp(self):
+        """
+        The milp engine must sign agreements with the same optimal profit as the pulp engine.
+        """
+        partners = {f"partner_{i}": random.random() for i in range(1, 10)}
+        for _ in range(0, SCMLMilpTests.HOW_MANY_RUNS):
+            list_of_agreements = [
+                SCMLContractsSignerTests.SCMLSignerTests.generate_random_contract(
+                    partners=partners
+                )
+                for _ in range(0, random.randint(1, 50))
+            ]
+            pulp_output = SCMLContractsSigner.sign(
+                SCMLContractsSignerTests.SCMLSignerTests.AGENT_ID,
+                list_of_agreements,
+                partners,
+            )
+            milp_output = SCMLContractsSigner.sign(
+                SCMLContractsSignerTests.SCMLSignerTests.AGENT_ID,
+                list_of_agreements,
+                partners,
+                engine="milp",
+            )
+            self.assertTrue(
+                SCMLContractsSigner.is_sign_plan_consistent(
+                    milp_output, list_of_agreements
+                )
+            )
+            if pulp_output["profit"] is None:
+                self.assertIsNone(milp_output["profit"])
+            else:
+                self.assertLessEqual(
+                    abs(pulp_output["profit"] - milp_output["profit"]),
+                    SCMLMilpTests.RELATIVE_GAP * max(1.0, abs(pulp_output["profit"])),
+                )
+
+    def test_expand_ranges(self):
+        values, owner = SCMLMilp.expand_ranges(np.array([0, 3, 5]), np.array([2, 3, 7]))
+        self.assertEqual(values.tolist(), [0, 1, 5, 6])
+        self.assertEqual(owner.tolist(), [0, 0, 2, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
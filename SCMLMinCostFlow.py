@@ -0,0 +1,199 @@
+import heapq
+import time
+
+import numpy as np
+
+from SCMLSolverStatistics import SCMLSolverStatistics
+
+
+class SCMLMinCostFlow:
+    """
+    The contract signer as a min-cost flow, for agreements that can be partially fulfilled. Units flow from a source to
+    the buy agreements (at their cost per unit), from a buy agreement delivered at time t to the inventory node of time
+    t + 1, along the chain of inventory nodes t -> t + 1 (at no cost), and from the inventory node of time t to the
+    sell agreements delivered at t (at minus their revenue per unit), and on to a sink. The capacity of an agreement is
+    its quantity. The inventory constraints of the signer are the flow conservation at the inventory nodes, so the
+    optimal flow is the LP relaxation of the signer ILP, with each agreement signed up to a fraction.
+    The network is a chain, so the flow is found by successive shortest paths in time order with a heap: each sell
+    agreement takes the cheapest units available before it, either from a buy agreement or from an earlier, less
+    profitable sell agreement, which gives them up. This takes O(n log n) for n agreements, instead of a general LP.
+    """
+
+    @staticmethod
+    def solve_signer(
+        buy_quantities: np.ndarray,
+        buy_times: np.ndarray,
+        buy_values: np.ndarray,
+        sell_quantities: np.ndarray,
+        sell_times: np.ndarray,
+        sell_values: np.ndarray,
+        buy_counts: np.ndarray = None,
+        sell_counts: np.ndarray = None,
+    ):
+        """
+        Solves the min-cost flow of the signer, with the same arrays as SCMLMilp.solve_signer.
+        :param buy_quantities: an array with the quantity of each buy agreement.
+        :param buy_times: an array with the delivery time of each buy agreement.
+        :param buy_values: an array with the expected cost of each buy agreement, i.e., quantity * price * trust.
+        :param sell_quantities: an array with the quantity of each sell agreement.
+        :param sell_times: an array with the delivery time of each sell agreement.
+        :param sell_values: an array with the expected revenue of each sell agreement, i.e., quantity * price * trust.
+        :param buy_counts: if given, an array with the number of agreements of each buy row. Defaults to ones.
+        :param sell_counts: if given, an array with the number of agreements of each sell row. Defaults to ones.
+        :return: a map with float arrays 'buy_count' and 'sell_count' with the (fractional) number of agreements of each
+        row to sign, the optimal 'profit' of the flow, which bounds the profit of the ILP, the number of 'augmentations'
+        and the 'time_to_solve'.
+        """
+        t0 = time.time()
+        buy_counts = np.ones(len(buy_quantities)) if buy_counts is None else buy_counts
+        sell_counts = (
+            np.ones(len(sell_quantities)) if sell_counts is None else sell_counts
+        )
+        buy_units = buy_values / buy_quantities
+        sell_units = sell_values / sell_quantities
+        buy_capacities = (buy_quantities * buy_counts).tolist()
+        sell_capacities = (sell_quantities * sell_counts).tolist()
+        buy_flow = np.zeros(len(buy_quantities))
+        sell_flow = np.zeros(len(sell_quantities))
+
+        # At the same time, the sell agreements come first, since a buy agreement only serves later sells, the most
+        # profitable first, so they never take units from each other.
+        buy_order = np.argsort(buy_times, kind="stable").tolist()
+        sell_order = np.lexsort((-sell_units, sell_times)).tolist()
+        buy_times, sell_times = buy_times.tolist(), sell_times.tolist()
+        buy_units, sell_units = buy_units.tolist(), sell_units.tolist()
+
+        # The units available to the next sell agreements, as entries (cost per unit, sequence, is_sell, index, units).
+        # An entry of a sell agreement holds the units it took, which a later sell can take over at its revenue.
+        heap = []
+        augmentations = 0
+        profit = 0.0
+        b = 0
+        for j in sell_order:
+            while b < len(buy_order) and buy_times[buy_order[b]] < sell_times[j]:
+                i = buy_order[b]
+                heapq.heappush(heap, (buy_units[i], b, False, i, buy_capacities[i]))
+                b += 1
+            remaining = sell_capacities[j]
+            while remaining > 0 and len(heap) > 0 and heap[0][0] < sell_units[j]:
+                cost, sequence, is_sell, i, units = heapq.heappop(heap)
+                taken = min(units, remaining)
+                if units > taken:
+                    heapq.heappush(heap, (cost, sequence, is_sell, i, units - taken))
+                if is_sell:
+                    sell_flow[i] -= taken
+                else:
+                    buy_flow[i] += taken
+                sell_flow[j] += taken
+                remaining -= taken
+                profit += (sell_units[j] - cost) * taken
+                augmentations += 1
+            if remaining < sell_capacities[j]:
+                heapq.heappush(
+                    heap,
+                    (
+                        sell_units[j],
+                        len(buy_order) + j,
+                        True,
+                        j,
+                        sell_capacities[j] - remaining,
+                    ),
+                )
+
+        return {
+            "buy_count": buy_flow / buy_quantities,
+            "sell_count": sell_flow / sell_quantities,
+            "profit": profit,
+            "augmentations": augmentations,
+            "time_to_solve": time.time() - t0,
+        }
+
+    @staticmethod
+    def round_signer(
+        buy_quantities: np.ndarray,
+        buy_times: np.ndarray,
+        buy_values: np.ndarray,
+        sell_quantities: np.ndarray,
+        sell_times: np.ndarray,
+        sell_values: np.ndarray,
+        buy_count: np.ndarray,
+        sell_count: np.ndarray,
+    ):
+        """
+        Rounds a fractional solution, e.g., of solve_signer, to whole agreements. The sell agreements are rounded down
+        and the buy agreements up, which keeps the inventory constraints satisfied. Then, the buy agreements that are
+        not needed are dropped, the most expensive per unit first. If the rounded solution loses money, nothing is
+        signed.
+        :param buy_quantities: see solve_signer.
+        :param buy_times: see solve_signer.
+        :param buy_values: see solve_signer.
+        :param sell_quantities: see solve_signer.
+        :param sell_times: see solve_signer.
+        :param sell_values: see solve_signer.
+        :param buy_count: the fractional number of agreements of each buy row to sign.
+        :param sell_count: the fractional number of agreements of each sell row to sign.
+        :return: two integer arrays with the number of agreements of each buy and sell row to sign, and their profit.
+        """
+        sell_count = np.floor(sell_count + 1e-9).astype(int)
+        buy_count = np.ceil(buy_count - 1e-9).astype(int)
+
+        # The slack of the inventory constraint of each sell time: the units bought before it minus the units sold up
+        # to it.
+        times = np.unique(sell_times)
+        bought = np.bincount(
+            np.searchsorted(times, buy_times, side="right"),
+            weights=buy_count * buy_quantities,
+            minlength=len(times) + 1,
+        )
+        sold = np.bincount(
+            np.searchsorted(times, sell_times),
+            weights=sell_count * sell_quantities,
+            minlength=len(times),
+        )
+        slack = np.cumsum(bought)[: len(times)] - np.cumsum(sold)
+        for i in np.argsort(-buy_values / buy_quantities, kind="stable"):
+            if buy_count[i] == 0:
+                continue
+            first = np.searchsorted(times, buy_times[i], side="right")
+            spare = (
+                np.floor(slack[first:].min() / buy_quantities[i] + 1e-9)
+                if first < len(times)
+                else buy_count[i]
+            )
+            dropped = int(min(buy_count[i], spare))
+            buy_count[i] -= dropped
+            slack[first:] -= dropped * buy_quantities[i]
+
+        profit = float(sell_values @ sell_count - buy_values @ buy_count)
+        if profit < 0.0:
+            return np.zeros_like(buy_count), np.zeros_like(sell_count), 0.0
+        return buy_count, sell_count, profit
+
+    @staticmethod
+    def statistics(num_buy: int, num_sell: int, num_times: int, solution: dict):
+        """
+        :param num_buy: the number of buy rows.
+        :param num_sell: the number of sell rows.
+        :param num_times: the number of inventory nodes, i.e., of distinct delivery times.
+        :param solution: the output of solve_signer, with the entry 'rounded_profit' set to the profit of the rounded
+        solution.
+        :return: the statistics of the flow, with the keys of SCMLSolverStatistics.STATISTICS. The rows are the nodes
+        of the network and the columns its arcs.
+        """
+        arcs = 2 * (num_buy + num_sell) + max(num_times - 1, 0)
+        return dict(
+            SCMLSolverStatistics.empty(),
+            solver="flow",
+            status="Optimal",
+            message="Rounded min-cost flow",
+            rows=num_buy + num_sell + num_times + 2,
+            columns=arcs,
+            nonzeros=2 * arcs,
+            integer_columns=0,
+            iterations=solution["augmentations"],
+            objective=solution["rounded_profit"],
+            bound=solution["profit"],
+            gap=SCMLSolverStatistics.relative_gap(
+                solution["rounded_profit"], solution["profit"]
+            ),
+        )
@@ -0,0 +1,112 @@
+import random
+import unittest
+
+import numpy as np
+
+import SCMLContractsSignerTests
+from SCMLContractsSigner import SCMLContractsSigner
+from SCMLMilp import SCMLMilp
+from SCMLMinCostFlow import SCMLMinCostFlow
+
+
+class SCMLMinCostFlowTests(unittest.TestCase):
+    @staticmethod
+    def random_arrays(num_buy: int, num_sell: int, horizon: int):
+        """
+        :return: the arrays of random groups of buy and sell agreements, as the parameters of SCMLMilp.solve_signer.
+        """
+        buy_quantities = np.random.randint(1, 10, size=num_buy).astype(float)
+        sell_quantities = np.random.randint(1, 10, size=num_sell).astype(float)
+        return {
+            "buy_quantities": buy_quantities,
+            "buy_times": np.random.randint(0, horizon, size=num_buy),
+            "buy_values": buy_quantities * np.random.uniform(1.0, 10.0, size=num_buy),
+            "sell_quantities": sell_quantities,
+            "sell_times": np.random.randint(0, horizon, size=num_sell),
+            "sell_values": sell_quantities
+            * np.random.uniform(1.0, 12.0, size=num_sell),
+            "buy_counts": np.random.randint(1, 4, size=num_buy).astype(float),
+            "sell_counts": np.random.randint(1, 4, size=num_sell).astype(float),
+        }
+
+    def test_relaxation(self):
+        """
+        The flow must be a feasible solution of the LP relaxation of the signer with the same profit, and the rounded
+        solution a feasible solution of the ILP.
+        """
+        np.random.seed(0)
+        for _ in range(0, 100):
+            arrays = SCMLMinCostFlowTests.random_arrays(
+                np.random.randint(0, 15), np.random.randint(1, 15), 8
+            )
+            flow = SCMLMinCostFlow.solve_signer(**arrays)
+            relaxation = SCMLMilp.solve_signer(**arrays, integral=False)
+            self.assertAlmostEqual(
+                flow["profit"],
+                relaxation["profit"],
+                delta=1e-6 * max(1.0, abs(relaxation["profit"])),
+            )
+
+            A = SCMLMilp.signer_constraints(
+                arrays["buy_quantities"],
+                arrays["buy_times"],
+                arrays["sell_quantities"],
+                arrays["sell_times"],
+            )
+            upper = np.concatenate((arrays["buy_counts"], arrays["sell_counts"]))
+            fractional = np.concatenate((flow["buy_count"], flow["sell_count"]))
+            self.assertTrue((A @ fractional <= 1e-6).all())
+            self.assertTrue((fractional >= -1e-9).all())
+            self.assertTrue((fractional <= upper + 1e-9).all())
+
+            buy_count, sell_count, profit = SCMLMinCostFlow.round_signer(
+                **{k: v for k, v in arrays.items() if not k.endswith("counts")},
+                buy_count=flow["buy_count"],
+                sell_count=flow["sell_count"],
+            )
+            rounded = np.concatenate((buy_count, sell_count))
+            self.assertTrue((A @ rounded <= 1e-9).all())
+            self.assertTrue((rounded <= upper).all())
+            self.assertGreaterEqual(profit, 0.0)
+            self.assertLessEqual(profit, flow["profit"] + 1e-6)
+
+    def test_sign_flow(self):
+        """
+        The flow engine must sign a consistent plan, bounded by the optimal profit, and report the fractions.
+        """
+        random.seed(0)
+        signer_tests = SCMLContractsSignerTests.SCMLSignerTests
+        for how_many in (5, 20, 50, 2000):
+            agreements = [
+                signer_tests.generate_random_contract() for _ in range(0, how_many)
+            ]
+            output = SCMLContractsSigner.sign(
+                signer_tests.AGENT_ID,
+                agreements,
+                signer_tests.DEFAULT_TRUST_PROB,
+                engine="flow",
+                debug=True,
+            )
+            self.assertEqual(output["engine"], "flow")
+            self.assertTrue(SCMLContractsSigner.is_sign_plan_consistent(output))
+            self.assertEqual(len(output["fractional_signatures"]), how_many)
+            self.assertTrue(
+                all(0.0 <= f <= 1.0 for f in output["fractional_signatures"])
+            )
+            if output["statistics"] is None:
+                # No sell agreements: there is no flow to solve.
+                continue
+            self.assertEqual(output["statistics"]["solver"], "flow")
+            if how_many <= 50:
+                optimal = SCMLContractsSigner.sign(
+                    signer_tests.AGENT_ID,
+                    agreements,
+                    signer_tests.DEFAULT_TRUST_PROB,
+                    engine="milp",
+                )
+                self.assertLessEqual(output["profit"], optimal["profit"] + 1e-6)
+                self.assertGreaterEqual(output["upper_bound"], optimal["profit"] - 1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import numpy as np
+from typing import Dict
+
+
+class SCMLMinExpectation:
+    """
+    Compact representation of the function q -> E[min(q, X)] for a discrete random variable X.
+    The function is piecewise linear with breakpoints at the support points of X: between two consecutive support
+    points x_j < x_{j + 1}, its slope is P(X > x_j). Hence, it is fully described by the k support points, and it is
+    computed in O(k log k) regardless of how large the quantities are.
+    Indexing, i.e., minima[q], evaluates the function at q, so an object of this class can be used wherever a
+    dictionary {q : E[min(q, X)]} as returned by SCMLBusinessPlan.compute_min_expectation is expected.
+    """
+
+    __slots__ = ("knots", "values", "slopes")
+
+    def __init__(self, dict_data: Dict[int, float]):
+        """
+        :param dict_data: {x: P(X = x)}. Only the values where X has positive probability need to be given. If the
+        probabilities sum to less than one, the missing mass is assumed to be beyond any quantity of interest, as in
+        SCMLBusinessPlan.compute_min_expectation.
+        """
+        support = sorted((x, p) for x, p in dict_data.items() if p != 0.0)
+        points = np.array([x for x, _ in support], dtype=float)
+        cdf = np.cumsum([p for _, p in support])
+        # The first knot is always 0. Mass at 0 only changes the slope of the first piece.
+        at_zero = np.searchsorted(points, 0.0, side="right")
+        self.knots = np.concatenate(([0.0], points[at_zero:]))
+        self.slopes = 1.0 - np.concatenate(
+            ([cdf[at_zero - 1] if at_zero > 0 else 0.0], cdf[at_zero:])
+        )
+        self.values = np.concatenate(
+            ([0.0], np.cumsum(self.slopes[:-1] * np.diff(self.knots)))
+        )
+
+    def __call__(self, q):
+        """
+        Evaluates E[min(q, X)].
+        :param q: a non-negative number or an array of non-negative numbers.
+        :return: a number or an array of the same shape as q.
+        """
+        j = np.searchsorted(self.knots, q, side="right") - 1
+        return self.values[j] + self.slopes[j] * (q - self.knots[j])
+
+    def __getitem__(self, q):
+        return float(self(q))
+
+    def __repr__(self):
+        return f"SCMLMinExpectation(knots={self.knots}, values={self.values}, slopes={self.slopes})"
@@ -0,0 +1,80 @@
+import itertools as it
+import random
+import unittest
+
+import numpy as np
+
+import SCMLBusinessPlanTests
+from SCMLBusinessPlan import SCMLBusinessPlan
+from SCMLMinExpectation import SCMLMinExpectation
+
+
+class SCMLMinExpectationTests(unittest.TestCase):
+    HOW_MANY_RUNS = 50
+
+    @staticmethod
+    def random_sparse_distribution(size: int, support_size: int):
+        support = random.sample(range(0, size), support_size)
+        weights = np.random.random(support_size)
+        # Sometimes leave some mass beyond the support, as allowed by compute_min_expectation.
+        weights = weights / (weights.sum() * random.choice([1.0, 1.25]))
+        return dict(zip(support, weights.tolist()))
+
+    def test_matches_dynamic_program(self):
+        """
+        The breakpoint representation must agree with compute_min_expectation at every integer quantity.
+        """
+        for _ in range(0, SCMLMinExpectationTests.HOW_MANY_RUNS):
+            size = random.randint(1, 200)
+            dict_data = SCMLMinExpectationTests.random_sparse_distribution(
+                size, random.randint(0, min(size, 10))
+            )
+            dense = SCMLBusinessPlan.compute_min_expectation(dict_data, size)
+            sparse = SCMLMinExpectation(dict_data)
+            self.assertLessEqual(len(sparse.knots), len(dict_data) + 1)
+            for q in range(0, size):
+                self.assertAlmostEqual(dense[q], sparse[q])
+            np.testing.assert_allclose(
+                sparse(np.arange(size)), [dense[q] for q in range(0, size)], atol=1e-9
+            )
+
+    def test_piecewise_linear(self):
+        """
+        A manual example: X is 2 or 6 with equal probability.
+        """
+        sparse = SCMLMinExpectation({2: 0.5, 6: 0.5})
+        self.assertEqual(sparse.knots.tolist(), [0.0, 2.0, 6.0])
+        self.assertAlmostEqual(sparse[1], 1.0)
+        self.assertAlmostEqual(sparse[4], 2.0 + 0.5 * 2.0)
+        self.assertAlmostEqual(sparse[1000], 4.0)
+        # With no support, the mass is beyond any quantity and E[min(q, X)] = q.
+        self.assertAlmostEqual(SCMLMinExpectation({})[10**9], 10**9)
+
+    def test_business_plan_with_sparse_minima(self):
+        """
+        Both engines must find plans with the same profit whether the minima are sparse or dense.
+        """
+        for engine, optimistic in it.product(["pulp", "milp"], [True, False]):
+            synthetic_input = (
+                SCMLBusinessPlanTests.SCMLBusinessTests.synthetic_input_creation(8, 12)
+            )
+            dense_output, sparse_output = (
+                SCMLBusinessPlan.compute_business_plan(
+                    **synthetic_input,
+                    optimistic=optimistic,
+                    engine=engine,
+                    sparse_minima=sparse_minima,
+                    debug=True,
+                )
+                for sparse_minima in (False, True)
+            )
+            self.assertIsInstance(sparse_output["inn"][0], SCMLMinExpectation)
+            # Both CBC and HiGHS stop within a small relative gap of the optimum.
+            self.assertLessEqual(
+                abs(dense_output["profit"] - sparse_output["profit"]),
+                1e-3 * max(1.0, abs(dense_output["profit"])),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
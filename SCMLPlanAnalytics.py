@@ -0,0 +1,262 @@
+import numpy as np
+from negmas import Contract
+from typing import Dict, List
+
+
+class SCMLPlanAnalytics:
+    """
+    Vectorized analytics of many signer outputs or business plans at once, e.g., over a whole regression or replay set.
+    The agreements of all the outputs are flattened into arrays with one entry per agreement, and the plans, inventory
+    trajectories, feasibility flags, expected revenue, cost and cash flow of all the outputs are computed with
+    np.bincount scatter-adds and cumulative sums over arrays of shape (number of outputs, horizon).
+    The inventory follows the convention of SCMLContractsSigner.is_sign_plan_consistent and of the business plan:
+    inputs bought at time t are turned into outputs that can be sold from time t + 1 on.
+    """
+
+    @staticmethod
+    def signer_arrays(
+        signer_outputs: list,
+        agreements: List[List[Contract]] = None,
+        trust_probabilities: List[Dict[str, float]] = None,
+    ):
+        """
+        Flattens the agreements of several signer outputs into arrays. This is the only step that loops over the
+        agreements in Python, once each.
+        :param signer_outputs: a list of outputs of SCMLContractsSigner.sign.
+        :param agreements: the list of agreements given to the signer for each output. Only needed if the outputs do not
+        carry them, i.e., if they were computed without debug=True.
+        :param trust_probabilities: the trust probabilities given to the signer for each output, as in agreements. If
+        neither given nor carried by the outputs, the trust is 1 and the values are nominal instead of expected.
+        :return: a map with arrays of one entry per agreement: the index of its 'output', its 'time', 'quantity',
+        'price' and 'trust', and whether it 'is_buy' and was 'signed'.
+        """
+        rows = []
+        for k, signer_output in enumerate(signer_outputs):
+            output_agreements = (
+                signer_output["agreements"] if agreements is None else agreements[k]
+            )
+            trust = (
+                signer_output.get("trust_probabilities")
+                if trust_probabilities is None
+                else trust_probabilities[k]
+            )
+            agent_id = signer_output["agent_id"]
+            rows += [
+                (
+                    k,
+                    a.agreement["time"],
+                    a.agreement["quantity"],
+                    a.agreement["unit_price"],
+                    1.0
+                    if trust is None
+                    else trust[
+                        a.partners[0] if a.partners[0] != agent_id else a.partners[1]
+                    ],
+                    a.annotation["is_buy"],
+                    signature is not None,
+                )
+                for a, signature in zip(
+                    output_agreements, signer_output["list_of_signatures"]
+                )
+            ]
+        columns = list(zip(*rows)) if len(rows) > 0 else [()] * 7
+        return {
+            key: np.array(column, dtype=dtype)
+            for key, column, dtype in zip(
+                ("output", "time", "quantity", "price", "trust", "is_buy", "signed"),
+                columns,
+                (int, int, float, float, float, bool, bool),
+            )
+        }
+
+    @staticmethod
+    def scatter(output: np.ndarray, time: np.ndarray, weights: np.ndarray, shape):
+        """
+        Sums weights into an array of the given shape, at the positions (output, time).
+        :param output: an integer array with the first index of each weight.
+        :param time: an integer array with the second index of each weight.
+        :param weights: an array with the weights.
+        :param shape: the shape (number of outputs, horizon) of the result.
+        :return: an array of the given shape.
+        """
+        # A time beyond the horizon would silently land in the row of the next output.
+        assert len(time) == 0 or (time.min() >= 0 and time.max() < shape[1])
+        return np.bincount(
+            output * shape[1] + time, weights=weights, minlength=shape[0] * shape[1]
+        ).reshape(shape)
+
+    @staticmethod
+    def inventory(buy_plans: np.ndarray, sell_plans: np.ndarray, initial_inventory=0):
+        """
+        :param buy_plans: an array of shape (number of plans, horizon) with the quantity of inputs bought at each time.
+        :param sell_plans: an array of the same shape with the quantity of outputs sold at each time.
+        :param initial_inventory: the output inventory available at the first step, a number or an array with one per
+        plan.
+        :return: an array of the same shape with the output inventory left after the sells of each time, i.e.,
+        initial_inventory + sum of buys before t - sum of sells up to t.
+        """
+        initial_inventory = np.reshape(
+            np.asarray(initial_inventory, dtype=float), (-1, 1)
+        )
+        return (
+            initial_inventory
+            + np.cumsum(buy_plans, axis=1)
+            - buy_plans
+            - np.cumsum(sell_plans, axis=1)
+        )
+
+    @staticmethod
+    def analyze(
+        output: np.ndarray,
+        time: np.ndarray,
+        quantity: np.ndarray,
+        price: np.ndarray,
+        trust: np.ndarray,
+        is_buy: np.ndarray,
+        signed: np.ndarray,
+        num_outputs: int = None,
+        horizon: int = None,
+    ):
+        """
+        Computes the analytics of signed agreements given as arrays, e.g., as returned by signer_arrays.
+        :param output: an integer array with the index of the output each agreement belongs to.
+        :param time: an integer array with the delivery time of each agreement.
+        :param quantity: an array with the quantity of each agreement.
+        :param price: an array with the unit price of each agreement.
+        :param trust: an array with the probability that the partner of each agreement honors it.
+        :param is_buy: a boolean array, True for buy agreements and False for sell agreements.
+        :param signed: a boolean array, True for the signed agreements. The others are ignored.
+        :param num_outputs: the number of outputs. Defaults to the largest index in output plus one.
+        :param horizon: the length of the plans. Defaults to the latest delivery time plus one.
+        :return: a map with arrays of shape (number of outputs, horizon): 'buy_plan', 'sell_plan', 'inventory' (see
+        inventory), the expected 'revenue' and 'cost' at each time (quantity * price * trust), the 'cash_flow' (revenue
+        minus cost) and the 'cumulative_cash_flow'; and arrays of shape (number of outputs,): 'feasible', True if the
+        inventory never goes negative, and the expected 'profit'.
+        """
+        if num_outputs is None:
+            num_outputs = int(output.max()) + 1 if len(output) > 0 else 0
+        if horizon is None:
+            horizon = int(time.max()) + 1 if len(time) > 0 else 0
+        shape = (num_outputs, horizon)
+        output, time = output[signed], time[signed]
+        quantity, is_buy = quantity[signed], is_buy[signed]
+        value = quantity * price[signed] * trust[signed]
+
+        return SCMLPlanAnalytics.summarize(
+            buy_plan=SCMLPlanAnalytics.scatter(output, time, quantity * is_buy, shape),
+            sell_plan=SCMLPlanAnalytics.scatter(
+                output, time, quantity * ~is_buy, shape
+            ),
+            revenue=SCMLPlanAnalytics.scatter(output, time, value * ~is_buy, shape),
+            cost=SCMLPlanAnalytics.scatter(output, time, value * is_buy, shape),
+        )
+
+    @staticmethod
+    def summarize(
+        buy_plan: np.ndarray,
+        sell_plan: np.ndarray,
+        revenue: np.ndarray,
+        cost: np.ndarray,
+    ):
+        """
+        :param buy_plan: an array of shape (number of plans, horizon) with the quantity bought at each time.
+        :param sell_plan: an array of the same shape with the quantity sold at each time.
+        :param revenue: an array of the same shape with the revenue at each time.
+        :param cost: an array of the same shape with the cost at each time.
+        :return: the map returned by analyze.
+        """
+        inventory = SCMLPlanAnalytics.inventory(buy_plan, sell_plan)
+        cash_flow = revenue - cost
+        return {
+            "buy_plan": buy_plan,
+            "sell_plan": sell_plan,
+            "inventory": inventory,
+            "feasible": (inventory >= 0).all(axis=1),
+            "revenue": revenue,
+            "cost": cost,
+            "cash_flow": cash_flow,
+            "cumulative_cash_flow": np.cumsum(cash_flow, axis=1),
+            "profit": cash_flow.sum(axis=1),
+        }
+
+    @staticmethod
+    def analyze_signer_outputs(
+        signer_outputs: list,
+        agreements: List[List[Contract]] = None,
+        trust_probabilities: List[Dict[str, float]] = None,
+        horizon: int = None,
+    ):
+        """
+        Computes the analytics of several signer outputs at once. The plans and the feasibility flag of each output are
+        the ones of SCMLContractsSigner.get_plan_as_lists and is_sign_plan_consistent, and its expected profit is the
+        profit of the signer.
+        :param signer_outputs: a list of outputs of SCMLContractsSigner.sign.
+        :param agreements: see signer_arrays.
+        :param trust_probabilities: see signer_arrays.
+        :param horizon: the length of the plans. Defaults to the latest delivery time plus one.
+        :return: the map returned by analyze, with one row per output.
+        """
+        arrays = SCMLPlanAnalytics.signer_arrays(
+            signer_outputs, agreements, trust_probabilities
+        )
+        return SCMLPlanAnalytics.analyze(
+            **arrays, num_outputs=len(signer_outputs), horizon=horizon
+        )
+
+    @staticmethod
+    def analyze_business_plans(
+        plan_outputs: list, p_inn=None, p_out=None, horizon: int = None
+    ):
+        """
+        Computes the analytics of several business plans at once.
+        :param plan_outputs: a list of outputs of SCMLBusinessPlan.compute_business_plan, or of maps with entries
+        'buy_plan' and 'sell_plan', each a map {t : quantity}.
+        :param p_inn: the price of the input at each time, as an array of shape (horizon,) or (number of plans,
+        horizon). If not given, the cost is zero.
+        :param p_out: the price of the output at each time, as p_inn. If not given, the revenue is zero.
+        :param horizon: the length of the plans. Defaults to the latest time of any plan plus one.
+        :return: the map returned by analyze, with one row per plan. The revenue and cost are nominal, i.e., the planned
+        quantities times the prices.
+        """
+        if horizon is None:
+            horizon = 1 + max(
+                (
+                    max(o[key], default=-1)
+                    for o in plan_outputs
+                    for key in ("buy_plan", "sell_plan")
+                ),
+                default=-1,
+            )
+        shape = (len(plan_outputs), horizon)
+
+        def as_array(key):
+            output = np.concatenate(
+                [np.full(len(o[key]), k, dtype=int) for k, o in enumerate(plan_outputs)]
+                + [np.zeros(0, dtype=int)]
+            )
+            time, quantity = (
+                np.concatenate(
+                    [np.fromiter(items(o[key]), dtype=dtype) for o in plan_outputs]
+                    + [np.zeros(0, dtype=dtype)]
+                )
+                for items, dtype in ((dict.keys, int), (dict.values, float))
+            )
+            return SCMLPlanAnalytics.scatter(output, time, quantity, shape)
+
+        buy_plan, sell_plan = as_array("buy_plan"), as_array("sell_plan")
+        return SCMLPlanAnalytics.summarize(
+            buy_plan=buy_plan,
+            sell_plan=sell_plan,
+            revenue=sell_plan
+            * (
+                0.0
+                if p_out is None
+                else np.broadcast_to(np.asarray(p_out, dtype=float), shape)
+            ),
+            cost=buy_plan
+            * (
+                0.0
+                if p_inn is None
+                else np.broadcast_to(np.asarray(p_inn, dtype=float), shape)
+            ),
+        )
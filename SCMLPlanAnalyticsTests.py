@@ -0,0 +1,110 @@
+import random
+import unittest
+
+import numpy as np
+
+import SCMLBusinessPlanTests
+import SCMLContractsSignerTests
+from SCMLBusinessPlan import SCMLBusinessPlan
+from SCMLContractsSigner import SCMLContractsSigner
+from SCMLPlanAnalytics import SCMLPlanAnalytics
+
+
+class SCMLPlanAnalyticsTests(unittest.TestCase):
+    def test_signer_outputs(self):
+        """
+        The batch analytics must match, output by output, the plans and feasibility of the signer's own checks, and the
+        expected profit of the signer.
+        """
+        random.seed(0)
+        signer_tests = SCMLContractsSignerTests.SCMLSignerTests
+        signer_outputs = [
+            SCMLContractsSigner.sign(
+                signer_tests.AGENT_ID,
+                [
+                    signer_tests.generate_random_contract()
+                    for _ in range(0, random.randint(0, 30))
+                ],
+                signer_tests.DEFAULT_TRUST_PROB,
+                engine="milp",
+                debug=True,
+            )
+            for _ in range(0, 20)
+        ]
+        analytics = SCMLPlanAnalytics.analyze_signer_outputs(signer_outputs)
+        self.assertEqual(analytics["buy_plan"].shape[0], len(signer_outputs))
+        for k, signer_output in enumerate(signer_outputs):
+            horizon, buy_plan, sell_plan = SCMLContractsSigner.get_plan_as_lists(
+                signer_output
+            )
+            self.assertEqual(analytics["buy_plan"][k, :horizon].tolist(), buy_plan)
+            self.assertEqual(analytics["sell_plan"][k, :horizon].tolist(), sell_plan)
+            if horizon > 0:
+                self.assertEqual(
+                    analytics["feasible"][k],
+                    SCMLContractsSigner.is_sign_plan_consistent(signer_output),
+                )
+            self.assertAlmostEqual(
+                analytics["profit"][k], signer_output["profit"] or 0.0
+            )
+        # Without trust probabilities, the values are nominal.
+        nominal = SCMLPlanAnalytics.analyze_signer_outputs(
+            signer_outputs, trust_probabilities=[{"OTHER": 1.0}] * len(signer_outputs)
+        )
+        np.testing.assert_allclose(
+            nominal["cash_flow"] * signer_tests.DEFAULT_TRUST_PROB["OTHER"],
+            analytics["cash_flow"],
+        )
+
+    def test_arrays(self):
+        """
+        Manual example with two outputs, the second one selling before it has bought.
+        """
+        analytics = SCMLPlanAnalytics.analyze(
+            output=np.array([0, 0, 0, 1, 1]),
+            time=np.array([0, 1, 2, 1, 1]),
+            quantity=np.array([3.0, 2.0, 5.0, 1.0, 1.0]),
+            price=np.array([1.0, 4.0, 9.0, 2.0, 3.0]),
+            trust=np.array([1.0, 0.5, 1.0, 1.0, 1.0]),
+            is_buy=np.array([True, False, False, False, True]),
+            signed=np.array([True, True, False, True, True]),
+        )
+        self.assertEqual(analytics["buy_plan"].tolist(), [[3, 0, 0], [0, 1, 0]])
+        self.assertEqual(analytics["sell_plan"].tolist(), [[0, 2, 0], [0, 1, 0]])
+        self.assertEqual(analytics["inventory"].tolist(), [[0, 1, 1], [0, -1, 0]])
+        self.assertEqual(analytics["feasible"].tolist(), [True, False])
+        self.assertEqual(
+            analytics["cumulative_cash_flow"].tolist(), [[-3, 1, 1], [0, -1, -1]]
+        )
+        self.assertEqual(analytics["profit"].tolist(), [1, -1])
+
+    def test_business_plans(self):
+        """
+        Optimistic business plans are feasible, and their nominal profit is the planned quantities times the prices.
+        """
+        np.random.seed(0)
+        horizon = 6
+        inputs = [
+            SCMLBusinessPlanTests.SCMLBusinessTests.synthetic_input_creation(horizon, 8)
+            for _ in range(0, 4)
+        ]
+        plans = [
+            SCMLBusinessPlan.compute_business_plan(**x, engine="milp") for x in inputs
+        ]
+        p_inn = np.array([[x["p_inn"][t] for t in range(0, horizon)] for x in inputs])
+        p_out = np.array([[x["p_out"][t] for t in range(0, horizon)] for x in inputs])
+        analytics = SCMLPlanAnalytics.analyze_business_plans(plans, p_inn, p_out)
+        self.assertTrue(analytics["feasible"].all())
+        for k, plan in enumerate(plans):
+            self.assertAlmostEqual(
+                analytics["profit"][k],
+                sum(
+                    plan["sell_plan"][t] * p_out[k, t]
+                    - plan["buy_plan"][t] * p_inn[k, t]
+                    for t in range(0, horizon)
+                ),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import numpy as np
+from typing import Dict, Union
+
+
+class SCMLPlanEvaluator:
+    """
+    Scores candidate business plans against sampled realizations of the quantities and prices, without calling a
+    solver. All candidates and all realizations are evaluated at once with NumPy, looping only over time.
+    """
+
+    @staticmethod
+    def sample(
+        distributions: Dict[int, Union[Dict[int, float], float]],
+        horizon: int,
+        n: int,
+        rng: np.random.Generator,
+    ):
+        """
+        Draws n realizations of a sequence of independent discrete random variables, one per time step.
+        :param distributions: a map {t : { x : P(X = x @ time t} } as given to the business plan solver. The value for a
+        time t can also be a number, in which case X is constant at time t. The probabilities at a time are normalized, so
+        that X always takes a value of its support. If X has no support, it is infinite, i.e., it never limits a plan, as
+        in SCMLBusinessPlan.compute_min_expectation.
+        :param horizon: the number of time steps.
+        :param n: the number of realizations.
+        :param rng: a numpy random generator.
+        :return: an array of shape (n, horizon).
+        """
+        samples = np.empty((n, horizon))
+        for t in range(0, horizon):
+            if not isinstance(distributions[t], dict):
+                samples[:, t] = distributions[t]
+                continue
+            values = np.array(list(distributions[t].keys()), dtype=float)
+            cdf = np.cumsum(list(distributions[t].values()), dtype=float)
+            if len(cdf) == 0 or cdf[-1] <= 0:
+                samples[:, t] = np.inf
+                continue
+            # Normalizing by the last value, rather than by one, keeps the rounding of the sum inside the support.
+            cdf /= cdf[-1]
+            samples[:, t] = values[np.searchsorted(cdf, rng.random(n), side="right")]
+        return samples
+
+    @staticmethod
+    def sample_scenarios(
+        horizon: int,
+        Q_inn: Dict[int, Dict[int, float]],
+        Q_out: Dict[int, Dict[int, float]],
+        p_inn: Dict[int, Union[Dict[float, float], float]],
+        p_out: Dict[int, Union[Dict[float, float], float]],
+        n: int,
+        seed: int = None,
+    ):
+        """
+        Draws n scenarios, i.e., realizations of the input and output quantities and prices.
+        :param horizon: an integer denoting the length of the plan.
+        :param Q_inn: a map {t : { q : P(Q_inn = q @ time t} }, as given to the business plan solver.
+        :param Q_out: a map {t : { q : P(Q_out = q @ time t} }, as given to the business plan solver.
+        :param p_inn: a map {t : price for buy product @ time t}, or {t : { price : P(p_inn = price @ time t) } }.
+        :param p_out: a map {t : price for sell product @ time t}, or {t : { price : P(p_out = price @ time t) } }.
+        :param n: the number of scenarios.
+        :param seed: a seed for the random generator.
+        :return: a map with arrays 'Q_inn', 'Q_out', 'p_inn' and 'p_out', each of shape (n, horizon).
+        """
+        rng = np.random.default_rng(seed)
+        return {
+            "Q_inn": SCMLPlanEvaluator.sample(Q_inn, horizon, n, rng),
+            "Q_out": SCMLPlanEvaluator.sample(Q_out, horizon, n, rng),
+            "p_inn": SCMLPlanEvaluator.sample(p_inn, horizon, n, rng),
+            "p_out": SCMLPlanEvaluator.sample(p_out, horizon, n, rng),
+        }
+
+    @staticmethod
+    def plans_as_array(plans, horizon: int):
+        """
+        Converts one or more plans into an array of shape (number of plans, horizon).
+        :param plans: a plan {t : quantity}, a list of such plans, or an array-like of shape (horizon,) or
+        (number of plans, horizon).
+        :param horizon: the length of the plans.
+        :return: an array of shape (number of plans, horizon).
+        """
+        if isinstance(plans, dict):
+            plans = [plans]
+        if len(plans) > 0 and isinstance(plans[0], dict):
+            plans = [[plan[t] for t in range(0, horizon)] for plan in plans]
+        return np.atleast_2d(np.asarray(plans, dtype=float))
+
+    @staticmethod
+    def evaluate(buy_plans, sell_plans, scenarios: Dict[str, np.ndarray]):
+        """
+        Computes the realized outcome of each candidate plan in each scenario. At each time t, the agent buys
+        min(buy_plan[t], Q_inn[t]) inputs, which become outputs at time t + 1, and sells min(sell_plan[t], Q_out[t])
+        outputs, as long as it has them in inventory. Planning starts with no inventory.
+        :param buy_plans: one or more buy plans, in any of the forms accepted by plans_as_array.
+        :param sell_plans: one or more sell plans, in the same order as the buy plans.
+        :param scenarios: a map as returned by sample_scenarios.
+        :return: a map with arrays, where P is the number of plans, N the number of scenarios and T the horizon:
+            'profit' (P, N): realized revenue minus cost,
+            'inventory' (P, N, T): output inventory at the end of each step,
+            'bought' (P, N, T) and 'sold' (P, N, T): realized quantities,
+            'shortfall' (P, N, T): outputs demanded by the plan and the market that were not in inventory,
+            'expected_profit' (P,): average profit over the scenarios,
+            'stockout_rate' (P,): fraction of (scenario, step) pairs with a positive shortfall.
+        """
+        n, horizon = scenarios["Q_inn"].shape
+        buy_plans = SCMLPlanEvaluator.plans_as_array(buy_plans, horizon)
+        sell_plans = SCMLPlanEvaluator.plans_as_array(sell_plans, horizon)
+        assert buy_plans.shape == sell_plans.shape
+
+        bought = np.minimum(buy_plans[:, None, :], scenarios["Q_inn"][None, :, :])
+        demand = np.minimum(sell_plans[:, None, :], scenarios["Q_out"][None, :, :])
+        sold = np.empty_like(demand)
+        inventory = np.empty_like(demand)
+        level = np.zeros(demand.shape[:2])
+        for t in range(0, horizon):
+            sold[:, :, t] = np.minimum(demand[:, :, t], level)
+            level = level - sold[:, :, t] + bought[:, :, t]
+            inventory[:, :, t] = level
+        shortfall = demand - sold
+
+        profit = (sold * scenarios["p_out"][None, :, :]).sum(axis=2) - (
+            bought * scenarios["p_inn"][None, :, :]
+        ).sum(axis=2)
+        return {
+            "profit": profit,
+            "inventory": inventory,
+            "bought": bought,
+            "sold": sold,
+            "shortfall": shortfall,
+            "expected_profit": profit.mean(axis=1),
+            "stockout_rate": (shortfall > 0).mean(axis=(1, 2)),
+        }
@@ -0,0 +1,100 @@
+import unittest
+
+import numpy as np
+
+import SCMLBusinessPlanTests
+from SCMLBusinessPlan import SCMLBusinessPlan
+from SCMLPlanEvaluator import SCMLPlanEvaluator
+
+
+class SCMLPlanEvaluatorTests(unittest.TestCase):
+    def test_deterministic_scenario(self):
+        """
+        A manual example where quantities and prices are constant, so the outcome can be checked by hand.
+        """
+        horizon = 4
+        scenarios = SCMLPlanEvaluator.sample_scenarios(
+            horizon=horizon,
+            Q_inn={t: {3: 1.0} for t in range(0, horizon)},
+            Q_out={t: {2: 1.0} for t in range(0, horizon)},
+            p_inn={t: 10.0 for t in range(0, horizon)},
+            p_out={t: 15.0 for t in range(0, horizon)},
+            n=5,
+        )
+        evaluation = SCMLPlanEvaluator.evaluate(
+            buy_plans={0: 5, 1: 1, 2: 0, 3: 0},
+            sell_plans={0: 0, 1: 2, 2: 2, 3: 2},
+            scenarios=scenarios,
+        )
+        # We buy 3 and 1, and can only sell 2 and 2 of the 2, 2, 2 demanded.
+        self.assertEqual(evaluation["profit"].shape, (1, 5))
+        np.testing.assert_allclose(evaluation["profit"], 4 * 15.0 - 4 * 10.0)
+        np.testing.assert_allclose(evaluation["inventory"][0, 0], [3, 2, 0, 0])
+        np.testing.assert_allclose(evaluation["shortfall"][0, 0], [0, 0, 0, 2])
+        np.testing.assert_allclose(evaluation["stockout_rate"], [0.25])
+
+    def test_sampling_matches_distributions(self):
+        """
+        The empirical frequencies of the sampled quantities must approach the given probabilities.
+        """
+        rng = np.random.default_rng(0)
+        samples = SCMLPlanEvaluator.sample(
+            {0: {0: 0.2, 1: 0.5, 4: 0.3}, 1: {2: 0.5, 3: 0.0}, 2: 7.5, 3: {}},
+            4,
+            20000,
+            rng,
+        )
+        self.assertAlmostEqual((samples[:, 0] == 1).mean(), 0.5, places=1)
+        self.assertAlmostEqual((samples[:, 0] == 4).mean(), 0.3, places=1)
+        # The probabilities at time 1 are normalized, and X has no support at time 3.
+        self.assertTrue(np.all(samples[:, 1] == 2))
+        self.assertTrue(np.all(samples[:, 2] == 7.5))
+        self.assertTrue(np.all(np.isinf(samples[:, 3])))
+
+    def test_sampling_rounding(self):
+        """
+        The probabilities sum to slightly less than one in floating point, and a draw just below one must still fall on
+        the support instead of at infinity.
+        """
+
+        class LargestDraw:
+            @staticmethod
+            def random(n):
+                return np.full(n, np.nextafter(1.0, 0.0))
+
+        distribution = {q: 0.1 for q in range(0, 10)}
+        self.assertLess(sum(distribution.values()), 1.0)
+        samples = SCMLPlanEvaluator.sample({0: distribution}, 1, 3, LargestDraw())
+        self.assertTrue(np.all(samples == 9))
+
+    def test_many_plans_at_once(self):
+        """
+        Evaluating several plans at once must give the same result as evaluating them one by one.
+        """
+        synthetic_input = (
+            SCMLBusinessPlanTests.SCMLBusinessTests.synthetic_input_creation(10, 10)
+        )
+        business_plan_output = SCMLBusinessPlan.compute_business_plan(**synthetic_input)
+        scenarios = SCMLPlanEvaluator.sample_scenarios(
+            horizon=10,
+            Q_inn=synthetic_input["Q_inn"],
+            Q_out=synthetic_input["Q_out"],
+            p_inn=synthetic_input["p_inn"],
+            p_out=synthetic_input["p_out"],
+            n=1000,
+            seed=1,
+        )
+        buy_plans = np.random.randint(0, 10, (20, 10))
+        sell_plans = np.random.randint(0, 10, (20, 10))
+        buy_plans[0] = [business_plan_output["buy_plan"][t] for t in range(0, 10)]
+        sell_plans[0] = [business_plan_output["sell_plan"][t] for t in range(0, 10)]
+        evaluation = SCMLPlanEvaluator.evaluate(buy_plans, sell_plans, scenarios)
+        self.assertEqual(evaluation["inventory"].shape, (20, 1000, 10))
+        self.assertTrue(np.all(evaluation["inventory"] >= 0))
+        for i in (0, 7, 19):
+            single = SCMLPlanEvaluator.evaluate(buy_plans[i], sell_plans[i], scenarios)
+            np.testing.assert_allclose(single["profit"][0], evaluation["profit"][i])
+
+
+if __name__ == "__main__":
+    unittest.main()
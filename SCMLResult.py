@@ -0,0 +1,115 @@
+class SCMLResult:
+    """
+    Base class of the compact results returned by the solvers. Results only hold their entries in slots, so no
+    per-object dictionary is allocated, and the heavy payloads (models, minima tables, agreements) are only attached
+    when asked for with debug=True. Keeping one result per step in a long simulation then uses a constant amount of
+    memory per step.
+    Entries can be read as in a dictionary, e.g., result["profit"], so code written against the dictionaries the
+    solvers used to return keeps working. Debug entries are None when the result was computed without debug=True.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **entries):
+        for key in self.__slots__:
+            setattr(self, key, entries.pop(key, None))
+        assert len(entries) == 0, f"Unknown entries {list(entries)}"
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def keys(self):
+        return self.__slots__
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def as_dict(self):
+        """
+        :return: a dictionary with all the entries of the result.
+        """
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.as_dict()})"
+
+
+class SCMLBusinessPlanResult(SCMLResult):
+    """
+    The result of SCMLBusinessPlan.compute_business_plan. The plans are maps {t : quantity}. The entries 'inn', 'out',
+    'p_inn', 'p_out' and 'model' (the pulp model, for the pulp engine) are only set with debug=True. The entries
+    'refinement_rounds', 'grid_size', 'upper_bound' and 'gap' are only set by compute_business_plan_adaptive. The entry
+    'statistics' holds the model size and solver statistics, see SCMLSolverStatistics. The entry 'infeasibility' is only
+    set when the commitments cannot be met, see SCMLBusinessPlan.check_commitments. The entry 'engine_choice' is only
+    set with engine='auto', see SCMLCostModel.choose. The entry 'allocations' is only set with profile=True, see
+    SCMLAllocationProfiler.
+    """
+
+    __slots__ = (
+        "horizon",
+        "q_max",
+        "optimistic",
+        "rolling",
+        "engine",
+        "time_to_generate_variables",
+        "time_to_generate_objective",
+        "time_to_generate_constraints",
+        "time_to_solve",
+        "time_to_read_plan",
+        "statistics",
+        "buy_plan",
+        "sell_plan",
+        "profit",
+        "inn",
+        "out",
+        "p_inn",
+        "p_out",
+        "model",
+        "refinement_rounds",
+        "grid_size",
+        "upper_bound",
+        "gap",
+        "infeasibility",
+        "engine_choice",
+        "allocations",
+    )
+
+
+class SCMLSignerResult(SCMLResult):
+    """
+    The result of SCMLContractsSigner.sign. The entries 'agreements', 'trust_probabilities' and 'model' (the pulp
+    model, for the pulp engine) are only set with debug=True. The entry 'statistics' holds the model size and solver
+    statistics, see SCMLSolverStatistics. It is None when no model had to be solved. The entries 'certified',
+    'upper_bound' and 'time_to_certify' are only set with greedy_first=True, see SCMLContractsSigner.certify_greedy.
+    The engine 'flow' sets 'upper_bound' too, and 'fractional_signatures', see SCMLContractsSigner.sign_flow. The entry
+    'engine_choice' is only set with engine='auto', see SCMLCostModel.choose. The entry 'allocations' is only set with
+    profile=True, see SCMLAllocationProfiler.
+    """
+
+    __slots__ = (
+        "list_of_signatures",
+        "agent_id",
+        "engine",
+        "time_to_generate_ilp",
+        "time_to_solve_ilp",
+        "time_to_certify",
+        "statistics",
+        "profit",
+        "pruned",
+        "certified",
+        "upper_bound",
+        "fractional_signatures",
+        "engine_choice",
+        "allocations",
+        "agreements",
+        "trust_probabilities",
+        "model",
+    )
@@ -0,0 +1,110 @@
+import os
+import sys
+import uuid
+import weakref
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+class SCMLSharedTables:
+    """
+    Publishes read-only tables, e.g., the distributions and minima given to SCMLBusinessPlan.compute_business_plan for
+    many scenarios, once for all the worker processes of a pool. The parent process publishes the arrays with publish,
+    which returns a small descriptor, and sends only the descriptor to the workers. Each worker attaches the tables
+    with attach and reads them without copies: a table of shape (scenarios, horizon, q_max) is sliced per scenario.
+    The tables live in multiprocessing.shared_memory segments or, if a directory is given, in .npy files that the
+    workers memory-map. Attaching a shared memory segment does not track it, so any process can attach it, and only
+    the publishing one unlinks it, in close.
+    """
+
+    def __init__(self, directory: str = None):
+        """
+        :param directory: if given, the tables are written to .npy files in this directory and memory-mapped by the
+        workers, instead of being placed in shared memory.
+        """
+        self.directory = directory
+        # The shared memory segments and the files of the published tables.
+        self.segments = []
+        self.paths = []
+
+    def publish(self, **tables):
+        """
+        Copies the tables to shared memory, or to files, once.
+        :param tables: the arrays to publish, by name.
+        :return: a descriptor of the tables, a map {name : (kind, location, shape, dtype)}, to give to attach.
+        """
+        descriptor = {}
+        for name, table in tables.items():
+            table = np.ascontiguousarray(table)
+            if self.directory is None:
+                segment = shared_memory.SharedMemory(
+                    create=True, size=max(table.nbytes, 1)
+                )
+                np.ndarray(table.shape, table.dtype, buffer=segment.buf)[...] = table
+                self.segments.append(segment)
+                location = ("shared_memory", segment.name)
+            else:
+                path = os.path.join(self.directory, f"{name}_{uuid.uuid4().hex}.npy")
+                np.save(path, table)
+                self.paths.append(path)
+                location = ("memmap", path)
+            descriptor[name] = location + (table.shape, table.dtype.str)
+        return descriptor
+
+    @staticmethod
+    def attach_segment(name: str):
+        """
+        Attaches a shared memory segment without tracking it. Before Python 3.13, attaching a segment registers it
+        with the resource tracker of the process, which unlinks it when the process exits if the tracker is not the
+        one of the publishing process. The registration is then undone right away.
+        :param name: the name of the segment.
+        :return: the segment.
+        """
+        if sys.version_info >= (3, 13):
+            return shared_memory.SharedMemory(name=name, track=False)
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+    @staticmethod
+    def attach(descriptor: dict):
+        """
+        Reads published tables without copying them. Each shared memory segment stays attached as long as its array,
+        or any view of it, is referenced, and is closed once they are all garbage collected.
+        :param descriptor: the descriptor returned by publish.
+        :return: a map {name : read-only array}.
+        """
+        tables = {}
+        for name, (kind, location, shape, dtype) in descriptor.items():
+            if kind == "shared_memory":
+                segment = SCMLSharedTables.attach_segment(location)
+                table = np.ndarray(shape, dtype, buffer=segment.buf)
+                weakref.finalize(table, segment.close)
+                table.flags.writeable = False
+            else:
+                table = np.load(location, mmap_mode="r")
+            tables[name] = table
+        return tables
+
+    def close(self):
+        """
+        Frees the published tables. The workers must be done with them.
+        """
+        for segment in self.segments:
+            segment.close()
+            # A process sharing the resource tracker of this one may have undone the registration of the segment, see
+            # attach_segment. It is registered again, so that unlink can undo it.
+            if sys.version_info < (3, 13):
+                resource_tracker.register(segment._name, "shared_memory")
+            segment.unlink()
+        for path in self.paths:
+            os.remove(path)
+        self.segments = []
+        self.paths = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,138 @@
+import concurrent.futures
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+import SCMLBusinessPlanTests
+from SCMLBusinessPlan import SCMLBusinessPlan
+from SCMLSharedTables import SCMLSharedTables
+
+
+def plan_scenario(descriptor: dict, k: int, p_inn: dict, p_out: dict):
+    """
+    The job of the workers: plan scenario k with the minima read from the published tables.
+    """
+    tables = SCMLSharedTables.attach(descriptor)
+    assert not tables["inn"].flags.writeable
+    output = SCMLBusinessPlan.compute_business_plan(
+        horizon=tables["inn"].shape[1],
+        q_max=tables["inn"].shape[2],
+        Q_inn=None,
+        Q_out=None,
+        p_inn=p_inn,
+        p_out=p_out,
+        engine="milp",
+        minima=(tables["inn"][k], tables["out"][k]),
+    )
+    return output["buy_plan"], output["sell_plan"], output["profit"]
+
+
+class SCMLSharedTablesTests(unittest.TestCase):
+    def test_distribution_arrays(self):
+        """
+        Giving the distributions as arrays must give the same plans as giving them as maps, with both engines.
+        """
+        np.random.seed(0)
+        horizon, q_max = 6, 8
+        x = SCMLBusinessPlanTests.SCMLBusinessTests.synthetic_input_creation(
+            horizon, q_max
+        )
+        Q_inn, Q_out = (
+            SCMLBusinessPlan.get_distribution_array(x[key], horizon, q_max)
+            for key in ("Q_inn", "Q_out")
+        )
+        for a, b in zip(
+            SCMLBusinessPlan.get_minima_arrays(horizon, q_max, Q_inn, Q_out),
+            SCMLBusinessPlan.get_minima_arrays(horizon, q_max, x["Q_inn"], x["Q_out"]),
+        ):
+            np.testing.assert_allclose(a, b)
+        for engine in ("pulp", "milp"):
+            for sparse_minima in (False, True):
+                from_maps, from_arrays = (
+                    SCMLBusinessPlan.compute_business_plan(
+                        **{**x, "Q_inn": Q, "Q_out": Q_o},
+                        engine=engine,
+                        sparse_minima=sparse_minima,
+                    )
+                    for Q, Q_o in ((x["Q_inn"], x["Q_out"]), (Q_inn, Q_out))
+                )
+                self.assertAlmostEqual(
+                    from_maps["profit"],
+                    from_arrays["profit"],
+                    delta=1e-3 * max(1.0, abs(from_maps["profit"])),
+                )
+
+    def test_pool(self):
+        """
+        Workers reading the minima of several scenarios from shared memory, or from memory-mapped files, must plan as
+        the parent does from the distributions.
+        """
+        np.random.seed(1)
+        horizon, q_max = 5, 6
+        scenarios = [
+            SCMLBusinessPlanTests.SCMLBusinessTests.synthetic_input_creation(
+                horizon, q_max
+            )
+            for _ in range(0, 3)
+        ]
+        minima = [
+            SCMLBusinessPlan.get_minima_arrays(horizon, q_max, x["Q_inn"], x["Q_out"])
+            for x in scenarios
+        ]
+        expected = [
+            SCMLBusinessPlan.compute_business_plan(**x, engine="milp")
+            for x in scenarios
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            for tables in (SCMLSharedTables(), SCMLSharedTables(directory)):
+                with tables, concurrent.futures.ProcessPoolExecutor(2) as pool:
+                    descriptor = tables.publish(
+                        inn=np.stack([m[0] for m in minima]),
+                        out=np.stack([m[1] for m in minima]),
+                    )
+                    results = list(
+                        pool.map(
+                            plan_scenario,
+                            [descriptor] * len(scenarios),
+                            range(0, len(scenarios)),
+                            [x["p_inn"] for x in scenarios],
+                            [x["p_out"] for x in scenarios],
+                        )
+                    )
+                for (buy_plan, sell_plan, profit), output in zip(results, expected):
+                    self.assertEqual(buy_plan, output["buy_plan"])
+                    self.assertEqual(sell_plan, output["sell_plan"])
+                    self.assertAlmostEqual(profit, output["profit"])
+
+    def test_independent_process(self):
+        """
+        A process that does not share the resource tracker of the publishing one must not unlink the tables when it
+        exits.
+        """
+        with SCMLSharedTables() as tables:
+            descriptor = tables.publish(table=np.arange(0, 10))
+            code = (
+                "from SCMLSharedTables import SCMLSharedTables; "
+                f"print(SCMLSharedTables.attach({descriptor!r})['table'].sum())"
+            )
+            for _ in range(0, 2):
+                completed = subprocess.run(
+                    [sys.executable, "-c", code],
+                    capture_output=True,
+                    text=True,
+                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                )
+                self.assertEqual(completed.stdout.strip(), "45", completed.stderr)
+            # A view keeps the segment attached once the array it was taken from is gone.
+            view = SCMLSharedTables.attach(descriptor)["table"][2:]
+            gc.collect()
+            self.assertEqual(int(view.sum()), 44)
+
+
+if __name__ == "__main__":
+    unittest.main()
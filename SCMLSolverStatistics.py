@@ -0,0 +1,352 @@
+import os
+import re
+import tempfile
+import warnings
+from collections import Counter, defaultdict
+
+import numpy as np
+import pulp
+from prettytable import PrettyTable
+
+from SCMLCancellation import SCMLCancellation
+
+
+class SCMLSolverStatistics:
+    """
+    Model-size and search statistics of the ILPs solved by the signer and the business plan solver, and their
+    aggregation across calls. The outputs of SCMLContractsSigner.sign and SCMLBusinessPlan.compute_business_plan carry
+    an entry 'statistics', a map with the keys in STATISTICS:
+    - 'solver': 'cbc' for the pulp engine or 'highs' for the milp engine; 'status': the status of the solve, with the
+    names of pulp.LpStatus; 'message': the solver's own description of the result.
+    - 'rows', 'columns', 'nonzeros' and 'integer_columns': the dimensions of the model given to the solver.
+    - 'presolved_rows', 'presolved_columns' and 'presolved_nonzeros': the dimensions after presolve (CBC only).
+    - 'nodes': the number of branch-and-bound nodes; 'iterations': the number of LP iterations (CBC only).
+    - 'objective', 'bound' and 'gap': the objective of the solution, the best bound on the optimal objective, and the
+    relative gap between them.
+    The entries a solver does not report are None. The signer calls answered by SCMLContractsSigner.certify_greedy,
+    without solving the ILP, have 'certificate' as solver, and the statistics of the LP relaxation that bounds them.
+    An instance of this class collects the statistics of many calls (see add), to find the shapes of the instances that
+    cause latency spikes (see by_shape and slowest).
+    """
+
+    STATISTICS = (
+        "solver",
+        "status",
+        "message",
+        "rows",
+        "columns",
+        "nonzeros",
+        "integer_columns",
+        "presolved_rows",
+        "presolved_columns",
+        "presolved_nonzeros",
+        "nodes",
+        "iterations",
+        "objective",
+        "bound",
+        "gap",
+    )
+
+    # The statuses of scipy.optimize.milp, with the names of pulp.LpStatus.
+    MILP_STATUS = {
+        0: "Optimal",
+        1: "Not Solved",
+        2: "Infeasible",
+        3: "Unbounded",
+        4: "Undefined",
+    }
+
+    # The lines of the CBC log read by parse_cbc_log.
+    CBC_PATTERNS = {
+        "presolved": re.compile(
+            r"processed model has (\d+) rows, (\d+) columns .*and (\d+) elements"
+        ),
+        "nodes": re.compile(r"^Enumerated nodes:\s+(\d+)", re.MULTILINE),
+        "iterations": re.compile(r"^Total iterations:\s+(\d+)", re.MULTILINE),
+        "message": re.compile(r"^Result - (.*)$", re.MULTILINE),
+        "objective": re.compile(r"^Objective value:\s+(\S+)", re.MULTILINE),
+        "bound": re.compile(r"^Lower bound:\s+(\S+)", re.MULTILINE),
+        "gap": re.compile(r"^Gap:\s+(\S+)", re.MULTILINE),
+    }
+
+    def __init__(self):
+        # One record per call, with the statistics, the kind of call, the engine and the time to solve.
+        self.records = []
+
+    @staticmethod
+    def empty():
+        """
+        :return: a map with all the keys in STATISTICS set to None.
+        """
+        return dict.fromkeys(SCMLSolverStatistics.STATISTICS)
+
+    @staticmethod
+    def relative_gap(objective: float, bound: float):
+        """
+        :param objective: the objective of a solution.
+        :param bound: a bound on the optimal objective.
+        :return: |bound - objective| / max(1, |bound|), or None if either is None.
+        """
+        if objective is None or bound is None:
+            return None
+        return abs(bound - objective) / max(1.0, abs(bound))
+
+    @staticmethod
+    def pulp_model_size(model: pulp.LpProblem):
+        """
+        :param model: a pulp model.
+        :return: a map with the number of 'rows', 'columns', 'nonzeros' and 'integer_columns' of the model.
+        """
+        variables = model.variables()
+        return {
+            "rows": len(model.constraints),
+            "columns": len(variables),
+            "nonzeros": sum(len(c) for c in model.constraints.values()),
+            "integer_columns": sum(v.cat == pulp.LpInteger for v in variables),
+        }
+
+    @staticmethod
+    def parse_cbc_log(text: str):
+        """
+        Reads the statistics of a solve from the log of CBC.
+        :param text: the log.
+        :return: a map with the keys of STATISTICS found in the log.
+        """
+        patterns = SCMLSolverStatistics.CBC_PATTERNS
+        statistics = {}
+        match = patterns["presolved"].search(text)
+        if match is not None:
+            (
+                statistics["presolved_rows"],
+                statistics["presolved_columns"],
+                statistics["presolved_nonzeros"],
+            ) = (int(g) for g in match.groups())
+        for key, cast in (
+            ("nodes", int),
+            ("iterations", int),
+            ("message", str.strip),
+            ("objective", float),
+            ("bound", float),
+            ("gap", float),
+        ):
+            match = patterns[key].search(text)
+            if match is not None:
+                statistics[key] = cast(match.group(1))
+        if "gap" not in statistics and statistics.get("message", "").startswith(
+            "Optimal"
+        ):
+            statistics["gap"] = 0.0
+        return statistics
+
+    @staticmethod
+    def solve_pulp(
+        model: pulp.LpProblem,
+        time_limit: float = None,
+        options=None,
+        cancellation: SCMLCancellation = None,
+    ):
+        """
+        Solves a pulp model with CBC, as model.solve(pulp.PULP_CBC_CMD(msg=False, timeLimit=time_limit)) does, and
+        collects the statistics of the solve from CBC's log.
+        :param model: a pulp model.
+        :param time_limit: if given, the maximum number of seconds CBC is allowed to run.
+        :param options: if given, a list of further CBC options, e.g., ['preprocess off'].
+        :param cancellation: if given, CBC is started through it, so that it can be killed from another thread, see
+        SCMLCancellation.
+        :return: a map with the keys in STATISTICS.
+        """
+        descriptor, log_path = tempfile.mkstemp(suffix=".log")
+        os.close(descriptor)
+        try:
+            # With a log file, pulp drops the handle to os.devnull it opened for msg=False without closing it.
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", ResourceWarning)
+                solver = pulp.PULP_CBC_CMD(
+                    msg=False, timeLimit=time_limit, options=options, logPath=log_path
+                )
+                if cancellation is None:
+                    model.solve(solver)
+                else:
+                    cancellation.solve_pulp(model, solver)
+            with open(log_path) as log:
+                log_statistics = SCMLSolverStatistics.parse_cbc_log(log.read())
+        finally:
+            os.remove(log_path)
+        statistics = SCMLSolverStatistics.empty()
+        statistics.update(SCMLSolverStatistics.pulp_model_size(model))
+        statistics.update(log_statistics)
+        statistics["solver"] = "cbc"
+        statistics["status"] = pulp.LpStatus[model.status]
+        return statistics
+
+    @staticmethod
+    def milp_statistics(A, integrality: np.ndarray, result):
+        """
+        Collects the statistics of a solve with scipy.optimize.milp. The models of SCMLMilp minimize the negated
+        profit, so the objective and the bound are negated back to profits.
+        :param A: the constraint matrix, as a scipy.sparse array.
+        :param integrality: the integrality of the columns, as given to milp.
+        :param result: the result returned by milp.
+        :return: a map with the keys in STATISTICS.
+        """
+        statistics = SCMLSolverStatistics.empty()
+        objective = None if result.fun is None else -result.fun
+        bound = getattr(result, "mip_dual_bound", None)
+        bound = objective if bound is None else -bound
+        statistics.update(
+            solver="highs",
+            status=SCMLSolverStatistics.MILP_STATUS.get(result.status, "Undefined"),
+            message=result.message,
+            rows=A.shape[0],
+            columns=A.shape[1],
+            nonzeros=A.count_nonzero(),
+            integer_columns=int(np.count_nonzero(integrality)),
+            nodes=getattr(result, "mip_node_count", None),
+            objective=objective,
+            bound=bound,
+            gap=getattr(result, "mip_gap", None),
+        )
+        if statistics["gap"] is None:
+            statistics["gap"] = SCMLSolverStatistics.relative_gap(objective, bound)
+        return statistics
+
+    def add(self, output, kind: str = None):
+        """
+        Records the statistics of a call. Outputs without statistics, i.e., of calls that did not need to solve a
+        model, are ignored.
+        :param output: the output of SCMLContractsSigner.sign or SCMLBusinessPlan.compute_business_plan.
+        :param kind: a label for the call, e.g., 'sign' or 'plan'. Statistics are aggregated separately per kind.
+        """
+        statistics = output.get("statistics")
+        if statistics is None:
+            return
+        time_to_solve = next(
+            (
+                output.get(key)
+                for key in ("time_to_solve", "time_to_solve_ilp", "time_to_certify")
+                if output.get(key) is not None
+            ),
+            None,
+        )
+        self.records.append(
+            {
+                **statistics,
+                "kind": kind,
+                "engine": output.get("engine"),
+                "time_to_solve": time_to_solve,
+            }
+        )
+
+    @staticmethod
+    def aggregate(records):
+        """
+        :param records: a non-empty list of records, as collected by add.
+        :return: a map with the number of 'calls', the 'mean', 'p50', 'p99' and 'max' times to solve, the mean
+        'rows', 'columns' and 'nonzeros', the total 'nodes' and 'iterations' over the calls that report them (None if
+        none does), the 'max_gap', and the number of calls of each status in 'statuses'.
+        """
+        times = np.array([r["time_to_solve"] for r in records], dtype=float)
+        p50, p99 = np.percentile(times, [50, 99])
+
+        def total(key):
+            values = [r[key] for r in records if r[key] is not None]
+            return sum(values) if len(values) > 0 else None
+
+        gaps = [r["gap"] for r in records if r["gap"] is not None]
+        return {
+            "calls": len(records),
+            "mean": float(times.mean()),
+            "p50": float(p50),
+            "p99": float(p99),
+            "max": float(times.max()),
+            **{
+                key: float(np.mean([r[key] for r in records]))
+                for key in ("rows", "columns", "nonzeros")
+            },
+            "nodes": total("nodes"),
+            "iterations": total("iterations"),
+            "max_gap": max(gaps) if len(gaps) > 0 else None,
+            "statuses": dict(Counter(r["status"] for r in records)),
+        }
+
+    def summary(self):
+        """
+        :return: a map {(kind, solver) : aggregated statistics}, see aggregate.
+        """
+        groups = defaultdict(list)
+        for record in self.records:
+            groups[record["kind"], record["solver"]].append(record)
+        return {
+            key: SCMLSolverStatistics.aggregate(records)
+            for key, records in groups.items()
+        }
+
+    def by_shape(self, kind: str = None):
+        """
+        Aggregates the calls by the size of their model, in buckets of columns (1, 2, 3-4, 5-8, 9-16, ...), to see how
+        the time to solve grows with the size of the instances.
+        :param kind: if given, only the calls of this kind are aggregated.
+        :return: a map {(kind, solver, largest number of columns of the bucket) : aggregated statistics}, sorted by
+        kind, solver and bucket.
+        """
+        groups = defaultdict(list)
+        for record in self.records:
+            if kind is not None and record["kind"] != kind:
+                continue
+            bucket = 1 << max(0, int(record["columns"]) - 1).bit_length()
+            groups[record["kind"], record["solver"], bucket].append(record)
+        return {
+            key: SCMLSolverStatistics.aggregate(groups[key])
+            for key in sorted(groups, key=lambda k: (str(k[0]), k[1], k[2]))
+        }
+
+    def slowest(self, n: int = 5):
+        """
+        :param n: the number of records.
+        :return: the n records with the longest time to solve, slowest first.
+        """
+        return sorted(self.records, key=lambda r: r["time_to_solve"], reverse=True)[:n]
+
+    def certified_share(self, kind: str = None):
+        """
+        :param kind: if given, only the calls of this kind are counted.
+        :return: the fraction of the calls answered without solving the ILP, see SCMLContractsSigner.certify_greedy,
+        or None if there are no calls.
+        """
+        solvers = [
+            r["solver"] for r in self.records if kind is None or r["kind"] == kind
+        ]
+        if len(solvers) == 0:
+            return None
+        return solvers.count("certificate") / len(solvers)
+
+    def print_summary(self, title: str = "Solver statistics"):
+        """
+        Prints the statistics aggregated per kind and solver, and per bucket of columns.
+        :param title: a human readable title.
+        """
+        print(f"\n--- {title} ---")
+        for name, groups in (
+            ("per kind", self.summary()),
+            ("per columns", self.by_shape()),
+        ):
+            table = PrettyTable()
+            table.field_names = (
+                ["kind", "solver"]
+                + (["columns <="] if name == "per columns" else [])
+                + ["calls", "mean", "p99", "max", "rows", "columns", "nodes", "max gap"]
+            )
+            for key, s in groups.items():
+                table.add_row(
+                    list(key)
+                    + [s["calls"]]
+                    + [f"{1000 * s[k] : .2f} ms" for k in ("mean", "p99", "max")]
+                    + [f"{s['rows'] : .1f}", f"{s['columns'] : .1f}", s["nodes"]]
+                    + [None if s["max_gap"] is None else f"{s['max_gap'] : .2e}"]
+                )
+            print(name)
+            print(table)
+        if any(r["solver"] == "certificate" for r in self.records):
+            print(
+                f"answered without solving the ILP: {100 * self.certified_share() : .1f}%"
+            )
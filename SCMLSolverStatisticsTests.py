@@ -0,0 +1,138 @@
+import random
+import unittest
+
+import numpy as np
+
+import SCMLBusinessPlanTests
+import SCMLContractsSignerTests
+from SCMLBusinessPlan import SCMLBusinessPlan
+from SCMLContractsSigner import SCMLContractsSigner
+from SCMLSolverStatistics import SCMLSolverStatistics
+
+
+class SCMLSolverStatisticsTests(unittest.TestCase):
+    CBC_LOG = """
+Cgl0004I processed model has 24 rows, 312 columns (312 integer (312 of which binary)) and 3045 elements
+Cbc0010I After 0 nodes, 1 on tree, -1458.661 best solution, best possible -1464.5982 (0.14 seconds)
+
+Result - Stopped on time limit
+
+Objective value:                1458.66100000
+Lower bound:                    1464.598
+Gap:                            0.00
+Enumerated nodes:               17
+Total iterations:               175
+Time (CPU seconds):             0.15
+"""
+
+    def test_parse_cbc_log(self):
+        """
+        Test that the statistics are read from a CBC log.
+        """
+        statistics = SCMLSolverStatistics.parse_cbc_log(
+            SCMLSolverStatisticsTests.CBC_LOG
+        )
+        self.assertEqual(statistics["presolved_rows"], 24)
+        self.assertEqual(statistics["presolved_columns"], 312)
+        self.assertEqual(statistics["presolved_nonzeros"], 3045)
+        self.assertEqual(statistics["nodes"], 17)
+        self.assertEqual(statistics["iterations"], 175)
+        self.assertEqual(statistics["message"], "Stopped on time limit")
+        self.assertAlmostEqual(statistics["objective"], 1458.661)
+        self.assertAlmostEqual(statistics["bound"], 1464.598)
+        self.assertEqual(statistics["gap"], 0.0)
+        # Nothing is made up for the lines that are missing.
+        self.assertEqual(
+            SCMLSolverStatistics.parse_cbc_log("Result - Problem proven infeasible"),
+            {"message": "Problem proven infeasible"},
+        )
+
+    def test_business_plan_statistics(self):
+        """
+        Test that the business plan outputs carry the dimensions of the model and the statistics of the solver.
+        """
+        np.random.seed(0)
+        horizon, q_max = 6, 8
+        for engine in ("pulp", "milp"):
+            output = SCMLBusinessPlan.compute_business_plan(
+                **SCMLBusinessPlanTests.SCMLBusinessTests.synthetic_input_creation(
+                    horizon, q_max
+                ),
+                engine=engine,
+            )
+            statistics = output["statistics"]
+            self.assertEqual(set(statistics), set(SCMLSolverStatistics.STATISTICS))
+            self.assertEqual(
+                statistics["solver"], "cbc" if engine == "pulp" else "highs"
+            )
+            self.assertEqual(statistics["status"], "Optimal")
+            self.assertEqual(statistics["columns"], 2 * horizon * q_max)
+            self.assertEqual(statistics["integer_columns"], statistics["columns"])
+            self.assertGreater(statistics["rows"], 0)
+            self.assertGreater(statistics["nonzeros"], statistics["columns"])
+            self.assertIsNotNone(statistics["nodes"])
+            self.assertLessEqual(statistics["gap"], 1e-3)
+            self.assertAlmostEqual(
+                statistics["objective"],
+                output["profit"],
+                delta=1e-3 * max(1.0, abs(output["profit"])),
+            )
+            if engine == "pulp":
+                self.assertIsNotNone(statistics["iterations"])
+
+    def test_signer_statistics(self):
+        """
+        Test that, without aggregation, both engines solve models of the same dimensions, and that the statistics are
+        aggregated across calls.
+        """
+        random.seed(0)
+        aggregated = SCMLSolverStatistics()
+        for _ in range(0, 10):
+            agreements = [
+                SCMLContractsSignerTests.SCMLSignerTests.generate_random_contract()
+                for _ in range(0, random.randint(1, 30))
+            ]
+            outputs = {
+                engine: SCMLContractsSigner.sign(
+                    SCMLContractsSignerTests.SCMLSignerTests.AGENT_ID,
+                    agreements,
+                    SCMLContractsSignerTests.SCMLSignerTests.DEFAULT_TRUST_PROB,
+                    engine=engine,
+                    aggregate=False,
+                )
+                for engine in ("pulp", "milp")
+            }
+            if outputs["pulp"]["statistics"] is None:
+                # No sell agreements: there is no model to solve.
+                self.assertIsNone(outputs["milp"]["statistics"])
+                continue
+            for key in ("rows", "columns", "nonzeros", "integer_columns"):
+                self.assertEqual(
+                    outputs["pulp"]["statistics"][key],
+                    outputs["milp"]["statistics"][key],
+                )
+            for output in outputs.values():
+                aggregated.add(output, "sign")
+
+        summary = aggregated.summary()
+        self.assertEqual(set(summary), {("sign", "cbc"), ("sign", "highs")})
+        self.assertEqual(
+            summary["sign", "cbc"]["calls"], summary["sign", "highs"]["calls"]
+        )
+        by_shape = aggregated.by_shape("sign")
+        self.assertEqual(
+            sum(s["calls"] for s in by_shape.values()), len(aggregated.records)
+        )
+        for (_, _, bucket), s in by_shape.items():
+            self.assertLessEqual(s["columns"], bucket)
+            self.assertLessEqual(s["p50"], s["max"])
+        slowest = aggregated.slowest(3)
+        self.assertEqual(len(slowest), 3)
+        self.assertGreaterEqual(
+            slowest[0]["time_to_solve"], slowest[-1]["time_to_solve"]
+        )
+        aggregated.print_summary()
+
+
+if __name__ == "__main__":
+    unittest.main()
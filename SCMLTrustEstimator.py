@@ -0,0 +1,170 @@
+from collections.abc import Mapping
+from typing import Iterable, List, Sequence
+
+import numpy as np
+from negmas import Contract
+
+
+class SCMLTrustProbabilities(Mapping):
+    """
+    A read-only view {partner id : trust probability} over the arrays of a SCMLTrustEstimator. It can be given to
+    SCMLContractsSigner.sign and greedy_signer as trust_probabilities. The view is live: it always reflects the latest
+    observations, and no dictionary is built when it is passed around or queried.
+    """
+
+    def __init__(self, estimator: "SCMLTrustEstimator"):
+        self.estimator = estimator
+
+    def __getitem__(self, partner: str):
+        return float(self.estimator.trust()[self.estimator.slots[partner]])
+
+    def __contains__(self, partner):
+        return partner in self.estimator.slots
+
+    def __iter__(self):
+        return iter(self.estimator.partner_ids)
+
+    def __len__(self):
+        return len(self.estimator.partner_ids)
+
+
+class SCMLTrustEstimator:
+    """
+    Estimates, for each partner, the probability that it fulfils a contract, from the observed fulfilments and
+    breaches. Observations are stored in arrays indexed by partner slot, so that updates are O(1) and the Hoeffding
+    confidence bounds of all partners are computed at once.
+    Having observed n contracts with a partner, of which a fraction p_hat were fulfilled, with probability at least
+    1 - delta the true probability lies in [p_hat - eps(delta, n), p_hat + eps(delta, n)].
+    """
+
+    BOUNDS = ("upper", "lower", "mean")
+
+    def __init__(
+        self,
+        partners: Iterable[str] = (),
+        delta: float = 0.2,
+        bound: str = "upper",
+        capacity: int = 16,
+    ):
+        """
+        :param partners: the ids of the partners known in advance. Other partners get a slot when first observed.
+        :param delta: the confidence parameter, i.e., the bounds hold with probability at least 1 - delta.
+        :param bound: which value is used as trust probability: 'upper' to give partners the benefit of the doubt,
+        'lower' to be conservative, or 'mean' for the empirical fulfilment rate.
+        :param capacity: the initial number of slots.
+        """
+        assert 0.0 < delta < 1.0
+        assert bound in SCMLTrustEstimator.BOUNDS
+        self.delta = delta
+        self.bound = bound
+        self.slots = {}
+        self.partner_ids: List[str] = []
+        self.fulfilled = np.zeros(capacity)
+        self.observed = np.zeros(capacity)
+        self.cached_trust = None
+        self.trust_probabilities = SCMLTrustProbabilities(self)
+        for partner in partners:
+            self.slot(partner)
+
+    @staticmethod
+    def eps(delta: float, n):
+        """
+        Given delta and n, computes the radius of a 1 - delta confidence interval assuming n observations of a
+        Bernoulli r.v. The radius is infinite when there are no observations.
+        :param delta: the confidence parameter.
+        :param n: a number or an array with the number of observations.
+        :return: a number or an array of the same shape as n.
+        """
+        with np.errstate(divide="ignore"):
+            return np.sqrt(
+                (-1.0 / (2.0 * np.asarray(n, dtype=float))) * np.log(delta / 2.0)
+            )
+
+    def slot(self, partner: str):
+        """
+        Returns the slot of the given partner, creating it if the partner was never seen before. When the arrays are
+        full, their capacity is doubled, so adding a partner is amortized O(1).
+        :param partner: the id of the partner.
+        :return: the index of the partner in the arrays.
+        """
+        slot = self.slots.get(partner)
+        if slot is None:
+            slot = len(self.partner_ids)
+            if slot == len(self.observed):
+                self.fulfilled = np.concatenate((self.fulfilled, np.zeros(slot)))
+                self.observed = np.concatenate((self.observed, np.zeros(slot)))
+            self.slots[partner] = slot
+            self.partner_ids.append(partner)
+            self.cached_trust = None
+        return slot
+
+    def update(self, partner: str, fulfilled: bool):
+        """
+        Records one contract with the given partner.
+        :param partner: the id of the partner.
+        :param fulfilled: True if the partner fulfilled the contract, False if it breached it.
+        """
+        slot = self.slot(partner)
+        self.observed[slot] += 1
+        self.fulfilled[slot] += fulfilled
+        self.cached_trust = None
+
+    def update_batch(self, partners: Sequence[str], fulfilled: Sequence[bool]):
+        """
+        Records several contracts at once, e.g., all the contracts executed in a step.
+        :param partners: the id of the partner of each contract. A partner can appear several times.
+        :param fulfilled: for each contract, True if the partner fulfilled it, False if it breached it.
+        """
+        slots = np.fromiter(
+            (self.slot(p) for p in partners), dtype=int, count=len(partners)
+        )
+        np.add.at(self.observed, slots, 1)
+        np.add.at(self.fulfilled, slots, np.asarray(fulfilled, dtype=float))
+        self.cached_trust = None
+
+    def update_from_contracts(
+        self, agent_id: str, contracts: Sequence[Contract], fulfilled: Sequence[bool]
+    ):
+        """
+        Records the outcome of several contracts, each of type negmas.Contract, signed by our agent.
+        :param agent_id: the agent's id (self.id of the calling agent)
+        :param contracts: the contracts, each with exactly two partners, one of them our agent.
+        :param fulfilled: for each contract, True if the partner fulfilled it, False if it breached it.
+        """
+        self.update_batch(
+            [
+                c.partners[0] if c.partners[0] != agent_id else c.partners[1]
+                for c in contracts
+            ],
+            fulfilled,
+        )
+
+    def bounds(self, delta: float = None):
+        """
+        Computes the Hoeffding confidence interval of every partner, clipped to [0, 1]. Partners with no observations
+        get [0, 1].
+        :param delta: the confidence parameter. Defaults to the one given at construction.
+        :return: three arrays indexed by slot: the lower bounds, the empirical means and the upper bounds.
+        """
+        n = self.observed[: len(self.partner_ids)]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(n > 0, self.fulfilled[: len(n)] / n, 0.5)
+        radius = SCMLTrustEstimator.eps(self.delta if delta is None else delta, n)
+        return (
+            np.clip(mean - radius, 0.0, 1.0),
+            mean,
+            np.clip(mean + radius, 0.0, 1.0),
+        )
+
+    def trust(self):
+        """
+        Returns the trust probability of every partner, according to the bound chosen at construction. The result is
+        cached until the next observation.
+        :return: an array indexed by slot.
+        """
+        if self.cached_trust is None:
+            lower, mean, upper = self.bounds()
+            self.cached_trust = {"lower": lower, "mean": mean, "upper": upper}[
+                self.bound
+            ]
+        return self.cached_trust
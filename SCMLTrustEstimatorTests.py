@@ -0,0 +1,92 @@
+import math
+import random
+import unittest
+
+import numpy as np
+
+import SCMLContractsSignerTests
+from SCMLContractsSigner import SCMLContractsSigner
+from SCMLTrustEstimator import SCMLTrustEstimator
+
+
+class SCMLTrustEstimatorTests(unittest.TestCase):
+    def test_eps(self):
+        """
+        The radius must match the one in the Hoeffding's bound notebook, element-wise.
+        """
+        delta = 0.2
+        n = np.arange(1, 30)
+        expected = [math.sqrt((-1.0 / (2.0 * i)) * math.log(delta / 2.0)) for i in n]
+        np.testing.assert_allclose(SCMLTrustEstimator.eps(delta, n), expected)
+        self.assertTrue(np.isinf(SCMLTrustEstimator.eps(delta, 0)))
+
+    def test_batch_update_matches_single_updates(self):
+        """
+        Recording a step's outcomes at once must give the same counts as recording them one by one, and the arrays
+        must grow as new partners appear.
+        """
+        partners = [f"partner_{i}" for i in range(0, 40)]
+        outcomes = [
+            (random.choice(partners), random.random() < 0.7) for _ in range(500)
+        ]
+        single = SCMLTrustEstimator(capacity=2)
+        for partner, fulfilled in outcomes:
+            single.update(partner, fulfilled)
+        batch = SCMLTrustEstimator(capacity=2)
+        batch.update_batch([p for p, _ in outcomes], [f for _, f in outcomes])
+        for partner in set(p for p, _ in outcomes):
+            self.assertEqual(
+                single.observed[single.slots[partner]],
+                batch.observed[batch.slots[partner]],
+            )
+            self.assertEqual(
+                single.trust_probabilities[partner], batch.trust_probabilities[partner]
+            )
+        self.assertEqual(single.observed.sum(), len(outcomes))
+        self.assertEqual(batch.observed.sum(), len(outcomes))
+
+    def test_bounds(self):
+        """
+        Manual example: 8 fulfilments out of 10 observations, plus a partner never observed.
+        """
+        estimator = SCMLTrustEstimator(partners=["A", "B"], delta=0.2)
+        estimator.update_batch(["A"] * 10, [True] * 8 + [False] * 2)
+        lower, mean, upper = estimator.bounds()
+        radius = SCMLTrustEstimator.eps(0.2, 10)
+        self.assertAlmostEqual(mean[0], 0.8)
+        self.assertAlmostEqual(lower[0], 0.8 - radius)
+        self.assertAlmostEqual(upper[0], min(0.8 + radius, 1.0))
+        self.assertEqual((lower[1], upper[1]), (0.0, 1.0))
+        self.assertTrue(np.all(lower <= mean) and np.all(mean <= upper))
+
+    def test_view_is_live_and_signable(self):
+        """
+        The trust probabilities view must reflect new observations and be accepted by the signers.
+        """
+        agent_id = SCMLContractsSignerTests.SCMLSignerTests.AGENT_ID
+        partner = SCMLContractsSignerTests.SCMLSignerTests.OTHER_AGENT_ID
+        estimator = SCMLTrustEstimator(partners=[partner], bound="lower")
+        trust_probabilities = estimator.trust_probabilities
+        self.assertEqual(trust_probabilities[partner], 0.0)
+        list_of_agreements = [
+            SCMLContractsSignerTests.SCMLSignerTests.generate_random_contract()
+            for _ in range(0, 20)
+        ]
+        estimator.update_from_contracts(
+            agent_id, list_of_agreements, [True] * len(list_of_agreements)
+        )
+        self.assertGreater(trust_probabilities[partner], 0.0)
+        self.assertEqual(
+            dict(trust_probabilities), {partner: trust_probabilities[partner]}
+        )
+        for signer in (SCMLContractsSigner.sign, SCMLContractsSigner.greedy_signer):
+            signer_output = signer(agent_id, list_of_agreements, trust_probabilities)
+            self.assertTrue(
+                SCMLContractsSigner.is_sign_plan_consistent(
+                    signer_output, list_of_agreements
+                )
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()